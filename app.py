@@ -3,18 +3,32 @@ app.py - Flask ของเซิร์ฟเวอร์สำหรับร
 """
 
 import os
+import time
 import uuid
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
-from mysql.connector import pooling
-from flask import Flask, request, jsonify, render_template, send_from_directory, session, redirect, url_for, flash
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, session, redirect, url_for, flash
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import json
+import hmac
+import atexit
+import base64
+import csv
+import io
+import threading
 
-# import โมดูลสำหรับประมวลผลเสียง
+# import โมดูลสำหรับประมวลผลเสียง (จับเวลาไว้รายงานใน /api/metrics)
+_import_started = time.perf_counter()
 import audio_processor
+from feature_cache import FeatureCache
+from classification_jobs import JobManager, JobQueueFull, FINISHED_STATUSES, public_job
+from write_behind import WriteBehindQueue, replay_dead_letter
+from db_pool import ConnectionPool, PoolTimeout, ConnectionUnavailable
+from upload_store import UploadStore
+IMPORT_SECONDS = round(time.perf_counter() - _import_started, 3)
 
 # ลองโหลด dotenv หากติดตั้งแล้ว
 try:
@@ -32,14 +46,121 @@ UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'wav'}
 MAX_FILES = 10
 
+# PREFORK=1 เมื่อรันผ่าน gunicorn (ตั้งโดย gunicorn.conf.py): โมเดลโหลดใน master ก่อน fork
+# ส่วนทรัพยากรที่ใช้ข้าม fork ไม่ได้จะสร้างในแต่ละ worker ด้วย init_process_resources()
+PREFORK = os.environ.get('PREFORK', '0') == '1'
+
+# จำนวน process สำหรับสกัดคุณลักษณะของไฟล์ในคำขอเดียวกันแบบขนาน
+# (โหมด PREFORK ค่าเริ่มต้นเป็น 0 เพราะแต่ละ worker เป็น process แยกกันอยู่แล้ว)
+FEATURE_WORKERS = int(os.environ.get('FEATURE_WORKERS', 0 if PREFORK else min(4, os.cpu_count() or 1)))
+
+# แคชเวกเตอร์คุณลักษณะ (หน่วยความจำ + ดิสก์ถ้ากำหนด FEATURE_CACHE_DIR)
+FEATURE_CACHE_SIZE = int(os.environ.get('FEATURE_CACHE_SIZE', 1024))
+FEATURE_CACHE_DIR = os.environ.get('FEATURE_CACHE_DIR') or None
+FEATURE_CACHE_DISK_MB = int(os.environ.get('FEATURE_CACHE_DISK_MB', 256))
+
 # สร้างโฟลเดอร์อัพโหลดหากยังไม่มี
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# ความยาวเสียงสูงสุด (วินาที) และนโยบายสำหรับไฟล์ที่ยาวเกิน ('truncate' = ตัดให้เหลือเท่าที่กำหนด, 'reject' = ปฏิเสธ)
+MAX_AUDIO_SECONDS = float(os.environ.get('MAX_AUDIO_SECONDS', 600))
+LONG_AUDIO_POLICY = os.environ.get('LONG_AUDIO_POLICY', 'truncate')
+
+# ไฟล์ที่ยาวตั้งแต่ค่านี้ (วินาที) สกัดคุณลักษณะแบบอ่านทีละบล็อก ใช้หน่วยความจำคงที่ (0 = ปิด)
+STREAMING_MIN_SECONDS = float(os.environ.get('STREAMING_MIN_SECONDS', 60))
+
+# LAZY_STARTUP=1 เลื่อนการโหลด librosa/scipy และการสร้าง filterbank ไปจนถึงคำขอแรก (บูตเร็ว คำขอแรกช้า)
+# WARMUP=1 ประมวลผลเสียงสังเคราะห์หนึ่งไฟล์ก่อนรับคำขอ เพื่อไม่ให้คำขอแรกต้องรอ import และ JIT
+LAZY_STARTUP = os.environ.get('LAZY_STARTUP', '0') == '1'
+WARMUP = os.environ.get('WARMUP', '1') == '1'
+
+# รวมคุณลักษณะจากคำขอที่มาพร้อมกันแล้วทำนายเป็นชุดเดียว: รอได้นานสุดกี่มิลลิวินาที (0 = ปิด) และกี่แถวต่อชุด
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get('INFERENCE_BATCH_WINDOW_MS', 5))
+INFERENCE_BATCH_MAX_ROWS = int(os.environ.get('INFERENCE_BATCH_MAX_ROWS', 64))
+
+# ตรวจ models/model_bundle.npz ทุกกี่วินาที และโหลดโมเดลใหม่เมื่อไฟล์เปลี่ยนโดยไม่ต้องรีสตาร์ต (0 = ปิด)
+MODEL_WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', 10))
+
+# ผู้ใช้ที่เรียก API ผู้ดูแลระบบได้ (คั่นด้วยจุลภาค) และโทเค็นสำหรับสคริปต์ deploy (ส่งใน header X-Admin-Token)
+# ค่าเริ่มต้นว่าง: /register เปิดให้ทุกคนและสคีมาสร้างบัญชี admin พร้อมรหัสผ่านตัวอย่าง จึงต้องระบุผู้ดูแลเอง
+ADMIN_USERNAMES = {name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()}
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN') or None
+
+# จำนวนแถวต่อหน้าของ /results (ค่าเริ่มต้นและค่าสูงสุดที่ขอได้ด้วย ?limit=)
+RESULTS_PAGE_SIZE = 50
+RESULTS_MAX_PAGE_SIZE = 200
+
+# งานจำแนกเบื้องหลัง (POST /api/jobs): จำนวนเธรดต่อ process, จำนวนงานค้างสูงสุดต่อ process,
+# ไดเรกทอรีสถานะงาน (ต้องใช้ร่วมกันทุก worker) และเก็บสถานะไว้กี่วินาที
+CLASSIFY_JOB_WORKERS = int(os.environ.get('CLASSIFY_JOB_WORKERS', 2))
+CLASSIFY_JOB_QUEUE = int(os.environ.get('CLASSIFY_JOB_QUEUE', 32))
+JOB_DIR = os.environ.get('JOB_DIR') or os.path.join(UPLOAD_FOLDER, 'jobs')
+JOB_TTL_SECONDS = float(os.environ.get('JOB_TTL_SECONDS', 3600))
+# ส่ง keep-alive ใน event stream ของงานทุกกี่วินาทีเมื่อไม่มีความคืบหน้า
+JOB_EVENTS_HEARTBEAT_SECONDS = 15
+
+# บันทึกผลลงฐานข้อมูลแบบ write-behind: เขียนลง journal ใน JOURNAL_DIR แล้วทยอยบันทึกลง MySQL ในเธรดเบื้องหลัง
+# (0 = บันทึกก่อนตอบทุกครั้ง) JOURNAL_FSYNC=1 fsync journal ทุกครั้งที่เพิ่มรายการ และเมื่อปิด process
+# จะรอบันทึกรายการที่ค้างไม่เกิน WRITE_BEHIND_DRAIN_SECONDS วินาที (ที่เหลือจะถูกบันทึกโดย process ถัดไป)
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '1') == '1'
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR', 'journal')
+JOURNAL_FSYNC = os.environ.get('JOURNAL_FSYNC', '1') == '1'
+WRITE_BEHIND_BATCH = int(os.environ.get('WRITE_BEHIND_BATCH', 100))
+WRITE_BEHIND_DRAIN_SECONDS = float(os.environ.get('WRITE_BEHIND_DRAIN_SECONDS', 20))
+
+# ส่งออกประวัติผลการประเมิน (CSV/NDJSON แบบทยอยส่ง): จำนวนการส่งออกพร้อมกันต่อ process (แต่ละรายการถือ
+# connection ของพูลไว้จนส่งเสร็จ จึงควรน้อยกว่า DB_POOL_SIZE) และจำนวนแถวที่อ่านจาก MySQL ต่อครั้ง
+EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', 2))
+EXPORT_FETCH_ROWS = 1000
+# เวลาที่ MySQL รอให้ผู้รับอ่านผลก่อนตัดการเชื่อมต่อ (วินาที) เผื่อผู้ดาวน์โหลดที่ช้า
+EXPORT_NET_WRITE_TIMEOUT = 600
+
+# connection pool ของ MySQL ต่อ process: จำนวน connection สูงสุด, เวลารอ connection ว่างก่อนตอบ 503 (วินาที),
+# อายุสูงสุดของ connection (ควรน้อยกว่า wait_timeout ของเซิร์ฟเวอร์) และ ping connection ที่ว่างนานกว่ากี่วินาทีก่อนใช้
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+DB_POOL_RECYCLE_SECONDS = float(os.environ.get('DB_POOL_RECYCLE_SECONDS', 1800))
+DB_POOL_PING_SECONDS = float(os.environ.get('DB_POOL_PING_SECONDS', 5))
+
+# บันทึกไฟล์ต้นฉบับลง UPLOAD_FOLDER หรือไม่ (ทำในเธรดเบื้องหลัง ไม่ขวางการตอบกลับ)
+PERSIST_UPLOADS = os.environ.get('PERSIST_UPLOADS', '1') == '1'
+
+# ที่เก็บต้นฉบับ: บีบอัดเป็น FLAC (UPLOAD_COMPRESS=1) เก็บครั้งเดียวต่อเนื้อหาไฟล์ และทุก UPLOAD_SWEEP_SECONDS วินาที
+# ลบต้นฉบับที่ไม่ถูกอัปโหลดซ้ำนานกว่า UPLOAD_RETENTION_DAYS วัน แล้วลบไฟล์ที่เก่าที่สุดจนขนาดรวมไม่เกิน
+# UPLOAD_QUOTA_MB (0 = ไม่จำกัด) รวมถึงไฟล์ชั่วคราวที่ค้างนานกว่า UPLOAD_TEMP_MAX_AGE_SECONDS วินาที
+UPLOAD_COMPRESS = os.environ.get('UPLOAD_COMPRESS', '1') == '1'
+UPLOAD_RETENTION_DAYS = float(os.environ.get('UPLOAD_RETENTION_DAYS', 0))
+UPLOAD_QUOTA_MB = float(os.environ.get('UPLOAD_QUOTA_MB', 0))
+UPLOAD_SWEEP_SECONDS = float(os.environ.get('UPLOAD_SWEEP_SECONDS', 3600))
+UPLOAD_TEMP_MAX_AGE_SECONDS = 86400
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024
 
 # สร้าง instance ของ AudioProcessor
-audio_processor = audio_processor.AudioProcessor()
+feature_cache = FeatureCache(
+    schema_version=audio_processor.FEATURE_SCHEMA_VERSION,
+    max_entries=FEATURE_CACHE_SIZE,
+    cache_dir=FEATURE_CACHE_DIR,
+    max_disk_bytes=FEATURE_CACHE_DISK_MB * 1024 * 1024
+)
+audio_processor = audio_processor.AudioProcessor(
+    feature_workers=0 if PREFORK else FEATURE_WORKERS,
+    feature_cache=feature_cache,
+    max_duration=MAX_AUDIO_SECONDS or None,
+    truncate_long_audio=(LONG_AUDIO_POLICY != 'reject'),
+    streaming_min_duration=STREAMING_MIN_SECONDS or None,
+    lazy_init=LAZY_STARTUP,
+    warmup=WARMUP,
+    batch_window=INFERENCE_BATCH_WINDOW_MS / 1000,
+    batch_max_rows=INFERENCE_BATCH_MAX_ROWS
+)
+job_manager = JobManager(JOB_DIR, workers=CLASSIFY_JOB_WORKERS, max_pending=CLASSIFY_JOB_QUEUE,
+                         ttl=JOB_TTL_SECONDS)
+upload_store = UploadStore(UPLOAD_FOLDER, compress=UPLOAD_COMPRESS, max_age=UPLOAD_RETENTION_DAYS * 86400,
+                           max_bytes=int(UPLOAD_QUOTA_MB * 1024 * 1024), temp_max_age=UPLOAD_TEMP_MAX_AGE_SECONDS)
+print(f"Startup timings: import {IMPORT_SECONDS:.2f}s, " +
+      ", ".join(f"{name} {seconds:.2f}s" for name, seconds in audio_processor.startup_timings.items()))
 
 # สร้าง connection pool สำหรับ MySQL
 # สร้าง connection สำหรับ MySQL/MariaDB
@@ -53,24 +174,82 @@ db_config = {
     'get_warnings': True,
 }
 
-try:
-    connection_pool = mysql.connector.pooling.MySQLConnectionPool(
-        pool_name="pronunciation_pool",
-        pool_size=5,  # จำนวน connections ที่เก็บไว้ในพูล
-        **db_config
+def create_connection_pool():
+    """สร้าง connection pool ของ MySQL (connection ถูกสร้างเมื่อต้องใช้ จึงไม่ล้มเหลวแม้ฐานข้อมูลยังไม่พร้อม)"""
+    pool = ConnectionPool(
+        lambda: mysql.connector.connect(**db_config),
+        size=DB_POOL_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        recycle=DB_POOL_RECYCLE_SECONDS,
+        ping_after=DB_POOL_PING_SECONDS
     )
-    print("Database connection pool created successfully")
-except Exception as e:
-    print(f"Error creating connection pool: {e}")
-    connection_pool = None
+    print(f"Database connection pool created (size {DB_POOL_SIZE}, timeout {DB_POOL_TIMEOUT}s)")
+    return pool
+
+# สร้างโดย init_process_resources() ในแต่ละ process
+connection_pool = None
 
-# ฟังก์ชันสำหรับรับ connection จากพูล
+# ฟังก์ชันสำหรับรับ connection จากพูล (รอได้ไม่เกิน DB_POOL_TIMEOUT วินาที, conn.close() คือคืนเข้าพูล)
 def get_db_connection():
-    if connection_pool:
-        return connection_pool.get_connection()
-    else:
-        # หากไม่สามารถสร้างพูลได้ ให้สร้าง connection ใหม่
-        return mysql.connector.connect(**db_config)
+    return connection_pool.connection()
+
+@app.errorhandler(PoolTimeout)
+@app.errorhandler(ConnectionUnavailable)
+def database_busy(error):
+    """connection ของฐานข้อมูลไม่ว่างหรือเชื่อมต่อไม่ได้: ให้ผู้ใช้ลองใหม่แทนที่จะได้ 500"""
+    print(f"Database unavailable: {error}")
+    return jsonify({'error': 'ฐานข้อมูลไม่ว่าง กรุณาลองใหม่ภายหลัง'}), 503, {'Retry-After': '2'}
+
+# เธรดเบื้องหลังสำหรับบันทึกไฟล์อัปโหลดลงดิสก์ และคิว write-behind ของผลการจำแนก
+# (สร้างโดย init_process_resources())
+upload_writer = None
+write_behind = None
+
+def init_process_resources():
+    """
+    สร้างทรัพยากรที่ใช้ร่วมข้าม fork ไม่ได้: connection pool ของ MySQL (socket),
+    เธรดบันทึกไฟล์อัปโหลด, คิว write-behind (journal ของ process นี้), เธรดของงานจำแนกเบื้องหลัง, เธรดเฝ้าดูไฟล์โมเดล,
+    เธรดกวาดไฟล์อัปโหลด และพูลสกัดคุณลักษณะ
+    
+    รันตอน import เมื่อใช้ app.run และรันในแต่ละ worker หลัง fork เมื่อใช้ gunicorn (post_fork)
+    
+    พูลสกัดคุณลักษณะ (fork) ต้องสร้างก่อนเธรดใดๆ ของ worker: process ลูกที่ fork ขณะเธรดอื่นถือล็อกอยู่
+    (เช่น ล็อกของคิว write-behind หรือของ logging) จะได้ล็อกที่ไม่มีวันถูกปล่อยติดไปด้วย
+    """
+    global connection_pool, upload_writer, write_behind
+    if PREFORK:
+        audio_processor.start_feature_pool(FEATURE_WORKERS)
+    connection_pool = create_connection_pool()
+    upload_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload_writer')
+    if WRITE_BEHIND:
+        write_behind = WriteBehindQueue(JOURNAL_DIR, flush_journal_entries, is_permanent=is_permanent_db_error,
+                                        batch_size=WRITE_BEHIND_BATCH, fsync=JOURNAL_FSYNC)
+        write_behind.start()
+    job_manager.start()
+    audio_processor.start_model_watcher(MODEL_WATCH_SECONDS)
+    upload_store.start_sweeper(UPLOAD_SWEEP_SECONDS)
+
+def shutdown_process_resources():
+    """
+    รอให้งานจำแนกที่กำลังทำ, ผลที่ค้างในคิว write-behind และการบันทึกไฟล์อัปโหลดเสร็จ
+    แล้วหยุดเธรดและพูลของ process นี้ (gunicorn worker_exit) และปิด connection ของ MySQL งานที่ยังไม่เริ่มจะถูกบันทึกว่าล้มเหลว
+    """
+    job_manager.close()
+    if write_behind is not None:
+        write_behind.close(WRITE_BEHIND_DRAIN_SECONDS)
+    if upload_writer is not None:
+        upload_writer.shutdown(wait=True)
+    upload_store.stop_sweeper()
+    audio_processor.close()
+    if connection_pool is not None:
+        connection_pool.close()
+
+def persist_upload(temp_path, file_path):
+    """ย้ายไฟล์ชั่วคราวของคำขอเข้าที่เก็บต้นฉบับ (เรียกจาก upload_writer นอกเส้นทางของคำขอ)"""
+    try:
+        upload_store.store(temp_path, file_path)
+    except Exception as e:
+        print(f"Error saving upload {file_path}: {e}")
 
 # Login required decorator
 def login_required(f):
@@ -81,6 +260,22 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Admin required decorator
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token')
+        if ADMIN_TOKEN and token and check_admin_token(token):
+            return f(*args, **kwargs)
+        if session.get('username') in ADMIN_USERNAMES:
+            return f(*args, **kwargs)
+        return jsonify({'error': 'ต้องเป็นผู้ดูแลระบบ'}), 403
+    return decorated_function
+
+def check_admin_token(token):
+    """เปรียบเทียบโทเค็นผู้ดูแลระบบแบบใช้เวลาคงที่"""
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
 def allowed_file(filename):
     """ตรวจสอบว่าไฟล์มีนามสกุลที่อนุญาตหรือไม่"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -101,12 +296,12 @@ def login():
         
         conn = get_db_connection()
         cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM users WHERE username = %s", (username,))
+            user = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
         
         if user and check_password_hash(user['password_hash'], password):
             session['user_id'] = user['id']
@@ -119,14 +314,15 @@ def login():
             session_token = str(uuid.uuid4())
             expires_at = datetime.datetime.now() + datetime.timedelta(days=7)
             
-            cursor.execute(
-                "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
-                (user['id'], session_token, expires_at)
-            )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            try:
+                cursor.execute(
+                    "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (%s, %s, %s)",
+                    (user['id'], session_token, expires_at)
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
             
             session['session_token'] = session_token
             
@@ -171,14 +367,15 @@ def logout():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        cursor.execute(
-            "UPDATE user_sessions SET is_active = FALSE WHERE user_id = %s AND session_token = %s",
-            (session['user_id'], session['session_token'])
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute(
+                "UPDATE user_sessions SET is_active = FALSE WHERE user_id = %s AND session_token = %s",
+                (session['user_id'], session['session_token'])
+            )
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
     
     session.clear()
     return redirect(url_for('login'))
@@ -187,136 +384,965 @@ def logout():
 def about():
     return render_template('about.html')
 
-@app.route('/api/classify', methods=['POST'])
-@login_required
-def classify_audio():
+def get_upload_files():
     """
-    API endpoint สำหรับการจำแนกไฟล์เสียง
-    รับไฟล์ WAV และส่งกลับผลการจำแนก
+    ดึงไฟล์เสียงจากคำขอและตรวจจำนวนไฟล์และนามสกุล
+    
+    Returns:
+        tuple: (รายการไฟล์, None) หรือ (None, คำตอบข้อผิดพลาด)
     """
     # ตรวจสอบว่ามีไฟล์ในคำขอหรือไม่
     if 'audio_files' not in request.files:
-        return jsonify({'error': 'ไม่พบไฟล์เสียงในคำขอ'}), 400
+        return None, (jsonify({'error': 'ไม่พบไฟล์เสียงในคำขอ'}), 400)
     
     files = request.files.getlist('audio_files')
     
     # ตรวจสอบจำนวนไฟล์
     if len(files) > MAX_FILES:
-        return jsonify({'error': f'จำนวนไฟล์เกินขีดจำกัด (สูงสุด {MAX_FILES} ไฟล์)'}), 400
+        return None, (jsonify({'error': f'จำนวนไฟล์เกินขีดจำกัด (สูงสุด {MAX_FILES} ไฟล์)'}), 400)
+    
+    # ตรวจสอบนามสกุลไฟล์ทั้งหมดก่อนเริ่มประมวลผล
+    for file in files:
+        if not (file and allowed_file(file.filename)):
+            return None, (jsonify({'error': 'ไฟล์บางไฟล์ไม่ใช่ไฟล์ WAV'}), 400)
+    
+    return files, None
+
+def upload_path(file):
+    """สร้างชื่อไฟล์ที่ปลอดภัย คืน (ชื่อไฟล์, พาธไฟล์ชั่วคราวที่ไม่ซ้ำกันใน UPLOAD_FOLDER/tmp)"""
+    filename = secure_filename(file.filename)
+    return filename, upload_store.temp_path(filename)
+
+def save_classification_batches(batches):
+    """
+    บันทึกข้อมูลไฟล์และผลการประเมินของหลายคำขอลงฐานข้อมูลด้วย connection เดียวและ transaction เดียว
+    (INSERT หลายแถวของแต่ละตารางต่อคำขอ) และเพิ่มจำนวนใน user_progress และ user_assessment_totals ครั้งเดียวต่อผู้ใช้
+    
+    Args:
+        batches (list): (user_id, rows, created) ของแต่ละคำขอ โดย rows คือ
+            (ชื่อไฟล์, พาธ, ขนาดไฟล์, ผลการจำแนก) ของแต่ละไฟล์ และ created คือเวลาของคำขอ (time.time())
+            ซึ่งใช้เป็น upload_date/assessment_date และวันที่ใน user_progress แทนเวลาที่บันทึกจริง
+            (คิว write-behind อาจบันทึกช้ากว่าคำขอหลังลองใหม่หรือหลังกู้ journal ของ process ที่ล่ม)
+    """
+    batches = [(user_id, rows, created) for user_id, rows, created in batches if rows]
+    if not batches:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        progress = {}
+        last_assessment = {}
+        for user_id, rows, created in batches:
+            assessed_at = assessment_time(created)
+            levels = insert_classifications(cursor, user_id, rows, assessed_at)
+            counts = progress.setdefault((user_id, assessed_at.date()), dict.fromkeys(PROGRESS_LEVELS, 0))
+            for level in PROGRESS_LEVELS:
+                counts[level] += levels.get(level, 0)
+            last_assessment[user_id] = max(last_assessment.get(user_id, assessed_at), assessed_at)
+        upsert_user_progress(cursor, progress)
+        upsert_assessment_totals(cursor, progress, last_assessment)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def save_classifications(user_id, rows):
+    """บันทึกผลของทุกไฟล์ในคำขอลงฐานข้อมูลทันทีใน transaction เดียว"""
+    save_classification_batches([(user_id, rows, time.time())])
+
+def assessment_time(created):
+    """
+    แปลงเวลาของคำขอ (time.time()) เป็นค่าของคอลัมน์ TIMESTAMP
+    
+    ใช้เวลาท้องถิ่นของเครื่องเหมือน expires_at ของ user_sessions (เขตเวลาเดียวกับ session ของ MySQL)
+    และตัดเศษวินาทีทิ้ง เพราะ MySQL ปัดเศษวินาที ซึ่งอาจทำให้วันที่ต่างจากวันที่ใน user_progress
+    """
+    return datetime.datetime.fromtimestamp(created).replace(microsecond=0)
+
+def insert_classifications(cursor, user_id, rows, assessed_at):
+    """
+    INSERT ข้อมูลไฟล์และผลการประเมินของคำขอหนึ่ง (ไม่ commit)
+    
+    Args:
+        assessed_at (datetime): เวลาของคำขอ ใช้เป็น upload_date และ assessment_date
+    
+    Returns:
+        dict: จำนวนผลการประเมินของแต่ละระดับ
+    """
+    # บันทึกข้อมูลไฟล์ทั้งหมด (executemany รวมเป็น INSERT หลายแถวคำสั่งเดียว)
+    cursor.executemany(
+        """
+        INSERT INTO audio_files (user_id, file_name, file_path, file_size, upload_date) 
+        VALUES (%s, %s, %s, %s, %s)
+        """,
+        [(user_id, filename, file_path, file_size, assessed_at) for filename, file_path, file_size, _ in rows]
+    )
+    
+    # INSERT หลายแถวได้ id เรียงตามลำดับแถว และ lastrowid คือ id ของแถวแรก
+    if len(rows) == 1:
+        file_ids = [cursor.lastrowid]
+    else:
+        cursor.execute(
+            "SELECT id FROM audio_files WHERE user_id = %s AND id >= %s ORDER BY id LIMIT %s",
+            (user_id, cursor.lastrowid, len(rows))
+        )
+        file_ids = [row[0] for row in cursor.fetchall()]
+        if len(file_ids) != len(rows):
+            raise RuntimeError(f"expected {len(rows)} audio_files rows, found {len(file_ids)}")
+    
+    # ไม่ต้องแปลงจาก "Medium" เป็น "Mid" อีกต่อไป เพราะโมเดลส่งคืน "Mid" โดยตรง
+    assessments = []
+    for file_id, (_, _, _, classification_result) in zip(file_ids, rows):
+        pronunciation_level = classification_result['predicted_class']
+        probability = classification_result['probabilities'].get(pronunciation_level, 0)
+        assessments.append((file_id, pronunciation_level, probability, assessed_at))
+    
+    # บันทึกผลการประเมินทั้งหมด
+    cursor.executemany(
+        """
+        INSERT INTO assessment_results (audio_file_id, pronunciation_level, probability, assessment_date) 
+        VALUES (%s, %s, %s, %s)
+        """,
+        assessments
+    )
+    
+    levels = {}
+    for _, pronunciation_level, _, _ in assessments:
+        levels[pronunciation_level] = levels.get(pronunciation_level, 0) + 1
+    return levels
+
+# ระดับที่นับใน user_progress (ตรงกับ ENUM ของ assessment_results.pronunciation_level)
+PROGRESS_LEVELS = ('High', 'Mid', 'Low')
+
+def upsert_user_progress(cursor, progress):
+    """
+    เพิ่มจำนวนผลการประเมินของแต่ละวันใน user_progress (แทน trigger update_user_progress เดิม)
+    
+    Args:
+        progress (dict): (user_id, วันที่ของ assessment_date) -> จำนวนของแต่ละระดับ ที่บันทึกใน transaction นี้
+    """
+    # เรียงตาม (user_id, วันที่) เพื่อให้ทุก transaction ล็อกแถวตามลำดับเดียวกัน (ไม่เกิด deadlock)
+    values = [
+        (user_id, date, counts['High'], counts['Mid'], counts['Low'], sum(counts.values()))
+        for (user_id, date), counts in sorted(progress.items()) if any(counts.values())
+    ]
+    if not values:
+        return
+    cursor.executemany(
+        """
+        INSERT INTO user_progress (user_id, date, high_count, mid_count, low_count, total_count)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            high_count = high_count + VALUES(high_count),
+            mid_count = mid_count + VALUES(mid_count),
+            low_count = low_count + VALUES(low_count),
+            total_count = total_count + VALUES(total_count)
+        """,
+        values
+    )
+
+def upsert_assessment_totals(cursor, progress, last_assessment):
+    """
+    เพิ่มจำนวนผลการประเมินสะสมของผู้ใช้ใน user_assessment_totals (ตารางสรุปของผู้ดูแลระบบ)
+    
+    Args:
+        progress (dict): (user_id, วันที่) -> จำนวนของแต่ละระดับ ที่บันทึกใน transaction นี้
+        last_assessment (dict): user_id -> upload_date ล่าสุดของผู้ใช้ใน transaction นี้
+    """
+    totals = {}
+    for (user_id, _), counts in progress.items():
+        user_counts = totals.setdefault(user_id, dict.fromkeys(PROGRESS_LEVELS, 0))
+        for level in PROGRESS_LEVELS:
+            user_counts[level] += counts[level]
+    values = [
+        (user_id, sum(counts.values()), counts['High'], counts['Mid'], counts['Low'], last_assessment[user_id])
+        for user_id, counts in sorted(totals.items()) if any(counts.values())
+    ]
+    if not values:
+        return
+    # รายการที่บันทึกช้า (ลองใหม่หรือกู้จาก journal) อาจเก่ากว่าค่าที่มีอยู่: เก็บค่าที่ใหม่กว่าไว้
+    # (COALESCE เพราะ GREATEST กับ NULL ได้ NULL)
+    cursor.executemany(
+        """
+        INSERT INTO user_assessment_totals
+            (user_id, total_assessments, high_count, mid_count, low_count, last_assessment_date)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            total_assessments = total_assessments + VALUES(total_assessments),
+            high_count = high_count + VALUES(high_count),
+            mid_count = mid_count + VALUES(mid_count),
+            low_count = low_count + VALUES(low_count),
+            last_assessment_date = GREATEST(COALESCE(last_assessment_date, VALUES(last_assessment_date)),
+                                            VALUES(last_assessment_date))
+        """,
+        values
+    )
+
+def rebuild_user_progress():
+    """
+    คำนวณ user_progress ใหม่ทั้งตารางจาก assessment_results ด้วย INSERT ... SELECT ครั้งเดียว
+    (เช่น หลังนำเข้าผลการประเมินจำนวนมากโดยตรง) และลบ trigger update_user_progress ถ้ายังมีอยู่
+    
+    ควรรันขณะที่ไม่มีการบันทึกผลการจำแนก เพราะผลที่บันทึกระหว่างนั้นอาจถูกนับซ้ำหรือตกหล่น
+    (รันซ้ำเพื่อแก้ได้)
+    
+    Returns:
+        int: จำนวนแถวของ user_progress หลังคำนวณใหม่
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        drop_legacy_triggers(cursor)
+        conn.start_transaction()
+        cursor.execute("DELETE FROM user_progress")
+        cursor.execute(
+            """
+            INSERT INTO user_progress (user_id, date, high_count, mid_count, low_count, total_count)
+            SELECT af.user_id, DATE(ar.assessment_date),
+                   SUM(ar.pronunciation_level = 'High'),
+                   SUM(ar.pronunciation_level = 'Mid'),
+                   SUM(ar.pronunciation_level = 'Low'),
+                   COUNT(*)
+            FROM assessment_results ar
+            JOIN audio_files af ON af.id = ar.audio_file_id
+            GROUP BY af.user_id, DATE(ar.assessment_date)
+            """
+        )
+        rebuilt = cursor.rowcount
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def rebuild_assessment_totals():
+    """
+    คำนวณ user_assessment_totals ใหม่ทั้งตารางจากประวัติด้วย INSERT ... SELECT ครั้งเดียว
+    (สร้างตารางถ้ายังไม่มี) เงื่อนไขการรันเหมือน rebuild_user_progress
+    
+    Returns:
+        int: จำนวนผู้ใช้ใน user_assessment_totals หลังคำนวณใหม่
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        ensure_tables(cursor)
+        conn.start_transaction()
+        cursor.execute("DELETE FROM user_assessment_totals")
+        cursor.execute(
+            """
+            INSERT INTO user_assessment_totals
+                (user_id, total_assessments, high_count, mid_count, low_count, last_assessment_date)
+            SELECT af.user_id, COUNT(*),
+                   SUM(ar.pronunciation_level = 'High'),
+                   SUM(ar.pronunciation_level = 'Mid'),
+                   SUM(ar.pronunciation_level = 'Low'),
+                   MAX(af.upload_date)
+            FROM assessment_results ar
+            JOIN audio_files af ON af.id = ar.audio_file_id
+            GROUP BY af.user_id
+            """
+        )
+        rebuilt = cursor.rowcount
+        conn.commit()
+        return rebuilt
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.cli.command('rebuild-progress')
+def rebuild_progress_command():
+    """
+    คำนวณตาราง user_progress และ user_assessment_totals ใหม่จากประวัติผลการประเมินทั้งหมด
+    (flask --app app rebuild-progress)
+    """
+    started = time.perf_counter()
+    rebuilt = rebuild_user_progress()
+    print(f"Rebuilt user_progress: {rebuilt} rows in {time.perf_counter() - started:.2f}s")
+    started = time.perf_counter()
+    rebuilt = rebuild_assessment_totals()
+    print(f"Rebuilt user_assessment_totals: {rebuilt} users in {time.perf_counter() - started:.2f}s")
+
+def flush_journal_entries(entries):
+    """บันทึกรายการจากคิว write-behind ทั้งชุดใน transaction เดียว (เรียกจากเธรดของคิว) โดยใช้เวลาที่เข้าคิวเป็นเวลาของผล"""
+    save_classification_batches([(entry['user_id'], entry['payload'], entry['created']) for entry in entries])
+
+def is_permanent_db_error(error):
+    """
+    ข้อผิดพลาดที่ลองใหม่แล้วไม่หาย (ข้อมูลของรายการนั้นผิดหรือขัด constraint)
+    
+    ProgrammingError ไม่นับ เพราะครอบทั้งตารางที่ยังไม่ได้สร้าง (1146), คอลัมน์ที่ไม่รู้จัก (1054) และรหัสผ่านผิด
+    (1045 ระหว่างเปลี่ยนรหัสผ่าน) ซึ่งเป็นปัญหาของทั้งระบบ ไม่ใช่ของรายการ: ให้ลองใหม่จนกว่าจะแก้ไขแทนที่จะย้ายทุกรายการไป dead letter
+    """
+    return isinstance(error, (mysql.connector.IntegrityError, mysql.connector.DataError))
+
+@app.cli.command('replay-dead-letter')
+def replay_dead_letter_command():
+    """
+    บันทึกรายการใน JOURNAL_DIR/dead-letter.jsonl ลงฐานข้อมูลใหม่ (flask --app app replay-dead-letter)
+    รายการที่ยังบันทึกไม่ได้จะคงอยู่ใน dead-letter.jsonl
+    """
+    if not os.path.isdir(JOURNAL_DIR):
+        print(f"No journal directory at {JOURNAL_DIR}")
+        return
+    result = replay_dead_letter(JOURNAL_DIR, flush_journal_entries)
+    print(f"Replayed {result['replayed']} dead-letter entries, {result['failed']} still failing")
+
+def persist_classifications(user_id, rows):
+    """
+    บันทึกผลของคำขอผ่านคิว write-behind (ตอบผู้ใช้ได้โดยไม่ต้องรอ MySQL)
+    หรือบันทึกทันทีถ้าปิดคิวไว้หรือเขียน journal ไม่ได้
+    """
+    if not rows:
+        return
+    if write_behind is not None:
+        # เก็บเฉพาะส่วนของผลการจำแนกที่ต้องบันทึก
+        payload = [
+            (filename, file_path, file_size, {
+                'predicted_class': result['predicted_class'],
+                'probabilities': result['probabilities']
+            })
+            for filename, file_path, file_size, result in rows
+        ]
+        try:
+            write_behind.submit(user_id, payload)
+            return
+        except OSError as e:
+            print(f"Write-behind journal unavailable ({e}). Saving synchronously.")
+    save_classifications(user_id, rows)
+
+@app.route('/api/classify', methods=['POST'])
+@login_required
+def classify_audio():
+    """
+    API endpoint สำหรับการจำแนกไฟล์เสียง
+    รับไฟล์ WAV และส่งกลับผลการจำแนก
+    """
+    files, error = get_upload_files()
+    if error:
+        return error
     
     results = []
-    temp_paths = []
+    rows = []
     
     try:
-        # บันทึกไฟล์และประมวลผลแต่ละไฟล์
-        for file in files:
-            if file and allowed_file(file.filename):
-                # สร้างชื่อไฟล์ที่ปลอดภัยและไม่ซ้ำกัน
-                filename = secure_filename(file.filename)
-                unique_filename = f"{uuid.uuid4()}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                
-                # บันทึกไฟล์
-                file.save(file_path)
-                temp_paths.append(file_path)
-                
-                # จำแนกไฟล์เสียง
-                classification_result = audio_processor.classify_audio(file_path)
-                
-                # เพิ่มชื่อไฟล์เดิมเข้าไปในผลลัพธ์
-                classification_result['file_name'] = file.filename
-                
-                # บันทึกลงฐานข้อมูล (ถ้ามีการล็อกอิน)
-                if 'user_id' in session:
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    
-                    # บันทึกข้อมูลไฟล์
-                    cursor.execute(
-                        """
-                        INSERT INTO audio_files (user_id, file_name, file_path, file_size) 
-                        VALUES (%s, %s, %s, %s)
-                        """,
-                        (session['user_id'], filename, file_path, os.path.getsize(file_path))
-                    )
-                    
-                    conn.commit()
-                    file_id = cursor.lastrowid
-                    
-                    # ไม่ต้องแปลงจาก "Medium" เป็น "Mid" อีกต่อไป เพราะโมเดลส่งคืน "Mid" โดยตรง
-                    pronunciation_level = classification_result['predicted_class']
-                    
-                    # บันทึกผลการประเมิน
-                    probability = classification_result['probabilities'].get(pronunciation_level, 0)
-                    
-                    cursor.execute(
-                        """
-                        INSERT INTO assessment_results (audio_file_id, pronunciation_level, probability) 
-                        VALUES (%s, %s, %s)
-                        """,
-                        (file_id, pronunciation_level, probability)
-                    )
-                    
-                    conn.commit()
-                    cursor.close()
-                    conn.close()
-                
+        # จำแนกจาก FileStorage.stream โดยตรง (ไฟล์ใหญ่ถูก werkzeug พักไว้ในไฟล์ชั่วคราว จึงไม่ถูกอ่าน
+        # เข้าหน่วยความจำทั้งไฟล์) ส่ง FileStorage เพื่อให้ log และโหมดจำลองเห็นชื่อไฟล์ ด้วยการเรียกโมเดลครั้งเดียว
+        classification_results = audio_processor.classify_batch(files)
+        
+        for file, classification_result in zip(files, classification_results):
+            filename = secure_filename(file.filename)
+            # เพิ่มชื่อไฟล์เดิมเข้าไปในผลลัพธ์
+            classification_result['file_name'] = file.filename
+            
+            # ไฟล์ที่ไม่ผ่านการตรวจสอบเบื้องต้นจะไม่ถูกบันทึก
+            if classification_result.get('error'):
                 results.append(classification_result)
+                continue
+            
+            # บันทึกไฟล์ต้นฉบับในเบื้องหลัง (ถ้าเปิดใช้งาน): คัดลอก stream ลง uploads/tmp พร้อมคำนวณแฮช
+            # พาธคำนวณจากเนื้อหาไฟล์จึงรู้ก่อนบีบอัดเสร็จ
+            if PERSIST_UPLOADS:
+                temp_path, file_path, file_size = upload_store.spool(file.stream)
+                upload_writer.submit(persist_upload, temp_path, file_path)
             else:
-                return jsonify({'error': 'ไฟล์บางไฟล์ไม่ใช่ไฟล์ WAV'}), 400
+                file_path = ''
+                file.stream.seek(0, os.SEEK_END)
+                file_size = file.stream.tell()
+            
+            rows.append((filename, file_path, file_size, classification_result))
+            results.append(classification_result)
+        
+        # บันทึกลงฐานข้อมูลครั้งเดียวทั้งคำขอ (ถ้ามีการล็อกอิน)
+        if 'user_id' in session:
+            persist_classifications(session['user_id'], rows)
         
         return jsonify({'results': results})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+def discard_job_file(item):
+    """ลบไฟล์ชั่วคราวที่บันทึกไว้ตอนส่งงาน"""
+    try:
+        os.remove(item['file_path'])
+    except OSError:
+        pass
+
+def classify_job_file(user_id, item):
+    """
+    จำแนกไฟล์หนึ่งไฟล์ของงานเบื้องหลังแล้วบันทึกผล (เรียกจากเธรดของ job_manager)
+    
+    Args:
+        user_id (int): เจ้าของงาน
+        item (dict): file_name, filename, file_path และ file_size ของไฟล์ที่บันทึกไว้ตอนส่งงาน
+        
+    Returns:
+        dict: ผลการจำแนกของไฟล์ (รูปแบบเดียวกับ /api/classify)
+    """
+    try:
+        classification_result = audio_processor.classify_batch([item['file_path']])[0]
+        classification_result['file_name'] = item['file_name']
+        
+        # ไฟล์ที่ไม่ผ่านการตรวจสอบเบื้องต้นจะไม่ถูกบันทึก
+        if classification_result.get('error'):
+            return classification_result
+        
+        file_path = ''
+        if PERSIST_UPLOADS:
+            # ย้ายไฟล์ชั่วคราวของงานเข้าที่เก็บต้นฉบับ (แฮชคำนวณทีละบล็อก ไม่อ่านทั้งไฟล์เข้าหน่วยความจำ)
+            file_path = upload_store.path_for(item['file_path'])
+            persist_upload(item['file_path'], file_path)
+    finally:
+        # ไฟล์ชั่วคราวของงานถูกลบเสมอ (ถ้ายังไม่ถูกย้ายเข้าที่เก็บต้นฉบับ)
+        discard_job_file(item)
+    
+    persist_classifications(user_id, [(item['filename'], file_path, item['file_size'], classification_result)])
+    return classification_result
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_classification_job():
+    """
+    ส่งงานจำแนกไฟล์เสียงเข้าคิวเบื้องหลัง บันทึกไฟล์ลงดิสก์แล้วตอบรหัสงานทันที (202)
+    ติดตามผลได้ที่ /api/jobs/<job_id> หรือ /api/jobs/<job_id>/events (server-sent events)
+    """
+    files, error = get_upload_files()
+    if error:
+        return error
+    
+    if not job_manager.has_capacity():
+        return jsonify({'error': 'มีงานรอประมวลผลมากเกินไป กรุณาลองใหม่ภายหลัง'}), 503, {'Retry-After': '5'}
+    
+    items = []
+    try:
+        for file in files:
+            filename, file_path = upload_path(file)
+            file.save(file_path)
+            items.append({
+                'file_name': file.filename,
+                'filename': filename,
+                'file_path': file_path,
+                'file_size': os.path.getsize(file_path)
+            })
+        job = job_manager.submit(session['user_id'], items, classify_job_file, discard=discard_job_file)
+    except JobQueueFull:
+        for item in items:
+            discard_job_file(item)
+        return jsonify({'error': 'มีงานรอประมวลผลมากเกินไป กรุณาลองใหม่ภายหลัง'}), 503, {'Retry-After': '5'}
+    except Exception as e:
+        for item in items:
+            discard_job_file(item)
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'total': job['total'],
+        'status_url': url_for('get_classification_job', job_id=job['id']),
+        'events_url': url_for('classification_job_events', job_id=job['id'])
+    }), 202
+
+def find_user_job(job_id):
+    """สถานะของงานถ้าเป็นของผู้ใช้ที่ล็อกอินอยู่ (ไม่เช่นนั้น None)"""
+    job = job_manager.get(job_id)
+    if job is None or job['user_id'] != session['user_id']:
+        return None
+    return job
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_classification_job(job_id):
+    """สถานะ ความคืบหน้า และผลของแต่ละไฟล์ที่เสร็จแล้วของงานจำแนก"""
+    job = find_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'ไม่พบงาน'}), 404
+    return jsonify(public_job(job)), 200
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@login_required
+def classification_job_events(job_id):
+    """
+    ส่งความคืบหน้าของงานแบบ server-sent events: event "progress" ทุกครั้งที่สถานะเปลี่ยน
+    และ event "done" เมื่องานเสร็จหรือล้มเหลว แล้วปิด stream
     
+    แต่ละ stream ถือเธรดของ worker (gthread) ไว้จนงานจบ หน้าเว็บจึงสอบถาม /api/jobs/<job_id> เป็นระยะแทน
+    """
+    job = find_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'ไม่พบงาน'}), 404
+    
+    def stream(job):
+        revision = None
+        while True:
+            if job['revision'] != revision:
+                revision = job['revision']
+                finished = job['status'] in FINISHED_STATUSES
+                event = 'done' if finished else 'progress'
+                yield f"event: {event}\ndata: {json.dumps(public_job(job), ensure_ascii=False)}\n\n"
+                if finished:
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            job = job_manager.wait(job_id, revision, JOB_EVENTS_HEARTBEAT_SECONDS)
+            if job is None:
+                return
+    
+    return Response(stream(job), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
+def encode_results_cursor(upload_date, file_id):
+    """สร้าง cursor ของหน้าถัดไปจากแถวสุดท้ายของหน้า (upload_date, id)"""
+    token = json.dumps([upload_date.isoformat(), file_id])
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_results_cursor(cursor_token):
+    """แปลง cursor กลับเป็น (upload_date, id) (ValueError ถ้า cursor ไม่ถูกต้อง)"""
+    try:
+        padded = cursor_token + '=' * (-len(cursor_token) % 4)
+        upload_date, file_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.datetime.fromisoformat(upload_date), int(file_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
 
 @app.route('/results', methods=['GET'])
 @login_required
 def get_results():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    """
+    ผลการประเมินของผู้ใช้ เรียงจากล่าสุด แบ่งหน้าด้วย cursor (upload_date, id)
     
-    cursor.execute(
-        """
-        SELECT af.id, af.file_name, ar.pronunciation_level, ar.probability 
+    Query parameters:
+        limit: จำนวนแถวต่อหน้า (ค่าเริ่มต้น RESULTS_PAGE_SIZE สูงสุด RESULTS_MAX_PAGE_SIZE)
+        cursor: ค่า next_cursor จากหน้าก่อนหน้า (ไม่ระบุ = หน้าแรก ซึ่งมี summary ด้วย)
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', RESULTS_PAGE_SIZE)), 1), RESULTS_MAX_PAGE_SIZE)
+        cursor_token = request.args.get('cursor')
+        after = decode_results_cursor(cursor_token) if cursor_token else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # keyset pagination: อ่านเฉพาะแถวถัดจาก cursor ผ่าน index (user_id, upload_date) ไม่ต้องข้ามแถวแบบ OFFSET
+    # (ดึงเกิน 1 แถวเพื่อรู้ว่ามีหน้าถัดไปหรือไม่)
+    query = """
+        SELECT af.id, af.file_name, af.upload_date, ar.pronunciation_level, ar.probability 
         FROM audio_files af
         JOIN assessment_results ar ON af.id = ar.audio_file_id
         WHERE af.user_id = %s
-        ORDER BY af.upload_date DESC
-        """,
-        (session['user_id'],)
-    )
+        """
+    params = [session['user_id']]
+    if after is not None:
+        query += " AND (af.upload_date < %s OR (af.upload_date = %s AND af.id < %s))"
+        params += [after[0], after[0], after[1]]
+    query += " ORDER BY af.upload_date DESC, af.id DESC LIMIT %s"
+    params.append(limit + 1)
     
-    results = cursor.fetchall()
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        results = cursor.fetchall()
+        
+        # สรุปจำนวนแต่ละระดับด้วย GROUP BY ครั้งเดียว (เฉพาะหน้าแรก) - ใช้ค่า 'Mid' โดยตรง (ไม่ใช่ 'Medium')
+        counts = None
+        if after is None:
+            cursor.execute(
+                """
+                SELECT ar.pronunciation_level, COUNT(*) AS count
+                FROM audio_files af
+                JOIN assessment_results ar ON af.id = ar.audio_file_id
+                WHERE af.user_id = %s
+                GROUP BY ar.pronunciation_level
+                """,
+                (session['user_id'],)
+            )
+            counts = {row['pronunciation_level']: row['count'] for row in cursor.fetchall()}
+    finally:
+        # คืน connection ให้ pool แม้ query ล้มเหลว (pool มีขนาดจำกัด)
+        cursor.close()
+        conn.close()
+    
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        next_cursor = encode_results_cursor(results[-1]['upload_date'], results[-1]['id'])
     
     # Format probability as percentage
     for result in results:
+        del result['upload_date']
         result['probability'] = f"{result['probability']:.2%}"
     
-    # Get summary statistics - ใช้ค่า 'Mid' โดยตรง (ไม่ใช่ 'Medium')
-    high_count = sum(1 for result in results if result['pronunciation_level'] == 'High')
-    mid_count = sum(1 for result in results if result['pronunciation_level'] == 'Mid')
-    low_count = sum(1 for result in results if result['pronunciation_level'] == 'Low')
+    response = {'results': results, 'next_cursor': next_cursor}
+    if counts is not None:
+        response['summary'] = {
+            'total': sum(counts.values()),
+            'high': counts.get('High', 0),
+            'mid': counts.get('Mid', 0),
+            'low': counts.get('Low', 0)
+        }
     
-    summary = {
-        'total': len(results),
-        'high': high_count,
-        'mid': mid_count,
-        'low': low_count
-    }
+    return jsonify(response), 200
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+# จำกัดจำนวนการส่งออกที่ทำพร้อมกันใน process นี้
+export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+def parse_export_args():
+    """
+    อ่าน format, from และ to (วันที่ YYYY-MM-DD รวมวันสุดท้าย) ของคำขอส่งออก
     
-    cursor.close()
-    conn.close()
+    Returns:
+        tuple: (format, เวลาเริ่ม หรือ None, เวลาสิ้นสุดแบบไม่รวม หรือ None)
     
-    return jsonify({'results': results, 'summary': summary}), 200
+    Raises:
+        ValueError: ถ้าค่าไม่ถูกต้อง
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    date_from = datetime.date.fromisoformat(date_from) if date_from else None
+    date_to = datetime.date.fromisoformat(date_to) + datetime.timedelta(days=1) if date_to else None
+    return export_format, date_from, date_to
+
+def export_date_filter(date_from, date_to):
+    """เงื่อนไข SQL (รายการที่ต้องเชื่อมด้วย AND) และพารามิเตอร์ของช่วงวันที่"""
+    conditions, params = [], []
+    if date_from is not None:
+        conditions.append("af.upload_date >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append("af.upload_date < %s")
+        params.append(date_to)
+    return conditions, params
+
+def stream_export(query, params, columns, export_format, filename):
+    """
+    ส่งผลของ query เป็น CSV หรือ NDJSON แบบทยอยส่ง
+    
+    ใช้ cursor แบบ unbuffered (MySQL ส่งแถวมาเมื่ออ่าน) และอ่านทีละ EXPORT_FETCH_ROWS แถว
+    หน่วยความจำที่ใช้จึงคงที่ไม่ว่าผลจะมีกี่แถว connection ถูกถือไว้จนส่งเสร็จหรือผู้รับตัดการเชื่อมต่อ
+    
+    Args:
+        query (str): คำสั่ง SELECT ที่คืนคอลัมน์ตาม columns
+        params (list): พารามิเตอร์ของ query
+        columns (tuple): ชื่อคอลัมน์ (หัวตาราง CSV และคีย์ของ NDJSON)
+        export_format (str): 'csv' หรือ 'ndjson'
+        filename (str): ชื่อไฟล์ที่ให้เบราว์เซอร์บันทึก (ไม่รวมนามสกุล)
+    """
+    if not export_slots.acquire(blocking=False):
+        return jsonify({'error': 'มีการส่งออกข้อมูลอยู่หลายรายการ กรุณาลองใหม่ภายหลัง'}), 503, {'Retry-After': '10'}
+    
+    # เปิด connection และรัน query ก่อนเริ่มส่ง เพื่อให้ข้อผิดพลาดได้สถานะ 503/500 แทนไฟล์ที่ขาดกลางทาง
+    conn = cursor = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT,))
+        cursor.execute(query, params)
+    except Exception:
+        close_export(conn, cursor)
+        export_slots.release()
+        raise
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                record = dict(zip(columns, row))
+                if record.get('upload_date') is not None:
+                    record['upload_date'] = record['upload_date'].isoformat()
+                record['probability'] = round(float(record['probability']), 4)
+                if export_format == 'csv':
+                    writer.writerow(record.values())
+                else:
+                    buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        chunk = buffer.getvalue()
+        if chunk:
+            yield chunk
+    
+    closed = []
+    def cleanup():
+        # เรียกเมื่อ server ปิด response (ส่งครบหรือผู้รับตัดการเชื่อมต่อ) แม้ generator จะยังไม่เริ่ม
+        if not closed:
+            closed.append(True)
+            close_export(conn, cursor)
+            export_slots.release()
+    
+    response = Response(generate(), content_type=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    response.call_on_close(cleanup)
+    return response
+
+def close_export(conn, cursor):
+    """ปิด cursor และคืน connection ของการส่งออก (connection ที่ยังมีแถวค้างอยู่จะถูกปิดแทนการคืนเข้าพูล)"""
+    if cursor is not None:
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            # ผู้รับตัดการเชื่อมต่อก่อนอ่านครบ ("Unread result found")
+            pass
+    if conn is not None:
+        conn.close()
+
+@app.route('/results/export', methods=['GET'])
+@login_required
+def export_results():
+    """
+    ส่งออกผลการประเมินทั้งหมดของผู้ใช้ เรียงจากเก่าไปใหม่
+    
+    Query parameters:
+        format: csv (ค่าเริ่มต้น) หรือ ndjson
+        from, to: ช่วงวันที่อัปโหลด (YYYY-MM-DD รวมทั้งสองวัน)
+    """
+    try:
+        export_format, date_from, date_to = parse_export_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conditions, params = export_date_filter(date_from, date_to)
+    query = f"""
+        SELECT af.file_name, af.upload_date, ar.pronunciation_level, ar.probability
+        FROM audio_files af
+        JOIN assessment_results ar ON af.id = ar.audio_file_id
+        WHERE {' AND '.join(['af.user_id = %s'] + conditions)}
+        ORDER BY af.upload_date, af.id
+        """
+    columns = ('file_name', 'upload_date', 'pronunciation_level', 'probability')
+    return stream_export(query, [session['user_id']] + params, columns, export_format, 'assessments')
+
+@app.route('/api/admin/export', methods=['GET'])
+@admin_required
+def export_all_results():
+    """
+    ส่งออกผลการประเมินของผู้ใช้หลายคน (ผู้ดูแลระบบ) เรียงตามผู้ใช้แล้วตามเวลาอัปโหลด
+    
+    Query parameters:
+        user_id: ผู้ใช้ที่ต้องการ (ระบุซ้ำได้ ไม่ระบุ = ทุกคน)
+        format, from, to: เหมือน /results/export
+    """
+    try:
+        export_format, date_from, date_to = parse_export_args()
+        user_ids = [int(user_id) for user_id in request.args.getlist('user_id')]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conditions, params = export_date_filter(date_from, date_to)
+    if user_ids:
+        conditions.insert(0, f"af.user_id IN ({', '.join(['%s'] * len(user_ids))})")
+        params = user_ids + params
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # เรียงตาม index (user_id, upload_date) ของ audio_files ให้ MySQL ส่งแถวได้ทันทีโดยไม่ต้องเรียงทั้งผล
+    query = f"""
+        SELECT af.user_id, u.username, af.file_name, af.upload_date, ar.pronunciation_level, ar.probability
+        FROM audio_files af
+        JOIN assessment_results ar ON af.id = ar.audio_file_id
+        JOIN users u ON u.id = af.user_id
+        {where}
+        ORDER BY af.user_id, af.upload_date, af.id
+        """
+    columns = ('user_id', 'username', 'file_name', 'upload_date', 'pronunciation_level', 'probability')
+    return stream_export(query, params, columns, export_format, 'assessments-all')
+
+# คอลัมน์ที่ใช้เรียง /api/admin/summary (แต่ละคอลัมน์มี index (คอลัมน์, user_id) ใน user_assessment_totals)
+SUMMARY_SORTS = {
+    'last_assessment': 'last_assessment_date',
+    'total': 'total_assessments',
+    'high': 'high_count',
+    'mid': 'mid_count',
+    'low': 'low_count'
+}
+
+def encode_summary_cursor(sort, value, user_id):
+    """สร้าง cursor ของหน้าถัดไปจากแถวสุดท้ายของหน้า (ค่าที่ใช้เรียง, user_id)"""
+    if isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    token = json.dumps([sort, value, user_id])
+    return base64.urlsafe_b64encode(token.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_summary_cursor(cursor_token, sort):
+    """แปลง cursor กลับเป็น (ค่าที่ใช้เรียง, user_id) (ValueError ถ้า cursor ไม่ถูกต้องหรือเป็นของการเรียงแบบอื่น)"""
+    try:
+        padded = cursor_token + '=' * (-len(cursor_token) % 4)
+        cursor_sort, value, user_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if cursor_sort != sort:
+            raise ValueError(f"cursor is for sort={cursor_sort}")
+        if sort == 'last_assessment':
+            return datetime.datetime.fromisoformat(value), int(user_id)
+        return int(value), int(user_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+
+@app.route('/api/admin/summary', methods=['GET'])
+@admin_required
+def get_admin_summary():
+    """
+    สรุปผลการประเมินของผู้ใช้แต่ละคนจาก user_assessment_totals (อัปเดตทุกครั้งที่บันทึกผล)
+    แบ่งหน้าด้วย cursor จึงใช้เวลาเท่ากันทุกหน้าไม่ว่าจะมีผลการประเมินสะสมเท่าใด
+    
+    Query parameters:
+        sort: last_assessment (ค่าเริ่มต้น), total, high, mid หรือ low
+        order: desc (ค่าเริ่มต้น) หรือ asc
+        limit: จำนวนผู้ใช้ต่อหน้า (ค่าเริ่มต้น RESULTS_PAGE_SIZE สูงสุด RESULTS_MAX_PAGE_SIZE)
+        cursor: ค่า next_cursor จากหน้าก่อนหน้า
+    """
+    sort = request.args.get('sort', 'last_assessment')
+    order = request.args.get('order', 'desc')
+    if sort not in SUMMARY_SORTS or order not in ('asc', 'desc'):
+        return jsonify({'error': f"sort must be one of {', '.join(SUMMARY_SORTS)} and order asc or desc"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', RESULTS_PAGE_SIZE)), 1), RESULTS_MAX_PAGE_SIZE)
+        cursor_token = request.args.get('cursor')
+        after = decode_summary_cursor(cursor_token, sort) if cursor_token else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    column = f"t.{SUMMARY_SORTS[sort]}"
+    direction, compare = ('DESC', '<') if order == 'desc' else ('ASC', '>')
+    query = """
+        SELECT t.user_id, u.username, u.full_name, t.total_assessments,
+               t.high_count, t.mid_count, t.low_count, t.last_assessment_date
+        FROM user_assessment_totals t
+        JOIN users u ON u.id = t.user_id
+        """
+    params = []
+    if after is not None:
+        query += f" WHERE ({column} {compare} %s OR ({column} = %s AND t.user_id {compare} %s))"
+        params += [after[0], after[0], after[1]]
+    query += f" ORDER BY {column} {direction}, t.user_id {direction} LIMIT %s"
+    params.append(limit + 1)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        users = cursor.fetchall()
+    finally:
+        # คืน connection ให้ pool แม้ query ล้มเหลว (pool มีขนาดจำกัด)
+        cursor.close()
+        conn.close()
+    
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_summary_cursor(sort, users[-1][SUMMARY_SORTS[sort]], users[-1]['user_id'])
+    
+    for user in users:
+        if user['last_assessment_date'] is not None:
+            user['last_assessment_date'] = user['last_assessment_date'].isoformat()
+    
+    return jsonify({'users': users, 'next_cursor': next_cursor}), 200
+
+@app.route('/api/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """ส่งคืนตัวนับสถิติของเซิร์ฟเวอร์ (เช่น hit/miss ของแคชคุณลักษณะ และเวลาที่ใช้บูต) เฉพาะผู้ดูแลระบบ"""
+    startup = dict(audio_processor.startup_timings, import_seconds=IMPORT_SECONDS)
+    return jsonify({
+        'feature_cache': feature_cache.stats(),
+        'startup': startup,
+        'model': audio_processor.model_info(),
+        'inference_batching': audio_processor.batching_stats(),
+        'jobs': job_manager.stats(),
+        'write_behind': write_behind.stats() if write_behind is not None else {'enabled': False},
+        'db_pool': connection_pool.stats() if connection_pool is not None else {'enabled': False},
+        'storage': upload_store.stats()
+    }), 200
+
+@app.route('/api/admin/reload-model', methods=['POST'])
+@admin_required
+def reload_model():
+    """โหลด models/model_bundle.npz ใหม่ ตรวจด้วย golden sample แล้วสลับเข้าใช้งานโดยไม่ต้องรีสตาร์ต"""
+    result = audio_processor.reload_model()
+    result['model'] = audio_processor.model_info()
+    return jsonify(result), (422 if result['error'] else 200)
 
 # เพิ่ม route สำหรับทรัพยากรคงที่ (static resources)
 @app.route('/static/<path:path>')
 def serve_static(path):
     return send_from_directory('static', path)
 
+# index ที่ต้องมี: (ตาราง, ชื่อ index, คอลัมน์)
+# ตารางที่เพิ่มเข้ามาภายหลัง (ตรงกับ schema_mysql.sql)
+REQUIRED_TABLES = {
+    'user_assessment_totals': """
+        CREATE TABLE IF NOT EXISTS user_assessment_totals (
+            user_id INT PRIMARY KEY,
+            total_assessments INT NOT NULL DEFAULT 0,
+            high_count INT NOT NULL DEFAULT 0,
+            mid_count INT NOT NULL DEFAULT 0,
+            low_count INT NOT NULL DEFAULT 0,
+            last_assessment_date TIMESTAMP NULL,
+            INDEX idx_totals_last_assessment (last_assessment_date, user_id),
+            INDEX idx_totals_total (total_assessments, user_id),
+            INDEX idx_totals_high (high_count, user_id),
+            INDEX idx_totals_mid (mid_count, user_id),
+            INDEX idx_totals_low (low_count, user_id),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """,
+}
+
+def ensure_tables(cursor):
+    """สร้างตารางใน REQUIRED_TABLES ที่ยังไม่มี"""
+    for table, ddl in REQUIRED_TABLES.items():
+        cursor.execute("SHOW TABLES LIKE %s", (table,))
+        if cursor.fetchall():
+            continue
+        print(f"Creating table {table}...")
+        cursor.execute(ddl)
+
+REQUIRED_INDEXES = [
+    # keyset pagination ของ /results (InnoDB ต่อท้าย id ใน secondary index ให้เอง)
+    ('audio_files', 'idx_audio_files_user_date', 'user_id, upload_date'),
+]
+
+def ensure_indexes(cursor):
+    """สร้าง index ใน REQUIRED_INDEXES ที่ยังไม่มี"""
+    for table, index_name, columns in REQUIRED_INDEXES:
+        cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index_name,))
+        if cursor.fetchall():
+            continue
+        print(f"Creating index {index_name} on {table} ({columns})...")
+        cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+
+# trigger เดิมที่ถูกแทนด้วยโค้ดของแอป (ต้องลบ ไม่เช่นนั้นจะนับซ้ำ)
+LEGACY_TRIGGERS = ['update_user_progress']
+
+def drop_legacy_triggers(cursor):
+    """ลบ trigger ใน LEGACY_TRIGGERS ที่ยังมีอยู่"""
+    for trigger in LEGACY_TRIGGERS:
+        cursor.execute("SHOW TRIGGERS WHERE `Trigger` = %s", (trigger,))
+        if not cursor.fetchall():
+            continue
+        print(f"Dropping trigger {trigger} (user_progress is now updated by the app)...")
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
 # ตรวจสอบการเชื่อมต่อฐานข้อมูลและสร้างตารางหากจำเป็น
 def init_db():
     try:
@@ -348,6 +1374,11 @@ def init_db():
             conn.commit()
             print("Tables created successfully.")
         
+        # เพิ่มตารางและ index ที่เพิ่มเข้ามาภายหลังให้ฐานข้อมูลที่สร้างไว้ก่อนแล้ว
+        ensure_tables(cursor)
+        ensure_indexes(cursor)
+        drop_legacy_triggers(cursor)
+        
         cursor.close()
         conn.close()
         
@@ -355,6 +1386,11 @@ def init_db():
         print(f"Database error: {e}")
         raise
 
+# สร้างทรัพยากรของ process (เมื่อใช้ gunicorn จะสร้างในแต่ละ worker หลัง fork แทน)
+if not PREFORK:
+    init_process_resources()
+    atexit.register(shutdown_process_resources)
+
 if __name__ == '__main__':
     # ตรวจสอบและสร้างตารางฐานข้อมูลหากจำเป็น
     try:
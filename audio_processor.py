@@ -3,46 +3,353 @@ audio_processor.py - คลาสและฟังก์ชันสำหร
 """
 
 import os
+import io
 import numpy as np
 import librosa
 import pickle  # ใช้ pickle แทน joblib
 import sys
+import time
+import wave
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+from datetime import datetime
 
-# เพิ่ม XGBoost ถ้าสามารถนำเข้าได้
-try:
-    import xgboost as xgb
-    has_xgboost = True
-except ImportError:
-    has_xgboost = False
-    print("Warning: XGBoost not available. Using simulation mode if model fails to load.")
+import wav_reader
+import streaming_features
+import rhythm_features
+from feature_kernel import FeatureKernel
+from tree_ensemble import TreeEnsemble
+from inference_batcher import InferenceBatcher
+import model_bundle
+
+# พารามิเตอร์ STFT ที่ใช้ร่วมกันทุกคุณลักษณะ (ตรงกับค่าเริ่มต้นของ librosa ที่ใช้ฝึกโมเดล)
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# เวอร์ชันสคีมาของเวกเตอร์คุณลักษณะ ต้องเพิ่มทุกครั้งที่วิธีสกัดคุณลักษณะเปลี่ยน เพื่อไม่ให้ใช้แคชเก่า
+FEATURE_SCHEMA_VERSION = '2'
+
+# ไดเรกทอรีโมเดลที่มากับโปรเจกต์ (อ้างอิงจากตำแหน่งของไฟล์นี้ ไม่ขึ้นกับไดเรกทอรีที่รันและตัวพิมพ์ของระบบไฟล์)
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# จำนวนคุณลักษณะต่อไฟล์ (ขนาดอินพุตของโมเดล)
+FEATURE_COUNT = 64
+
+# extract_features ต้องให้เวกเตอร์เดียวกับการเรียกฟังก์ชัน librosa แยกกันแบบเดิม (ที่ใช้ฝึกโมเดล)
+# ภายในความคลาดเคลื่อนนี้ (numpy.allclose) ตรวจใน tests/test_audio_features.py
+FEATURE_RTOL = 1e-5
+FEATURE_ATOL = 1e-4
+
+# ความน่าจะเป็นจาก TreeEnsemble ต้องต่างจาก model.predict_proba ไม่เกินค่านี้ จึงจะใช้แทนได้
+ENSEMBLE_TOLERANCE = 1e-5
+
+# จำนวน process สูงสุดของพูลสกัดคุณลักษณะ ไม่ว่าจะตั้งค่ามาเท่าใด
+MAX_FEATURE_WORKERS = 16
+
+# คุณลักษณะของ golden sample ที่สกัดได้ต้องต่างจากค่าที่บันทึกในไฟล์โมเดลไม่เกินค่านี้ (สัมพัทธ์)
+# จึงจะถือว่าตัวสกัดคุณลักษณะตรงกับที่ใช้สร้างไฟล์โมเดล
+GOLDEN_FEATURE_TOLERANCE = 1e-3
+
+# ความยาว (วินาที) และอัตราการสุ่มตัวอย่างของเสียงสังเคราะห์ที่ใช้ warm-up และเป็น golden sample
+# (ไม่ใช่ 16 kHz เพื่อให้ผ่านขั้นตอน resample เหมือนไฟล์ที่อัปโหลดจริง)
+WARMUP_SECONDS = 4.0
+WARMUP_SAMPLE_RATE = 44100
+
+# AudioProcessor ที่ process ลูกในพูลใช้สกัดคุณลักษณะ (กำหนดโดย _init_feature_worker)
+_worker_processor = None
+
+def _init_feature_worker(processor):
+    """initializer ของ process ลูก: เก็บ AudioProcessor ที่ได้รับมาจากการ fork"""
+    global _worker_processor
+    _worker_processor = processor
+
+def _extract_features_in_worker(source):
+    """สกัดคุณลักษณะภายใน process ลูกของพูล"""
+    return _worker_processor.extract_features(source)
+
+def _synthetic_wav(seconds, sample_rate):
+    """
+    สร้างไฟล์ WAV (PCM 16 บิต mono) ในหน่วยความจำ เป็นเสียงคล้ายพยางค์สลับกับช่วงเงียบ
+    เพื่อให้ทุกคุณลักษณะ (รวมถึงการแบ่งช่วงเงียบ) ได้ค่าที่ไม่เป็นศูนย์
+    
+    Returns:
+        bytes: ไบต์ของไฟล์ WAV
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140.0 + 30.0 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    # พยางค์ยาว 0.3 วินาที ทุก 0.5 วินาที
+    envelope = ((t % 0.5) < 0.3) * np.sin(np.pi * (t % 0.5) / 0.3) ** 2
+    noise = np.random.default_rng(0).normal(scale=0.01, size=len(t))
+    signal = 0.3 * voice * envelope + noise
+    
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes((np.clip(signal, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+def _file_signature(path):
+    """(mtime, ขนาด, inode) ของไฟล์ ใช้ตรวจว่าไฟล์ถูกแทนที่หรือไม่ (None ถ้าไม่มีไฟล์)"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+def _noop():
+    """งานว่างสำหรับบังคับให้พูลสร้าง process ลูกตั้งแต่เริ่มต้น"""
+    return os.getpid()
+
+class AudioValidationError(ValueError):
+    """
+    ไฟล์เสียงไม่ผ่านการตรวจสอบเบื้องต้น (pre-flight) ก่อนเริ่มประมวลผล DSP
+    
+    Attributes:
+        code (str): รหัสข้อผิดพลาด ('invalid_wav', 'empty' หรือ 'too_long')
+        message (str): คำอธิบายข้อผิดพลาด
+    """
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+    
+    def to_dict(self):
+        """แปลงเป็น dict สำหรับส่งกลับใน API"""
+        return {'code': self.code, 'message': self.message}
 
 class AudioProcessor:
     """
     คลาสสำหรับการประมวลผลไฟล์เสียงและการจำแนกด้วยโมเดล XGBoost ที่เทรนแล้ว
     """
-    def __init__(self, models_dir='Models'):
+    def __init__(self, models_dir=MODELS_DIR, feature_workers=0, feature_cache=None,
+                 max_duration=None, truncate_long_audio=True, streaming_min_duration=None,
+                 lazy_init=False, warmup=False, load_model=True, batch_window=None, batch_max_rows=64):
         """
         เริ่มต้นคลาส AudioProcessor
         
         Args:
             models_dir (str): พาธไปยังไดเรกทอรีที่เก็บโมเดลที่เทรนแล้ว
+            feature_workers (int): จำนวน process สำหรับสกัดคุณลักษณะแบบขนาน
+                (0 หรือ 1 = สกัดใน process เดียวกัน)
+            feature_cache (FeatureCache): แคชเวกเตอร์คุณลักษณะ (None = ไม่ใช้แคช)
+            max_duration (float): ความยาวเสียงสูงสุดเป็นวินาที (None = ไม่จำกัด)
+            truncate_long_audio (bool): True = ตัดไฟล์ที่ยาวเกินให้เหลือ max_duration,
+                False = ปฏิเสธไฟล์ที่ยาวเกิน
+            streaming_min_duration (float): ไฟล์ WAV ที่ยาวตั้งแต่ค่านี้ (วินาที) จะถูกสกัดแบบอ่านทีละบล็อก
+                ซึ่งใช้หน่วยความจำคงที่ (None = โหลดทั้งไฟล์เสมอ)
+            lazy_init (bool): เลื่อนการสร้าง FeatureKernel (และการโหลดโมดูลย่อยของ librosa/scipy)
+                ไปจนถึงการสกัดคุณลักษณะครั้งแรก ทำให้บูตเร็วแต่คำขอแรกช้า
+            warmup (bool): เรียก warm_up() ก่อนเริ่มพูล เพื่อให้คำขอแรกไม่ต้องรอ import และ JIT
+            load_model (bool): False = ใช้เฉพาะการสกัดคุณลักษณะ ไม่โหลดโมเดล (เช่น ตอนแปลงไฟล์โมเดล)
+            batch_window (float): เวลาสูงสุด (วินาที) ที่รวมคุณลักษณะจากคำขอที่มาพร้อมกันก่อนทำนายเป็นชุดเดียว
+                (None หรือ 0 = ทำนายแต่ละคำขอแยกกัน)
+            batch_max_rows (int): จำนวนแถวสูงสุดต่อชุดการทำนาย
         """
         self.models_dir = models_dir
         # กำหนดค่าเริ่มต้นเป็น None เสมอ
         self.model = None
         self.scaler = None
         self.label_encoder = None
+        # ตัวประเมินต้นไม้ด้วย NumPy ที่แปลงจาก self.model (None = ใช้ model.predict_proba)
+        self.ensemble = None
+        # manifest ของ model_bundle.npz ที่โหลด (None = โหลดจากไฟล์ .pkl เดิม)
+        self.model_manifest = None
+        # เวอร์ชันของโมเดลที่ใช้ (แนบไปกับผลการจำแนกทุกไฟล์)
+        self.model_version = None
+        self.model_loaded_at = None
+        # สถานะการโหลดโมเดลใหม่ขณะทำงาน (ดู reload_model)
+        self.model_reloads = 0
+        self.last_reload_error = None
+        # ล็อกสำหรับอ่าน/สลับชุดโมเดลพร้อมกันทุกตัว และล็อกที่ให้มีการโหลดใหม่ได้ทีละครั้ง
+        self._model_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_stop = threading.Event()
+        self._bundle_signature = None
+        self._golden_features = None
+        self.feature_cache = feature_cache
+        self.max_duration = max_duration
+        self.truncate_long_audio = truncate_long_audio
+        self.streaming_min_duration = streaming_min_duration
+        self._feature_pool = None
+        # ตัวรวมการทำนายข้ามคำขอ (เธรดเริ่มเมื่อมีคำขอแรก จึงไม่ติดไปกับการ fork)
+        self._batcher = None
+        if batch_window:
+            self._batcher = InferenceBatcher(self._score_features, window=batch_window, max_rows=batch_max_rows)
+        # เวลาที่ใช้ในแต่ละขั้นตอนของการบูต (วินาที)
+        self.startup_timings = {}
+        
+        # เมทริกซ์คงที่ของการสกัดคุณลักษณะ สร้างครั้งเดียวและใช้ร่วมกับ process ลูกผ่าน fork
+        self._kernel = None
         
         # สร้างโฟลเดอร์โมเดลหากยังไม่มี
         os.makedirs(models_dir, exist_ok=True)
         
         print("กำลังพยายามโหลดโมเดล...")
         # พยายามโหลดโมเดล แต่จัดการกับข้อผิดพลาดอย่างครอบคลุม
-        self._attempt_load_model()
+        started = time.perf_counter()
+        if load_model:
+            self._attempt_load_model()
+            self._compile_ensemble()
+            self.model_version = self._describe_model_version()
+            self.model_loaded_at = time.time()
+        self.startup_timings['model_load_seconds'] = round(time.perf_counter() - started, 3)
+        
+        if not lazy_init:
+            self._kernel = self._build_kernel()
+        if warmup:
+            self.warm_up()
+        
+        # เริ่มพูลสกัดคุณลักษณะครั้งเดียวตอนบูต (หลัง warm-up เพื่อให้ process ลูกได้รับโมดูลที่โหลดแล้วผ่าน fork)
+        self.start_feature_pool(feature_workers)
+    
+    @property
+    def kernel(self):
+        """FeatureKernel ที่ 16 kHz (สร้างเมื่อใช้ครั้งแรก ถ้าเปิด lazy_init)"""
+        if self._kernel is None:
+            self._kernel = self._build_kernel()
+        return self._kernel
+    
+    def _build_kernel(self):
+        """สร้าง FeatureKernel ที่ 16 kHz และบันทึกเวลาที่ใช้"""
+        started = time.perf_counter()
+        kernel = FeatureKernel(sr=16000, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        self.startup_timings['kernel_seconds'] = round(time.perf_counter() - started, 3)
+        return kernel
+    
+    def warm_up(self):
+        """
+        สกัดคุณลักษณะและทำนายเสียงสังเคราะห์หนึ่งไฟล์ผ่านเส้นทางเดียวกับคำขอจริง
+        (อ่าน header, ถอดรหัส + resample, สกัดคุณลักษณะ, ปรับมาตรฐาน และทำนาย)
+        
+        ทำให้โมดูลย่อยของ librosa ที่โหลดแบบ lazy, ฟังก์ชันที่ numba คอมไพล์ตอนเรียกครั้งแรก
+        และ FeatureKernel พร้อมก่อนรับคำขอแรก ผลลัพธ์ไม่ถูกเก็บในแคชคุณลักษณะ
+        
+        Returns:
+            bool: True ถ้าสกัดคุณลักษณะและทำนายสำเร็จ
+        """
+        started = time.perf_counter()
+        audio = _synthetic_wav(WARMUP_SECONDS, WARMUP_SAMPLE_RATE)
+        
+        features = self.extract_features(audio)
+        success = bool(np.any(features))
+        if success:
+            self._golden_features = features
+        if success and self.model is not None and self.scaler is not None:
+            self._predict_features(features[np.newaxis], ['warm-up.wav'])
+        # เส้นทางสกัดแบบทีละบล็อกใช้ตัว resample แบบ stream และ onset/tempo แบบสะสม
+        if self.streaming_min_duration is not None:
+            success = bool(np.any(self._extract_features_streaming(audio))) and success
+        
+        elapsed = time.perf_counter() - started
+        self.startup_timings['warmup_seconds'] = round(elapsed, 3)
+        if success:
+            print(f"Warm-up finished in {elapsed:.2f}s")
+        else:
+            print(f"Warning: warm-up could not extract features ({elapsed:.2f}s)")
+        return success
+    
+    def start_feature_pool(self, feature_workers):
+        """
+        สร้าง process pool สำหรับสกัดคุณลักษณะของไฟล์ในคำขอเดียวกันแบบขนาน
+        
+        พูลใช้วิธี fork เพื่อให้ process ลูกได้รับ AudioProcessor นี้โดยไม่ต้อง import
+        โมดูลหลักใหม่ บนแพลตฟอร์มที่ไม่รองรับ fork (เช่น Windows) จะสกัดใน process เดียวกันแทน
+        
+        Args:
+            feature_workers (int): จำนวน process ที่ต้องการ
+        """
+        workers = min(int(feature_workers or 0), os.cpu_count() or 1, MAX_FEATURE_WORKERS)
+        if workers <= 1 or self._feature_pool is not None:
+            return
+        
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            print("Warning: 'fork' start method not available. Feature extraction runs in-process.")
+            return
+        
+        try:
+            self._feature_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_feature_worker,
+                initargs=(self,)
+            )
+            # ส่งงานว่างเพื่อให้ process ลูกถูกสร้างทั้งหมดตอนบูต ไม่ใช่ระหว่างคำขอแรก
+            wait([self._feature_pool.submit(_noop) for _ in range(workers)])
+            print(f"Feature extraction pool started with {workers} workers")
+        except Exception as e:
+            print(f"Failed to start feature extraction pool: {e}. Feature extraction runs in-process.")
+            self._feature_pool = None
+    
+    def close(self):
+        """หยุดการเฝ้าดูไฟล์โมเดล ตัวรวมการทำนาย และพูลสกัดคุณลักษณะ (ถ้ามี)"""
+        self.stop_model_watcher()
+        if self._batcher is not None:
+            batcher, self._batcher = self._batcher, None
+            batcher.close()
+        if self._feature_pool is not None:
+            self._feature_pool.shutdown(wait=True)
+            self._feature_pool = None
+    
+    def __getstate__(self):
+        # พูลไม่สามารถส่งข้าม process ได้ process ลูกจึงได้รับสำเนาที่ไม่มีพูล
+        state = self.__dict__.copy()
+        state['_feature_pool'] = None
+        # ล็อกและเธรดเฝ้าดูไฟล์โมเดลส่งข้าม process ไม่ได้ (process ลูกใช้เพียงการสกัดคุณลักษณะ)
+        for name in ('_model_lock', '_reload_lock', '_watcher', '_watcher_stop', '_batcher'):
+            state[name] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._model_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher_stop = threading.Event()
+    
+    def _load_bundle(self):
+        """
+        โหลด model_bundle.npz (อ่านไฟล์ครั้งเดียว ไม่ unpickle และไม่ต้อง import xgboost/scikit-learn)
+        
+        Returns:
+            bool: True ถ้าโหลดสำเร็จ False ถ้าไม่มีไฟล์หรือไฟล์ใช้ไม่ได้ (จะโหลดไฟล์ .pkl เดิมแทน)
+        """
+        path = os.path.join(self.models_dir, model_bundle.BUNDLE_FILENAME)
+        if not os.path.exists(path):
+            return False
+        
+        try:
+            bundle = model_bundle.load_bundle(path)
+        except (OSError, ValueError) as e:
+            print(f"Failed to load model bundle: {e}")
+            return False
+        
+        manifest = bundle.manifest
+        if bundle.ensemble.n_features != FEATURE_COUNT:
+            print(f"Model bundle expects {bundle.ensemble.n_features} features, extractor produces {FEATURE_COUNT}")
+            return False
+        if manifest.get('feature_schema_version') != FEATURE_SCHEMA_VERSION:
+            print(f"Warning: model bundle was built for feature schema {manifest.get('feature_schema_version')}, "
+                  f"current schema is {FEATURE_SCHEMA_VERSION}")
+        
+        self._install_bundle(bundle)
+        self._bundle_signature = _file_signature(path)
+        print(f"Successfully loaded model bundle ({len(bundle.ensemble.roots)} trees, "
+              f"sha256 {manifest['sha256'][:12]})")
+        return True
     
     def _attempt_load_model(self):
         """ทำการพยายามโหลดโมเดลด้วยวิธีการต่างๆ"""
+        # 0. ไฟล์โมเดลแบบรวม (เร็วที่สุด) ถ้าไม่มีจึงใช้ไฟล์ .pkl เดิม
+        if self._load_bundle():
+            return
+        
         success = False
         
         # ลองโหลดโมเดล XGBoost ก่อน
@@ -93,10 +400,11 @@ class AudioProcessor:
                     print(f"Failed to load with joblib: {e}")
             
             # 4. สร้างโมเดลจากไฟล์ model_info.json ถ้ามี
-            if not success and has_xgboost:
+            if not success:
                 print("Attempting to rebuild model from model_info.json...")
                 try:
                     import json
+                    import xgboost as xgb
                     model_info_path = os.path.join(self.models_dir, 'model_info.json')
                     if os.path.exists(model_info_path):
                         with open(model_info_path, 'r') as f:
@@ -149,179 +457,790 @@ class AudioProcessor:
             print(f"Unexpected error during model loading: {e}")
             print("Using simulation mode.")
     
+    def _compile_ensemble(self):
+        """
+        แปลง booster ของโมเดลที่โหลดแล้วเป็น TreeEnsemble สำหรับทำนายด้วย NumPy
+        
+        ตรวจเทียบกับ model.predict_proba บนข้อมูลสุ่มชุดหนึ่งก่อน ถ้าต่างเกิน ENSEMBLE_TOLERANCE
+        หรือแปลงไม่ได้ (เช่น objective ที่ไม่รองรับ) จะใช้ model.predict_proba ตามเดิม
+        """
+        if self.model is None or not hasattr(self.model, 'get_booster'):
+            return
+        
+        try:
+            ensemble = TreeEnsemble.from_xgb_model(self.model)
+            probe = np.random.default_rng(0).normal(size=(256, ensemble.n_features))
+            error = np.max(np.abs(ensemble.predict_proba(probe) - self.model.predict_proba(probe)))
+            if error > ENSEMBLE_TOLERANCE:
+                print(f"NumPy tree ensemble differs from XGBoost by {error:.2e}. Using model.predict_proba.")
+                return
+            self.ensemble = ensemble
+            print(f"Compiled {len(ensemble.roots)} trees for NumPy inference (max difference {error:.2e})")
+        except Exception as e:
+            print(f"Cannot compile model for NumPy inference: {e}. Using model.predict_proba.")
+    
+    def _install_bundle(self, bundle):
+        """สลับชุดโมเดล (โมเดล, scaler, รายชื่อคลาส, เวอร์ชัน) เป็นของ bundle ในครั้งเดียว"""
+        with self._model_lock:
+            # TreeEnsemble มี predict_proba จึงใช้เป็น self.model ได้โดยตรง
+            self.model = self.ensemble = bundle.ensemble
+            self.scaler = bundle.scaler
+            self.label_encoder = bundle.labels
+            self.model_manifest = bundle.manifest
+            self.model_version = self._describe_model_version()
+            self.model_loaded_at = time.time()
+    
+    def _describe_model_version(self):
+        """เวอร์ชันของโมเดล: 12 ตัวแรกของ sha256 ของ bundle หรือ 'legacy-pkl' ถ้าโหลดจากไฟล์ .pkl"""
+        if self.model_manifest is not None:
+            return self.model_manifest['sha256'][:12]
+        if self.model is not None and self.scaler is not None:
+            return 'legacy-pkl'
+        return None
+    
+    def _model_state(self):
+        """
+        อ่านชุดโมเดลปัจจุบันพร้อมกันทุกตัว คำขอที่อ่านไปแล้วจะใช้ชุดเดิมจนเสร็จแม้มีการสลับโมเดลระหว่างนั้น
+        
+        Returns:
+            tuple: (model, ensemble, scaler, label_encoder, model_version)
+        """
+        with self._model_lock:
+            return self.model, self.ensemble, self.scaler, self.label_encoder, self.model_version
+    
+    def golden_features(self):
+        """คุณลักษณะของ golden sample (เสียงสังเคราะห์เดียวกับที่ใช้ warm-up) สกัดครั้งเดียวต่อ process"""
+        if self._golden_features is None:
+            self._golden_features = self.extract_features(_synthetic_wav(WARMUP_SECONDS, WARMUP_SAMPLE_RATE))
+        return self._golden_features
+    
+    def _validate_bundle(self, bundle):
+        """
+        ตรวจ bundle ใหม่ก่อนสลับเข้าใช้งาน
+        
+        - จำนวนคุณลักษณะและเวอร์ชันสคีมาต้องตรงกับตัวสกัดปัจจุบัน
+        - ถ้า bundle มี golden sample คุณลักษณะที่สกัดได้ตอนนี้ต้องตรงกับที่บันทึกไว้
+          และ TreeEnsemble ต้องให้ความน่าจะเป็นเท่ากับโมเดลต้นฉบับ
+        - ความน่าจะเป็นของ golden sample ต้องเป็นการแจกแจงที่ถูกต้อง
+        
+        Raises:
+            model_bundle.BundleError: ถ้าไม่ผ่านข้อใดข้อหนึ่ง
+        """
+        manifest = bundle.manifest
+        if bundle.ensemble.n_features != FEATURE_COUNT:
+            raise model_bundle.BundleError(
+                f"bundle expects {bundle.ensemble.n_features} features, extractor produces {FEATURE_COUNT}")
+        if manifest.get('feature_schema_version') != FEATURE_SCHEMA_VERSION:
+            raise model_bundle.BundleError(
+                f"bundle was built for feature schema {manifest.get('feature_schema_version')}, "
+                f"extractor uses {FEATURE_SCHEMA_VERSION}")
+        
+        features = self.golden_features()
+        if bundle.golden is not None:
+            expected_features, expected_probabilities = bundle.golden
+            if not np.allclose(features, expected_features,
+                               rtol=GOLDEN_FEATURE_TOLERANCE, atol=GOLDEN_FEATURE_TOLERANCE):
+                raise model_bundle.BundleError("golden sample features differ from the ones stored in the bundle")
+            probabilities = bundle.ensemble.predict_proba(bundle.scaler.transform(expected_features[np.newaxis]))[0]
+            error = np.max(np.abs(probabilities - expected_probabilities))
+            if error > ENSEMBLE_TOLERANCE:
+                raise model_bundle.BundleError(f"golden sample probabilities differ by {error:.2e}")
+        
+        probabilities = bundle.ensemble.predict_proba(bundle.scaler.transform(features[np.newaxis]))[0]
+        if (len(probabilities) != len(bundle.labels.classes_) or not np.all(np.isfinite(probabilities))
+                or abs(probabilities.sum() - 1.0) > 1e-6):
+            raise model_bundle.BundleError("bundle does not produce valid probabilities")
+    
+    def reload_model(self):
+        """
+        โหลด model_bundle.npz ใหม่ ตรวจด้วย golden sample แล้วสลับเข้าแทนโมเดลเดิมในครั้งเดียว
+        
+        คำขอที่กำลังทำงานอยู่จะใช้โมเดลเดิมจนเสร็จ ถ้าไฟล์ใหม่ไม่ผ่านการตรวจจะใช้โมเดลเดิมต่อไป
+        แคชคุณลักษณะยังใช้ได้ตามเดิมเพราะคุณลักษณะไม่ขึ้นกับโมเดล
+        
+        Returns:
+            dict: {'reloaded': bool, 'model_version': str, 'previous_version': str, 'error': str หรือ None}
+        """
+        path = os.path.join(self.models_dir, model_bundle.BUNDLE_FILENAME)
+        with self._reload_lock:
+            previous = self.model_version
+            signature = _file_signature(path)
+            try:
+                bundle = model_bundle.load_bundle(path)
+                if self.model_manifest is not None and bundle.manifest['sha256'] == self.model_manifest['sha256']:
+                    self._bundle_signature = signature
+                    return {'reloaded': False, 'model_version': previous, 'previous_version': previous, 'error': None}
+                self._validate_bundle(bundle)
+            except (OSError, ValueError) as e:
+                # จำไฟล์ที่ไม่ผ่านไว้ เพื่อไม่ให้เธรดเฝ้าดูลองไฟล์เดิมซ้ำ
+                self._bundle_signature = signature
+                self.last_reload_error = str(e)
+                print(f"Model reload rejected: {e}. Keeping model {previous}")
+                return {'reloaded': False, 'model_version': previous, 'previous_version': previous, 'error': str(e)}
+            
+            self._install_bundle(bundle)
+            self._bundle_signature = signature
+            self.model_reloads += 1
+            self.last_reload_error = None
+            print(f"Model reloaded: {previous} -> {self.model_version}")
+            return {'reloaded': True, 'model_version': self.model_version, 'previous_version': previous, 'error': None}
+    
+    def start_model_watcher(self, interval):
+        """
+        เฝ้าดู model_bundle.npz ในเธรดเบื้องหลัง และเรียก reload_model เมื่อไฟล์เปลี่ยน
+        
+        Args:
+            interval (float): ระยะห่างระหว่างการตรวจไฟล์ (วินาที) 0 หรือน้อยกว่า = ไม่เฝ้าดู
+        """
+        if interval <= 0 or self._watcher is not None:
+            return
+        if self._bundle_signature is None:
+            self._bundle_signature = _file_signature(os.path.join(self.models_dir, model_bundle.BUNDLE_FILENAME))
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch_models, args=(interval,), name='model_watcher', daemon=True)
+        self._watcher.start()
+        print(f"Watching {self.models_dir} for model updates every {interval:g}s")
+    
+    def stop_model_watcher(self):
+        """หยุดเธรดเฝ้าดูไฟล์โมเดล (ถ้ามี)"""
+        if self._watcher is not None:
+            self._watcher_stop.set()
+            self._watcher.join()
+            self._watcher = None
+    
+    def _watch_models(self, interval):
+        path = os.path.join(self.models_dir, model_bundle.BUNDLE_FILENAME)
+        while not self._watcher_stop.wait(interval):
+            signature = _file_signature(path)
+            if signature is not None and signature != self._bundle_signature:
+                try:
+                    self.reload_model()
+                except Exception as e:
+                    print(f"Unexpected error while reloading model: {e}")
+    
+    def model_info(self):
+        """
+        ข้อมูลของโมเดลที่ใช้อยู่ สำหรับ /api/metrics
+        
+        Returns:
+            dict: เวอร์ชัน, แหล่งที่โหลด, เวอร์ชันสคีมา, เวลาที่โหลด และสถานะการโหลดใหม่
+        """
+        with self._model_lock:
+            manifest = self.model_manifest or {}
+            if self.model_manifest is not None:
+                source = 'bundle'
+            else:
+                source = 'pickle' if self.model is not None else None
+            loaded_at = self.model_loaded_at
+            version = self.model_version
+        return {
+            'version': version,
+            'source': source,
+            'sha256': manifest.get('sha256'),
+            'created': manifest.get('created'),
+            'feature_schema_version': manifest.get('feature_schema_version'),
+            'loaded_at': datetime.fromtimestamp(loaded_at).isoformat(timespec='seconds') if loaded_at else None,
+            'reloads': self.model_reloads,
+            'last_reload_error': self.last_reload_error,
+            'watching': self._watcher is not None
+        }
+    
+    def batching_stats(self):
+        """
+        สถิติของตัวรวมการทำนายข้ามคำขอ สำหรับ /api/metrics
+        
+        Returns:
+            dict: จำนวนชุด, ขนาดชุดเฉลี่ย, เวลารอ และฮิสโตแกรมขนาดชุดและความยาวคิว
+        """
+        batcher = self._batcher
+        if batcher is None:
+            return {'enabled': False}
+        return dict(enabled=True, **batcher.stats())
+    
     def extract_features(self, file_path):
         """
         สกัดคุณลักษณะจากไฟล์เสียงเพื่อให้ตรงกับที่ใช้ฝึกโมเดล
         
         Args:
-            file_path (str): พาธไปยังไฟล์เสียง WAV
+            file_path (str | bytes | file-like): พาธไปยังไฟล์เสียง WAV, ไบต์ของไฟล์,
+                file-like object หรือ werkzeug FileStorage ที่อัปโหลดเข้ามา
             
         Returns:
             numpy.ndarray: เวกเตอร์คุณลักษณะที่มีความยาว 64 ตัว
         """
         try:
-            # โหลดไฟล์เสียง
-            y, sr = librosa.load(file_path, sr=16000)
+            # ไฟล์ยาวสกัดทีละบล็อกเพื่อไม่ให้หน่วยความจำโตตามความยาวไฟล์
+            if self._should_stream(file_path):
+                return self._extract_features_streaming(file_path)
+            
+            # โหลดไฟล์เสียง (ถอดรหัสจากหน่วยความจำโดยตรงถ้าไม่ใช่พาธ)
+            y, sr = self.load_audio(file_path)
             
             # ตรวจสอบว่าไฟล์เสียงไม่ว่าง
             if len(y) == 0:
-                print(f"Warning: {file_path} is empty.")
+                print(f"Warning: {self._source_name(file_path)} is empty.")
                 return np.zeros(64)
             
-            # 1. MFCC คุณลักษณะ
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
-            mfcc_stats = np.hstack([
-                np.mean(mfccs, axis=1),
-                np.std(mfccs, axis=1)
-            ])
+            return self._features_from_signal(y, sr)
             
-            # 2. คุณลักษณะทาง spectral
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+        except Exception as e:
+            print(f"เกิดข้อผิดพลาดในการสกัดคุณลักษณะ: {e}")
+            # ในกรณีที่มีข้อผิดพลาด ให้คืนค่าอาร์เรย์ศูนย์
+            return np.zeros(64)  # คืนค่าอาร์เรย์ศูนย์ขนาด 64 ตัว
+    
+    def load_audio(self, source, sr=16000):
+        """
+        ถอดรหัสไฟล์เสียงเป็นสัญญาณ mono float32 ที่อัตรา sr
+        
+        ใช้ตัวอ่าน WAV ของโปรเจกต์ (wav_reader) ซึ่งอ่าน PCM โดยตรงและข้ามการ resample
+        เมื่อไฟล์เป็น 16 kHz อยู่แล้ว ถ้าไฟล์ไม่ใช่ WAV ที่รองรับจึงใช้ librosa.load
+        
+        Args:
+            source (str | bytes | file-like): พาธ, ไบต์ หรือ buffer ของไฟล์เสียง
+            sr (int): อัตราการสุ่มตัวอย่างที่ต้องการ
             
-            spectral_stats = np.hstack([
-                [np.mean(spectral_centroids), np.std(spectral_centroids)],
-                [np.mean(spectral_rolloff), np.std(spectral_rolloff)]
-            ])
+        Returns:
+            tuple: (สัญญาณ numpy.ndarray, อัตราการสุ่มตัวอย่าง)
+        """
+        try:
+            return wav_reader.read_wav(source, sr=sr, max_duration=self.max_duration)
+        except wav_reader.WavFormatError as e:
+            print(f"Fast WAV reader cannot decode {self._source_name(source)} ({e}). Using librosa.load.")
+            return librosa.load(self._audio_input(source), sr=sr, duration=self.max_duration)
+    
+    def _should_stream(self, source):
+        """
+        ตรวจจาก header ว่าไฟล์ยาวพอที่จะสกัดแบบอ่านทีละบล็อกหรือไม่
+        
+        Args:
+            source (str | bytes | file-like): พาธ, ไบต์ หรือ buffer ของไฟล์เสียง
             
-            # 3. คุณลักษณะเกี่ยวกับความดัง
-            rms = librosa.feature.rms(y=y)[0]
-            zero_crossing_rate = librosa.feature.zero_crossing_rate(y=y)[0]
+        Returns:
+            bool: True ถ้าเป็น WAV ที่ตัวอ่านรองรับและยาวตั้งแต่ streaming_min_duration
+        """
+        if self.streaming_min_duration is None:
+            return False
+        
+        stream, owned = wav_reader.open_source(source)
+        try:
+            info = wav_reader.read_wav_info(stream)
+        except wav_reader.WavFormatError:
+            return False
+        finally:
+            if owned:
+                stream.close()
+        
+        duration = info.n_frames / info.sample_rate
+        if self.max_duration is not None:
+            duration = min(duration, self.max_duration)
+        return duration >= self.streaming_min_duration
+    
+    def _extract_features_streaming(self, source, sr=16000):
+        """
+        สกัดคุณลักษณะโดยอ่านไฟล์ทีละบล็อก (ดู streaming_features.StreamingFeatureExtractor)
+        
+        Args:
+            source (str | bytes | file-like): พาธ, ไบต์ หรือ buffer ของไฟล์ WAV
+            sr (int): อัตราการสุ่มตัวอย่างที่ใช้สกัด
             
-            volume_stats = np.hstack([
-                [np.mean(rms), np.std(rms)],
-                [np.mean(zero_crossing_rate), np.std(zero_crossing_rate)]
-            ])
+        Returns:
+            numpy.ndarray: เวกเตอร์คุณลักษณะที่มีความยาว 64 ตัว
+        """
+        extractor = streaming_features.StreamingFeatureExtractor(self._kernel_for(sr))
+        features = extractor.extract(
+            lambda: wav_reader.iter_wav(source, sr=sr, max_duration=self.max_duration)
+        )
+        if not np.any(features):
+            print(f"Warning: {self._source_name(source)} is empty.")
+        return features
+    
+    def validate_audio(self, source):
+        """
+        ตรวจสอบไฟล์เสียงเบื้องต้นจาก RIFF header เท่านั้น (ไม่ถอดรหัสข้อมูลเสียง)
+        
+        ไฟล์ที่ยาวเกิน max_duration จะถูกปฏิเสธ หรือถูกทำเครื่องหมายว่าจะถูกตัด
+        ตามค่า truncate_long_audio ไฟล์ WAV ที่ใช้รูปแบบข้อมูลที่ตัวอ่านไม่รองรับ
+        จะผ่านการตรวจสอบ และถูกจำกัดความยาวตอนโหลดด้วย librosa แทน
+        
+        Args:
+            source (str | bytes | file-like): พาธ, ไบต์ หรือ buffer ของไฟล์เสียง
             
-            # 4. คุณลักษณะเกี่ยวกับ pitch และ rhythm
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+        Returns:
+            dict: ข้อมูลของไฟล์ (sample_rate, channels, bits_per_sample, duration, truncated)
             
-            # แก้ไข: ใช้ librosa.feature.rhythm.tempo หรือ librosa.beat.tempo ขึ้นอยู่กับเวอร์ชันที่มี
-            tempo = 120.0  # default fallback value
-            try:
-                # Try the newer api first
-                from librosa.feature import rhythm
-                tempo = rhythm.tempo(y=y, sr=sr)[0]
-            except (ImportError, AttributeError):
-                try:
-                    # For older versions
-                    import warnings
-                    with warnings.catch_warnings():
-                        warnings.simplefilter("ignore")
-                        tempo = librosa.beat.tempo(y=y, sr=sr)[0]
-                except Exception as e:
-                    print(f"Cannot get tempo: {e}")
+        Raises:
+            AudioValidationError: ถ้าไฟล์เสียหาย ว่างเปล่า หรือยาวเกินกำหนด
+        """
+        try:
+            stream, owned = wav_reader.open_source(source)
+        except OSError as e:
+            raise AudioValidationError('invalid_wav', f"ไม่สามารถเปิดไฟล์ได้: {e}")
+        
+        try:
+            info = wav_reader.read_wav_info(stream)
+        except wav_reader.UnsupportedWavFormat:
+            return {'sample_rate': None, 'channels': None, 'bits_per_sample': None,
+                    'duration': None, 'truncated': False}
+        except wav_reader.WavFormatError as e:
+            raise AudioValidationError('invalid_wav', f"ไฟล์ไม่ใช่ WAV ที่ถูกต้อง ({e})")
+        finally:
+            if owned:
+                stream.close()
+        
+        if info.n_frames == 0:
+            raise AudioValidationError('empty', "ไฟล์เสียงว่างเปล่า")
+        
+        duration = info.n_frames / info.sample_rate
+        truncated = False
+        if self.max_duration is not None and duration > self.max_duration:
+            if not self.truncate_long_audio:
+                raise AudioValidationError(
+                    'too_long',
+                    f"ไฟล์เสียงยาว {duration:.1f} วินาที เกินขีดจำกัด {self.max_duration:g} วินาที"
+                )
+            truncated = True
+        
+        return {
+            'sample_rate': info.sample_rate,
+            'channels': info.channels,
+            'bits_per_sample': info.bits_per_sample,
+            'duration': duration,
+            'truncated': truncated
+        }
+    
+    def _kernel_for(self, sr):
+        """FeatureKernel ของอัตราการสุ่มตัวอย่าง sr (สร้างใหม่เฉพาะเมื่อไม่ใช่ 16 kHz)"""
+        if sr == self.kernel.sr:
+            return self.kernel
+        return FeatureKernel(sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    
+    def _spectral_frontend(self, y, sr, kernel=None):
+        """
+        คำนวณ STFT เพียงครั้งเดียวต่อไฟล์ แล้วสร้างสเปกตรัมที่ทุกคุณลักษณะใช้ร่วมกัน
+        
+        ค่าพารามิเตอร์ (n_fft=2048, hop_length=512, hann, center=True) ตรงกับค่าเริ่มต้น
+        ของ librosa ที่ฟังก์ชัน mfcc, spectral_centroid, spectral_rolloff, chroma_stft
+        และ onset_strength ใช้อยู่เดิม ดังนั้นผลลัพธ์จึงเหมือนกับการเรียกแยกกัน
+        
+        Args:
+            y (numpy.ndarray): สัญญาณเสียง mono
+            sr (int): อัตราการสุ่มตัวอย่าง
+            kernel (FeatureKernel): เมทริกซ์ที่สร้างไว้แล้ว (None = ใช้ของอัตรา sr)
             
-            pitch_rhythm_stats = np.hstack([
-                [tempo],
-                np.mean(chroma, axis=1)
-            ])
+        Returns:
+            dict: magnitude, power และ log-mel spectrogram
+        """
+        kernel = kernel or self._kernel_for(sr)
+        magnitude = kernel.stft_magnitude(y)
+        power = magnitude ** 2
+        mel = kernel.mel(power)
+        
+        return {
+            'magnitude': magnitude,
+            'power': power,
+            'log_mel': librosa.power_to_db(mel)
+        }
+    
+    def _split_from_rms(self, rms, n_samples, top_db=30):
+        """
+        หาช่วงที่ไม่เงียบจากค่า RMS ที่คำนวณไว้แล้ว (เทียบเท่า librosa.effects.split)
+        
+        Args:
+            rms (numpy.ndarray): ค่า RMS รายเฟรม (frame_length=2048, hop_length=512)
+            n_samples (int): จำนวนตัวอย่างของสัญญาณ
+            top_db (float): เกณฑ์ความเงียบ (dB ต่ำกว่าค่าสูงสุด)
             
-            # 5. คุณลักษณะเกี่ยวกับความเงียบ
-            non_silent = librosa.effects.split(y, top_db=30)
-            total_duration = len(y) / sr
+        Returns:
+            numpy.ndarray: ช่วง [start, end) ในหน่วยตัวอย่าง รูปร่าง (n, 2)
+        """
+        db = librosa.amplitude_to_db(rms, ref=np.max, top_db=None)
+        non_silent = db > -top_db
+        
+        edges = [np.flatnonzero(np.diff(non_silent.astype(int))) + 1]
+        if non_silent[0]:
+            edges.insert(0, np.array([0]))
+        if non_silent[-1]:
+            edges.append(np.array([len(non_silent)]))
+        
+        edges = librosa.frames_to_samples(np.concatenate(edges), hop_length=HOP_LENGTH)
+        return np.minimum(edges, n_samples).reshape((-1, 2))
+    
+    def _features_from_signal(self, y, sr):
+        """
+        สกัดคุณลักษณะ 64 ตัวจากสัญญาณที่โหลดแล้ว โดยใช้ STFT ร่วมกันเพียงชุดเดียว
+        
+        ผลลัพธ์ตรงกับการเรียกฟังก์ชัน librosa แยกกันแบบเดิมภายในความคลาดเคลื่อน
+        ของเลขทศนิยม (FEATURE_RTOL, FEATURE_ATOL)
+        
+        Args:
+            y (numpy.ndarray): สัญญาณเสียง mono
+            sr (int): อัตราการสุ่มตัวอย่าง
             
-            if len(non_silent) > 0:
-                non_silent_duration = np.sum([end - start for start, end in non_silent]) / sr
-                silence_ratio = 1 - (non_silent_duration / total_duration)
-                avg_phrase_length = non_silent_duration / len(non_silent)
+        Returns:
+            numpy.ndarray: เวกเตอร์คุณลักษณะที่มีความยาว 64 ตัว
+        """
+        kernel = self._kernel_for(sr)
+        spec = self._spectral_frontend(y, sr, kernel)
+        
+        # 1. MFCC คุณลักษณะ
+        mfccs = kernel.mfcc(spec['log_mel'])
+        mfcc_stats = np.hstack([
+            np.mean(mfccs, axis=1),
+            np.std(mfccs, axis=1)
+        ])
+        
+        # 2. คุณลักษณะทาง spectral
+        spectral_centroids = kernel.spectral_centroid(spec['magnitude'])
+        spectral_rolloff = kernel.spectral_rolloff(spec['magnitude'])
+        
+        spectral_stats = np.hstack([
+            [np.mean(spectral_centroids), np.std(spectral_centroids)],
+            [np.mean(spectral_rolloff), np.std(spectral_rolloff)]
+        ])
+        
+        # 3. คุณลักษณะเกี่ยวกับความดัง
+        rms = librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+        zero_crossing_rate = librosa.feature.zero_crossing_rate(y=y)[0]
+        
+        volume_stats = np.hstack([
+            [np.mean(rms), np.std(rms)],
+            [np.mean(zero_crossing_rate), np.std(zero_crossing_rate)]
+        ])
+        
+        # 4. คุณลักษณะเกี่ยวกับ pitch และ rhythm
+        tuning = librosa.estimate_tuning(S=spec['power'], sr=sr, n_fft=N_FFT)
+        chroma = kernel.chroma(spec['power'], tuning)
+        
+        # tempo จาก spectral flux ของ log-mel ชุดเดียวกับ MFCC (ดู rhythm_features)
+        onset_env = librosa.onset.onset_strength(S=spec['log_mel'], sr=sr)
+        tempo = rhythm_features.estimate_tempo(onset_env, sr, HOP_LENGTH)
+        
+        pitch_rhythm_stats = np.hstack([
+            [tempo],
+            np.mean(chroma, axis=1)
+        ])
+        
+        # 5. คุณลักษณะเกี่ยวกับความเงียบ (ใช้ RMS จากข้อ 3 แทนการคำนวณใหม่ใน librosa.effects.split)
+        non_silent = self._split_from_rms(rms, len(y), top_db=30)
+        total_duration = len(y) / sr
+        
+        if len(non_silent) > 0:
+            non_silent_duration = np.sum([end - start for start, end in non_silent]) / sr
+            silence_ratio = 1 - (non_silent_duration / total_duration)
+            avg_phrase_length = non_silent_duration / len(non_silent)
+        else:
+            silence_ratio = 1.0
+            avg_phrase_length = 0.0
+        
+        silence_stats = np.array([
+            silence_ratio, 
+            avg_phrase_length, 
+            len(non_silent) / total_duration if total_duration > 0 else 0.0
+        ])
+        
+        # รวมคุณลักษณะทั้งหมด
+        features = np.hstack([
+            mfcc_stats,
+            spectral_stats,
+            volume_stats,
+            pitch_rhythm_stats,
+            silence_stats
+        ])
+        
+        # ตรวจสอบว่า features มีขนาดถูกต้อง
+        expected_size = 64
+        if len(features) != expected_size:
+            print(f"Warning: Features size is {len(features)}, expected {expected_size}. Padding/truncating to match.")
+            if len(features) < expected_size:
+                # Pad with zeros if too small
+                features = np.pad(features, (0, expected_size - len(features)))
             else:
-                silence_ratio = 1.0
-                avg_phrase_length = 0.0
-            
-            silence_stats = np.array([
-                silence_ratio, 
-                avg_phrase_length, 
-                len(non_silent) / total_duration if total_duration > 0 else 0.0
-            ])
-            
-            # รวมคุณลักษณะทั้งหมด
-            features = np.hstack([
-                mfcc_stats,
-                spectral_stats,
-                volume_stats,
-                pitch_rhythm_stats,
-                silence_stats
-            ])
-            
-            # ตรวจสอบว่า features มีขนาดถูกต้อง
-            expected_size = 64
-            if len(features) != expected_size:
-                print(f"Warning: Features size is {len(features)}, expected {expected_size}. Padding/truncating to match.")
-                if len(features) < expected_size:
-                    # Pad with zeros if too small
-                    features = np.pad(features, (0, expected_size - len(features)))
-                else:
-                    # Truncate if too large
-                    features = features[:expected_size]
-            
-            return features
-            
-        except Exception as e:
-            print(f"เกิดข้อผิดพลาดในการสกัดคุณลักษณะ: {e}")
-            # ในกรณีที่มีข้อผิดพลาด ให้คืนค่าอาร์เรย์ศูนย์
-            return np.zeros(64)  # คืนค่าอาร์เรย์ศูนย์ขนาด 64 ตัว
+                # Truncate if too large
+                features = features[:expected_size]
+        
+        return features
     
     def classify_audio(self, file_path):
         """
         จำแนกไฟล์เสียงโดยใช้โมเดลที่โหลดไว้
         
         Args:
-            file_path (str): พาธไปยังไฟล์เสียง WAV
+            file_path (str | bytes | file-like): พาธ, ไบต์ หรือ buffer ของไฟล์เสียง WAV
             
         Returns:
             dict: ผลการจำแนก ประกอบด้วยคลาสที่ทำนายและความน่าจะเป็น
         """
+        return self.classify_batch([file_path])[0]
+    
+    def classify_batch(self, paths_or_buffers):
+        """
+        จำแนกไฟล์เสียงหลายไฟล์พร้อมกัน โดยปรับมาตรฐานและทำนายด้วยการเรียกโมเดลเพียงครั้งเดียว
+        
+        Args:
+            paths_or_buffers (list): รายการพาธ, ไบต์, file-like object หรือ werkzeug FileStorage
+                ของไฟล์เสียง WAV
+            
+        Returns:
+            list: ผลการจำแนกของแต่ละไฟล์ เรียงตามลำดับที่ส่งเข้ามา
+        """
+        sources = list(paths_or_buffers)
+        results = [None] * len(sources)
+        
+        # ตรวจสอบ header ของทุกไฟล์ก่อน ไฟล์ที่ไม่ผ่านจะได้ผลลัพธ์เป็นข้อผิดพลาดโดยไม่ถูกประมวลผลต่อ
+        valid = []
+        for index, source in enumerate(sources):
+            try:
+                audio_info = self.validate_audio(source)
+                valid.append((index, audio_info))
+            except AudioValidationError as e:
+                print(f"Rejected {self._source_name(source)}: {e.message}")
+                results[index] = {
+                    'predicted_class': None,
+                    'probabilities': {},
+                    'error': e.to_dict()
+                }
+        
+        if valid:
+            valid_sources = [sources[index] for index, _ in valid]
+            for (index, audio_info), result in zip(valid, self._classify_valid(valid_sources)):
+                if audio_info['truncated']:
+                    result['truncated'] = True
+                results[index] = result
+        
+        return results
+    
+    def _classify_valid(self, sources):
+        """
+        จำแนกไฟล์ที่ผ่านการตรวจสอบเบื้องต้นแล้ว
+        
+        Args:
+            sources (list): รายการพาธ, ไบต์ หรือ buffer ของไฟล์เสียง
+            
+        Returns:
+            list: ผลการจำแนกของแต่ละไฟล์
+        """
+        # อ่านชุดโมเดลครั้งเดียว คำขอนี้ใช้ชุดนี้จนเสร็จแม้มีการสลับโมเดลระหว่างทาง
+        state = self._model_state()
+        model, _, scaler, label_encoder, _ = state
+        
         # ตรวจสอบว่าโมเดลถูกโหลดแล้วหรือไม่
-        if self.model is None or self.scaler is None or self.label_encoder is None:
+        if model is None or scaler is None or label_encoder is None:
             # หากยังไม่ได้โหลดโมเดล ให้จำลองผลลัพธ์
-            return self._simulate_classification(file_path)
+            return [self._simulate_classification(source) for source in sources]
+        
+        # ตรวจสอบว่าโมเดลเป็น dict (อาจเกิดจากการโหลดข้อมูลผิดพลาด)
+        if isinstance(model, dict):
+            print("Warning: model is a dictionary, not a classifier object. Using simulation mode.")
+            return [self._simulate_classification(source) for source in sources]
         
         try:
-            # สกัดคุณลักษณะจากไฟล์เสียง
-            features = self.extract_features(file_path)
+            # สกัดคุณลักษณะจากไฟล์เสียงทั้งหมดแล้วรวมเป็นเมทริกซ์เดียว
+            # (แจ้งตัวรวมการทำนายว่าคำขอนี้กำลังจะส่งแถวเข้ามา ชุดที่กำลังรวมจะรอได้ไม่เกินกรอบเวลา)
+            batcher = self._batcher
+            if batcher is None:
+                features = np.vstack(self._extract_features_many(sources))
+                return self._predict_features(features, sources, state)
+            with batcher.expecting():
+                features = np.vstack(self._extract_features_many(sources))
+                return self._predict_features(features, sources, state, batcher=batcher)
+        except Exception as e:
+            print(f"เกิดข้อผิดพลาดในการจำแนก: {e}")
+            # ในกรณีที่มีข้อผิดพลาด ให้จำลองผลลัพธ์
+            return [self._simulate_classification(source) for source in sources]
+    
+    def _extract_features_many(self, sources):
+        """
+        สกัดคุณลักษณะของหลายไฟล์ โดยใช้แคช (ถ้ามี) ก่อน แล้วสกัดเฉพาะไฟล์ที่ไม่พบในแคช
+        
+        Args:
+            sources (list): รายการพาธ, ไบต์ หรือ file-like object ของไฟล์เสียง
             
-            # ตรวจสอบว่าโมเดลเป็น dict (อาจเกิดจากการโหลดข้อมูลผิดพลาด)
-            if isinstance(self.model, dict):
-                print("Warning: model is a dictionary, not a classifier object. Using simulation mode.")
-                return self._simulate_classification(file_path)
+        Returns:
+            list: เวกเตอร์คุณลักษณะของแต่ละไฟล์ เรียงตามลำดับที่ส่งเข้ามา
+        """
+        cache = self.feature_cache
+        if cache is None:
+            return self._extract_features_uncached(sources)
+        
+        # ความยาวสูงสุดและเกณฑ์การสกัดแบบทีละบล็อกมีผลต่อเวกเตอร์ที่ได้ จึงรวมไว้ในคีย์ด้วย
+        salt = f"max_duration={self.max_duration};streaming_min_duration={self.streaming_min_duration}"
+        keys = [cache.key_for_source(source, salt=salt) for source in sources]
+        features = [cache.get(key) for key in keys]
+        missing = [index for index, vector in enumerate(features) if vector is None]
+        
+        if missing:
+            extracted = self._extract_features_uncached([sources[index] for index in missing])
+            for index, vector in zip(missing, extracted):
+                features[index] = vector
+                # ไม่เก็บเวกเตอร์ศูนย์ซึ่งเป็นผลจากการสกัดที่ล้มเหลว
+                if np.any(vector):
+                    cache.put(keys[index], vector)
+        
+        return features
+    
+    def _extract_features_uncached(self, sources):
+        """
+        สกัดคุณลักษณะของหลายไฟล์ โดยกระจายไปยังพูล (ถ้ามี) และคืนผลตามลำดับที่ส่งเข้ามา
+        
+        ไฟล์ที่ล้มเหลวในพูลจะถูกสกัดใหม่ใน process นี้ทีละไฟล์ ไฟล์อื่นในชุดเดียวกันจึงไม่ได้รับผลกระทบ
+        
+        Args:
+            sources (list): รายการพาธ, ไบต์ หรือ file-like object ของไฟล์เสียง
             
-            # ปรับค่าคุณลักษณะให้เป็นมาตรฐาน
-            try:
-                features_scaled = self.scaler.transform([features])
-            except Exception as e:
-                print(f"Error scaling features: {e}. Using raw features.")
-                features_scaled = [features]
+        Returns:
+            list: เวกเตอร์คุณลักษณะของแต่ละไฟล์
+        """
+        pool = self._feature_pool
+        if pool is None or len(sources) < 2:
+            return [self.extract_features(source) for source in sources]
+        
+        # ส่งพาธหรือไบต์ไปยังพูล (file-like object ส่งข้าม process ไม่ได้ จึงอ่านเป็นไบต์ก่อน)
+        futures = {}
+        try:
+            for index, source in enumerate(sources):
+                payload = self._picklable_source(source)
+                if payload is not None:
+                    futures[index] = pool.submit(_extract_features_in_worker, payload)
+        except BrokenProcessPool as e:
+            self._discard_broken_pool(e)
+        
+        features = []
+        for index, source in enumerate(sources):
+            future = futures.get(index)
+            if future is not None:
+                try:
+                    features.append(future.result())
+                    continue
+                except BrokenProcessPool as e:
+                    self._discard_broken_pool(e)
+                except Exception as e:
+                    print(f"Feature extraction failed in worker for {self._source_name(source)}: {e}")
+            features.append(self.extract_features(source))
+        
+        return features
+    
+    def _discard_broken_pool(self, error):
+        """เลิกใช้พูลที่ process ลูกตายไป คำขอต่อจากนี้จะสกัดคุณลักษณะใน process นี้แทน"""
+        if self._feature_pool is not None:
+            print(f"Feature extraction pool is broken ({error}). Falling back to in-process extraction.")
+            self._feature_pool.shutdown(wait=False)
+            self._feature_pool = None
+    
+    def _score_features(self, features, state):
+        """
+        ปรับมาตรฐานและคำนวณความน่าจะเป็นของเมทริกซ์คุณลักษณะด้วย predict_proba ครั้งเดียว
+        
+        Args:
+            features (numpy.ndarray): เมทริกซ์คุณลักษณะขนาด (n, 64)
+            state (tuple): ชุดโมเดลจาก _model_state()
             
-            # ทำนายคลาส
+        Returns:
+            numpy.ndarray: ความน่าจะเป็นขนาด (n, n_classes)
+        """
+        model, ensemble, scaler, _, _ = state
+        
+        # ปรับค่าคุณลักษณะให้เป็นมาตรฐาน
+        try:
+            features_scaled = scaler.transform(features)
+        except Exception as e:
+            print(f"Error scaling features: {e}. Using raw features.")
+            features_scaled = features
+        
+        if ensemble is not None:
+            return ensemble.predict_proba(features_scaled)
+        return model.predict_proba(features_scaled)
+    
+    def _predict_features(self, features, sources, state=None, batcher=None):
+        """
+        ทำนายเมทริกซ์คุณลักษณะ (หนึ่งแถวต่อไฟล์) แล้วแปลงเป็นผลการจำแนก
+        
+        Args:
+            features (numpy.ndarray): เมทริกซ์คุณลักษณะขนาด (n, 64)
+            sources (list): พาธหรือ buffer ของแต่ละแถว ใช้เมื่อต้องจำลองผลลัพธ์
+            state (tuple): ชุดโมเดลจาก _model_state() (None = อ่านชุดปัจจุบัน)
+            batcher (InferenceBatcher): ส่งแถวเข้าชุดร่วมกับคำขออื่น (None = ทำนายทันที)
+            
+        Returns:
+            list: ผลการจำแนกของแต่ละแถว
+        """
+        state = state or self._model_state()
+        label_encoder, model_version = state[3], state[4]
+        
+        # ทำนายความน่าจะเป็นครั้งเดียว แล้วเลือกคลาสจากค่าสูงสุด (เทียบเท่า model.predict)
+        try:
+            if batcher is not None:
+                class_probabilities = batcher.predict(features, state)
+            else:
+                class_probabilities = self._score_features(features, state)
+        except Exception as e:
+            print(f"Error during prediction: {e}")
+            return [self._simulate_classification(source) for source in sources]
+        
+        class_names = label_encoder.classes_
+        predicted_classes = class_names[np.argmax(class_probabilities, axis=1)]
+        
+        return [
+            {
+                'predicted_class': str(predicted_class),
+                'probabilities': {class_name: float(prob) for class_name, prob in zip(class_names, probs)},
+                'model_version': model_version
+            }
+            for predicted_class, probs in zip(predicted_classes, class_probabilities)
+        ]
+    
+    def _source_name(self, source):
+        """คืนชื่อไฟล์ของพาธหรือ file-like object (เช่น werkzeug FileStorage)"""
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return '<memory>'
+        name = getattr(source, 'filename', None) or getattr(source, 'name', None) or source
+        return os.path.basename(str(name))
+    
+    def _audio_input(self, source):
+        """
+        แปลงแหล่งข้อมูลเสียงให้อยู่ในรูปที่ librosa.load อ่านได้โดยไม่ต้องเขียนลงดิสก์
+        
+        Args:
+            source (str | bytes | file-like): พาธ, ไบต์ของไฟล์, file-like object หรือ FileStorage
+            
+        Returns:
+            str | file-like: พาธเดิม หรือ stream ที่อ่านได้จากหน่วยความจำ
+        """
+        if isinstance(source, (str, os.PathLike)):
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(source)
+        # werkzeug FileStorage เก็บข้อมูลไว้ใน .stream
+        return getattr(source, 'stream', source)
+    
+    def _picklable_source(self, source):
+        """
+        คืนพาธหรือไบต์ของแหล่งข้อมูลเสียงเพื่อส่งไปยัง process อื่น
+        
+        Returns:
+            str | bytes: ข้อมูลที่ส่งข้าม process ได้ หรือ None ถ้าอ่านไม่ได้
+        """
+        if isinstance(source, (str, os.PathLike, bytes)):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            return bytes(source)
+        try:
+            stream = self._audio_input(source)
+            position = stream.tell()
             try:
-                predicted_class_numeric = self.model.predict(features_scaled)[0]
-                predicted_class = self.label_encoder.inverse_transform([predicted_class_numeric])[0]
-                
-                # ดึงความน่าจะเป็นของแต่ละคลาส
-                class_probabilities = self.model.predict_proba(features_scaled)[0]
-                class_names = self.label_encoder.classes_
-                prob_dict = {class_name: float(prob) for class_name, prob in zip(class_names, class_probabilities)}
-                
-                return {
-                    'predicted_class': predicted_class,
-                    'probabilities': prob_dict
-                }
-            except Exception as e:
-                print(f"Error during prediction: {e}")
-                return self._simulate_classification(file_path)
-                
+                return stream.read()
+            finally:
+                stream.seek(position)
         except Exception as e:
-            print(f"เกิดข้อผิดพลาดในการจำแนก: {e}")
-            # ในกรณีที่มีข้อผิดพลาด ให้จำลองผลลัพธ์
-            return self._simulate_classification(file_path)
+            print(f"Cannot read {self._source_name(source)} for the feature pool: {e}")
+            return None
     
     def _simulate_classification(self, file_path):
         """
         จำลองผลการจำแนกในกรณีที่ไม่มีโมเดลหรือเกิดข้อผิดพลาด
         """
         # ใช้ชื่อไฟล์เพื่อจำลองคลาสแบบมีหลักการ
-        filename = os.path.basename(file_path).lower()
+        filename = self._source_name(file_path).lower()
         
         # ใช้ "Mid" แทน "Medium" ทั้งหมด
         if filename.startswith('h'):
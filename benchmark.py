@@ -0,0 +1,283 @@
+"""
+benchmark.py - สคริปต์วัดประสิทธิภาพของขั้นตอนต่างๆ ในการประมวลผลเสียง
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import threading
+import tracemalloc
+
+import numpy as np
+import librosa
+
+import wav_reader
+import rhythm_features
+
+# ตำแหน่งของ tempo ในเวกเตอร์คุณลักษณะ (MFCC 40 + spectral 4 + ความดัง 4)
+TEMPO_INDEX = 48
+
+def measure(func, repeat):
+    """
+    วัดเวลาเฉลี่ยและหน่วยความจำสูงสุดที่จองระหว่างเรียกฟังก์ชัน
+    
+    Returns:
+        tuple: (เวลาเฉลี่ยต่อครั้งเป็นมิลลิวินาที, หน่วยความจำสูงสุดเป็นไบต์)
+    """
+    func()  # warm-up
+    
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat
+    
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return elapsed * 1000, peak
+
+def benchmark_decode(files, repeat, sr=16000):
+    """
+    เปรียบเทียบการถอดรหัส + resample ระหว่าง librosa.load กับ wav_reader.read_wav
+    """
+    print(f"{'file':<30} {'native_sr':>9} {'librosa ms':>11} {'librosa MB':>11} {'wav_reader ms':>14} {'wav_reader MB':>14} {'max |diff|':>11}")
+    
+    total_librosa = total_reader = 0.0
+    for path in files:
+        with open(path, 'rb') as f:
+            info = wav_reader.read_wav_info(f)
+        
+        librosa_ms, librosa_peak = measure(lambda: librosa.load(path, sr=sr), repeat)
+        reader_ms, reader_peak = measure(lambda: wav_reader.read_wav(path, sr=sr), repeat)
+        
+        reference, _ = librosa.load(path, sr=sr)
+        y, _ = wav_reader.read_wav(path, sr=sr)
+        diff = float(np.max(np.abs(reference - y))) if len(y) else 0.0
+        
+        total_librosa += librosa_ms
+        total_reader += reader_ms
+        print(f"{os.path.basename(path)[:30]:<30} {info.sample_rate:>9} {librosa_ms:>11.2f} {librosa_peak / 1e6:>11.2f} "
+              f"{reader_ms:>14.2f} {reader_peak / 1e6:>14.2f} {diff:>11.2e}")
+    
+    if files:
+        print(f"\nรวม: librosa.load {total_librosa:.2f} ms, wav_reader {total_reader:.2f} ms "
+              f"(เร็วขึ้น {total_librosa / max(total_reader, 1e-9):.1f} เท่า)")
+
+def legacy_tempo(onset_env, sr):
+    """tempo แบบเดิม: tempogram ทุกเฟรมของ librosa"""
+    try:
+        from librosa.feature import rhythm
+        return rhythm.tempo(onset_envelope=onset_env, sr=sr)[0]
+    except (ImportError, AttributeError):
+        return librosa.beat.tempo(onset_envelope=onset_env, sr=sr)[0]
+
+def benchmark_stages(files, repeat, models_dir):
+    """
+    วัดเวลาของแต่ละขั้นตอนในการสกัดคุณลักษณะ และผลของตัวประมาณ tempo แบบใหม่ต่อโมเดล
+    
+    ผลต่อโมเดลวัดโดยจำแนกเวกเตอร์เดียวกันสองครั้ง ครั้งหนึ่งใช้ tempo แบบเดิมของ librosa
+    แล้วเทียบคลาสที่ทำนายและความน่าจะเป็น
+    """
+    from audio_processor import AudioProcessor, HOP_LENGTH, N_FFT
+    
+    processor = AudioProcessor(models_dir=models_dir)
+    stages = ['stft+mel', 'mfcc', 'spectral', 'rms+zcr', 'chroma', 'onset', 'tempo_librosa', 'tempo_new', 'total']
+    totals = dict.fromkeys(stages, 0.0)
+    tempo_same = class_same = 0
+    max_prob_diff = 0.0
+    
+    print(f"{'file':<24} " + ' '.join(f"{stage:>13}" for stage in stages) + f" {'tempo old/new':>15} {'class old/new':>15}")
+    
+    for path in files:
+        y, sr = processor.load_audio(path)
+        kernel = processor._kernel_for(sr)
+        spec = processor._spectral_frontend(y, sr, kernel)
+        onset_env = librosa.onset.onset_strength(S=spec['log_mel'], sr=sr)
+        
+        timings = {
+            'stft+mel': lambda: processor._spectral_frontend(y, sr),
+            'mfcc': lambda: kernel.mfcc(spec['log_mel']),
+            'spectral': lambda: (kernel.spectral_centroid(spec['magnitude']),
+                                 kernel.spectral_rolloff(spec['magnitude'])),
+            'rms+zcr': lambda: (librosa.feature.rms(y=y, frame_length=N_FFT, hop_length=HOP_LENGTH),
+                                librosa.feature.zero_crossing_rate(y=y)),
+            'chroma': lambda: kernel.chroma(spec['power'], librosa.estimate_tuning(S=spec['power'], sr=sr)),
+            'onset': lambda: librosa.onset.onset_strength(S=spec['log_mel'], sr=sr),
+            'tempo_librosa': lambda: legacy_tempo(onset_env, sr),
+            'tempo_new': lambda: rhythm_features.estimate_tempo(onset_env, sr, HOP_LENGTH),
+            'total': lambda: processor._features_from_signal(y, sr)
+        }
+        row = {stage: measure(timings[stage], repeat)[0] for stage in stages}
+        for stage in stages:
+            totals[stage] += row[stage]
+        
+        features = processor._features_from_signal(y, sr)
+        legacy = features.copy()
+        legacy[TEMPO_INDEX] = legacy_tempo(onset_env, sr)
+        new_result, old_result = processor._predict_features(np.vstack([features, legacy]), [path, path])
+        
+        tempo_same += legacy[TEMPO_INDEX] == features[TEMPO_INDEX]
+        class_same += new_result['predicted_class'] == old_result['predicted_class']
+        for label, probability in new_result['probabilities'].items():
+            max_prob_diff = max(max_prob_diff, abs(probability - old_result['probabilities'].get(label, 0.0)))
+        
+        print(f"{os.path.basename(path)[:24]:<24} " + ' '.join(f"{row[stage]:>13.2f}" for stage in stages)
+              + f" {legacy[TEMPO_INDEX]:>7.1f}/{features[TEMPO_INDEX]:<7.1f}"
+              + f" {str(old_result['predicted_class']):>7}/{str(new_result['predicted_class']):<7}")
+    
+    print(f"\n{'รวม (ms)':<24} " + ' '.join(f"{totals[stage]:>13.2f}" for stage in stages))
+    print(f"tempo: librosa {totals['tempo_librosa']:.2f} ms, แบบใหม่ {totals['tempo_new']:.2f} ms "
+          f"(เร็วขึ้น {totals['tempo_librosa'] / max(totals['tempo_new'], 1e-9):.1f} เท่า)")
+    print(f"ผลต่อโมเดล: tempo เท่าเดิม {tempo_same}/{len(files)} ไฟล์, คลาสเท่าเดิม {class_same}/{len(files)} ไฟล์, "
+          f"ความน่าจะเป็นต่างกันสูงสุด {max_prob_diff:.4f}")
+
+def process_tree(pid):
+    """pid และ process ลูกหลานทั้งหมด (อ่านจาก /proc บน Linux)"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # ฟิลด์ที่ 4 คือ ppid (ชื่อคำสั่งในวงเล็บอาจมีช่องว่าง จึงแยกหลัง ')')
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+def memory_usage(pid):
+    """
+    หน่วยความจำของ process จาก /proc/<pid>/smaps_rollup
+    
+    Returns:
+        dict: rss, pss (ส่วนแบ่งตามสัดส่วนของหน้าที่ใช้ร่วมกัน), shared และ private เป็นไบต์
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'shared': values.get('Shared_Clean', 0) + values.get('Shared_Dirty', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0)
+    }
+
+def benchmark_serve(files, url, username, password, requests_total, concurrency, server_pid):
+    """
+    ยิงคำขอ /api/classify ไปยังเซิร์ฟเวอร์ที่รันอยู่ (แต่ละคำขออัปโหลดหนึ่งไฟล์) แล้ววัด throughput,
+    latency และหน่วยความจำของทุก process ในเซิร์ฟเวอร์ (ถ้าระบุ server_pid)
+    
+    ใช้เปรียบเทียบ python app.py (process เดียว) กับ gunicorn wsgi:application (pre-fork)
+    """
+    import requests
+    
+    login = requests.Session()
+    response = login.post(f"{url}/login", data={'username': username, 'password': password}, allow_redirects=False)
+    if 'session' not in login.cookies:
+        print(f"เข้าสู่ระบบไม่สำเร็จ (HTTP {response.status_code})")
+        sys.exit(1)
+    
+    payloads = [(os.path.basename(path), open(path, 'rb').read()) for path in files]
+    latencies, errors = [], []
+    counter = iter(range(requests_total))
+    lock = threading.Lock()
+    
+    def client():
+        session = requests.Session()
+        session.cookies.update(login.cookies)
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            name, data = payloads[index % len(payloads)]
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{url}/api/classify", files={'audio_files': (name, data, 'audio/wav')})
+                ok = response.status_code == 200 and 'error' not in response.json()
+            except (requests.RequestException, ValueError):
+                ok = False
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if not ok:
+                    errors.append(index)
+    
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies = np.sort(np.array(latencies)) * 1000
+    print(f"{requests_total} คำขอ, concurrency {concurrency}: {requests_total / elapsed:.2f} คำขอ/วินาที, "
+          f"ผิดพลาด {len(errors)}")
+    print(f"latency (ms): p50 {np.percentile(latencies, 50):.1f}, p95 {np.percentile(latencies, 95):.1f}, "
+          f"max {latencies[-1]:.1f}")
+    
+    if server_pid:
+        print(f"\n{'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+        total_rss = total_pss = 0
+        for pid in process_tree(server_pid):
+            try:
+                usage = memory_usage(pid)
+            except OSError:
+                continue
+            total_rss += usage['rss']
+            total_pss += usage['pss']
+            print(f"{pid:>8} {usage['rss'] / 1e6:>9.1f} {usage['pss'] / 1e6:>9.1f} "
+                  f"{usage['shared'] / 1e6:>10.1f} {usage['private'] / 1e6:>11.1f}")
+        # PSS รวมคือหน่วยความจำจริงของเซิร์ฟเวอร์ RSS รวมนับหน้าที่ใช้ร่วมกันซ้ำทุก process
+        print(f"{'รวม':>8} {total_rss / 1e6:>9.1f} {total_pss / 1e6:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='วัดประสิทธิภาพการประมวลผลเสียง')
+    parser.add_argument('stage', choices=['decode', 'stages', 'serve'], help='ขั้นตอนที่ต้องการวัด')
+    parser.add_argument('files', nargs='+', help='ไฟล์ WAV หรือไดเรกทอรีที่มีไฟล์ WAV')
+    parser.add_argument('--repeat', type=int, default=10, help='จำนวนรอบที่วัดต่อไฟล์')
+    parser.add_argument('--models', default='models', help='ไดเรกทอรีของโมเดล (สำหรับ stages)')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL ของเซิร์ฟเวอร์ (สำหรับ serve)')
+    parser.add_argument('--username', default='admin', help='ชื่อผู้ใช้สำหรับเข้าสู่ระบบ (สำหรับ serve)')
+    parser.add_argument('--password', default='admin123', help='รหัสผ่าน (สำหรับ serve)')
+    parser.add_argument('--requests', type=int, default=200, help='จำนวนคำขอทั้งหมด (สำหรับ serve)')
+    parser.add_argument('--concurrency', type=int, default=8, help='จำนวนคำขอพร้อมกัน (สำหรับ serve)')
+    parser.add_argument('--server-pid', type=int, help='pid ของเซิร์ฟเวอร์ (master) สำหรับวัดหน่วยความจำ')
+    
+    args = parser.parse_args()
+    
+    files = []
+    for item in args.files:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, '*.wav'))))
+        else:
+            files.append(item)
+    
+    if not files:
+        print("ไม่พบไฟล์ WAV")
+        sys.exit(1)
+    
+    if args.stage == 'decode':
+        benchmark_decode(files, args.repeat)
+    elif args.stage == 'stages':
+        benchmark_stages(files, args.repeat, args.models)
+    elif args.stage == 'serve':
+        benchmark_serve(files, args.url, args.username, args.password,
+                        args.requests, args.concurrency, args.server_pid)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+classification_jobs.py - งานจำแนกไฟล์เสียงเบื้องหลัง: ส่งงานแล้วได้รหัสงานทันที และติดตามความคืบหน้าภายหลัง
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED)
+
+# ระยะห่าง (วินาที) ในการอ่านไฟล์สถานะของงานที่ worker อื่นเป็นผู้ประมวลผล
+POLL_INTERVAL = 0.5
+# ลบไฟล์สถานะที่หมดอายุไม่บ่อยกว่าทุกกี่วินาที
+PRUNE_INTERVAL = 60
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+
+class JobQueueFull(Exception):
+    """มีงานที่รอหรือกำลังประมวลผลครบจำนวนสูงสุดแล้ว"""
+
+
+def job_error(code, message):
+    """ข้อผิดพลาดของงานหรือของไฟล์ในรูปแบบเดียวกับ AudioValidationError.to_dict()"""
+    return {'code': code, 'message': message}
+
+
+def public_job(job):
+    """สถานะของงานสำหรับส่งให้ผู้ใช้ (ไม่รวมเจ้าของและ process ที่ประมวลผล)"""
+    return {key: value for key, value in job.items() if key not in ('user_id', 'pid')}
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobManager:
+    """
+    คิวงานจำแนกแบบจำกัดขนาด ประมวลผลด้วยพูลเธรดของ process นี้
+
+    สถานะของแต่ละงานถูกเขียนเป็นไฟล์ JSON ใน job_dir ทุกครั้งที่เปลี่ยน worker อื่นของ gunicorn
+    จึงตอบคำขอสถานะของงานเดียวกันได้ งานที่ process เจ้าของหยุดไปก่อนเสร็จจะถูกรายงานว่าล้มเหลว
+    """
+    def __init__(self, job_dir, workers=2, max_pending=32, ttl=3600):
+        """
+        Args:
+            job_dir (str): ไดเรกทอรีของไฟล์สถานะงาน (ใช้ร่วมกันทุก worker)
+            workers (int): จำนวนเธรดที่ประมวลผลงานพร้อมกันต่อ process
+            max_pending (int): จำนวนงานที่รอหรือกำลังประมวลผลได้สูงสุดต่อ process
+            ttl (float): เก็บไฟล์สถานะของงานไว้กี่วินาทีหลังเปลี่ยนครั้งสุดท้าย
+        """
+        self.job_dir = job_dir
+        self.workers = max(int(workers), 1)
+        self.max_pending = max(int(max_pending), 1)
+        self.ttl = ttl
+        os.makedirs(job_dir, exist_ok=True)
+
+        self._cond = threading.Condition()
+        # งานของ process นี้ที่ยังไม่เสร็จ (รหัสงาน -> (สถานะ, future, รายการไฟล์, ฟังก์ชันทิ้งไฟล์))
+        self._jobs = {}
+        self._pool = None
+        self._last_prune = 0.0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        """สร้างพูลเธรด (เรียกในแต่ละ process หลัง fork)"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='classify_job')
+
+    def close(self):
+        """ยกเลิกงานที่ยังไม่เริ่ม (บันทึกว่าล้มเหลว) และรอให้งานที่กำลังทำเสร็จ"""
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        with self._cond:
+            jobs = list(self._jobs.values())
+        for job, future, items, discard in jobs:
+            if future.cancel():
+                for item in items:
+                    if discard is not None:
+                        discard(item)
+                self._finish(job, JOB_FAILED, error=job_error('shutdown', 'server shutting down'))
+        pool.shutdown(wait=True)
+
+    def has_capacity(self):
+        """True ถ้ายังรับงานใหม่ได้"""
+        with self._cond:
+            return len(self._jobs) < self.max_pending
+
+    def submit(self, user_id, items, handler, discard=None):
+        """
+        เพิ่มงานเข้าคิว
+
+        Args:
+            user_id: เจ้าของงาน
+            items (list): ไฟล์ของงาน (dict ที่ส่งต่อให้ handler ทีละรายการ)
+            handler (callable): handler(user_id, item) คืนผลของไฟล์นั้น (dict)
+            discard (callable): discard(item) เรียกกับไฟล์ที่ไม่ได้ประมวลผล (เช่น งานถูกยกเลิก)
+
+        Returns:
+            dict: สถานะเริ่มต้นของงาน
+
+        Raises:
+            JobQueueFull: ถ้ามีงานค้างครบ max_pending แล้ว
+        """
+        job = {
+            'id': uuid.uuid4().hex,
+            'user_id': user_id,
+            'pid': os.getpid(),
+            'status': JOB_QUEUED,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'total': len(items),
+            'completed': 0,
+            'results': [],
+            'error': None,
+            'revision': 0
+        }
+        with self._cond:
+            if self._pool is None:
+                raise RuntimeError("job manager is not started")
+            if len(self._jobs) >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f"{len(self._jobs)} jobs pending")
+            self._write(job)
+            future = self._pool.submit(self._run, job, items, handler)
+            self._jobs[job['id']] = (job, future, items, discard)
+            self.submitted += 1
+        self._prune()
+        return dict(job)
+
+    def get(self, job_id):
+        """
+        อ่านสถานะของงาน (จากหน่วยความจำถ้าเป็นงานของ process นี้ ไม่เช่นนั้นจากไฟล์)
+
+        Returns:
+            dict: สถานะของงาน หรือ None ถ้าไม่พบ
+        """
+        if not _JOB_ID.fullmatch(job_id or ''):
+            return None
+        with self._cond:
+            entry = self._jobs.get(job_id)
+            if entry is not None:
+                return self._snapshot(entry[0])
+        return self._read(job_id)
+
+    def wait(self, job_id, revision, timeout):
+        """
+        รอจนสถานะของงานเปลี่ยนจาก revision ที่ระบุ หรือจนครบ timeout วินาที
+
+        Returns:
+            dict: สถานะล่าสุดของงาน หรือ None ถ้าไม่พบ
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            entry = self._jobs.get(job_id)
+            if entry is not None:
+                job = entry[0]
+                self._cond.wait_for(lambda: job['revision'] != revision, timeout)
+                return self._snapshot(job)
+
+        # งานของ worker อื่น: อ่านไฟล์สถานะซ้ำเป็นระยะ
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['revision'] != revision or remaining <= 0:
+                return job
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def stats(self):
+        """
+        สถิติของคิวงานใน process นี้
+
+        Returns:
+            dict: จำนวนงานที่ค้าง, ที่รับ, ที่เสร็จ, ที่ล้มเหลว และที่ถูกปฏิเสธเพราะคิวเต็ม
+        """
+        with self._cond:
+            running = sum(1 for job, _, _, _ in self._jobs.values() if job['status'] == JOB_RUNNING)
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': len(self._jobs),
+                'running': running,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def _run(self, job, items, handler):
+        self._update(job, status=JOB_RUNNING, started_at=_now())
+        try:
+            for item in items:
+                try:
+                    result = handler(job['user_id'], item)
+                except Exception as e:
+                    print(f"Job {job['id']}: error processing {item.get('file_name')}: {e}")
+                    result = {'file_name': item.get('file_name'), 'error': job_error('processing_error', str(e))}
+                self._update(job, completed=job['completed'] + 1, results=job['results'] + [result])
+            # งานที่ไม่มีไฟล์ใดจำแนกสำเร็จถือว่าล้มเหลว (ผลของแต่ละไฟล์ยังอยู่ใน results)
+            if job['results'] and all(result.get('error') for result in job['results']):
+                self._finish(job, JOB_FAILED, error=job_error('all_files_failed', 'no file in the job was classified'))
+            else:
+                self._finish(job, JOB_DONE)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            self._finish(job, JOB_FAILED, error=job_error('job_error', str(e)))
+
+    def _finish(self, job, status, error=None):
+        self._update(job, status=status, finished_at=_now(), error=error)
+        with self._cond:
+            self._jobs.pop(job['id'], None)
+            if status == JOB_DONE:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def _update(self, job, **changes):
+        with self._cond:
+            job.update(changes)
+            job['revision'] += 1
+            self._write(job)
+            self._cond.notify_all()
+
+    def _snapshot(self, job):
+        return dict(job, results=list(job['results']))
+
+    def _path(self, job_id):
+        return os.path.join(self.job_dir, f"{job_id}.json")
+
+    def _write(self, job):
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing job state {path}: {e}")
+
+    def _read(self, job_id):
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # process ที่รับงานหยุดไปก่อนงานเสร็จ (เช่น worker ถูกรีไซเคิลหรือล่ม)
+        if job['status'] not in FINISHED_STATUSES and (job['pid'] == os.getpid() or not _pid_alive(job['pid'])):
+            job['status'] = JOB_FAILED
+            job['error'] = job_error('worker_exited', 'worker exited before the job finished')
+        return job
+
+    def _prune(self):
+        """ลบไฟล์สถานะของงานที่ไม่เปลี่ยนมานานกว่า ttl"""
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        try:
+            with os.scandir(self.job_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.json') and now - entry.stat().st_mtime > self.ttl:
+                        os.remove(entry.path)
+        except OSError as e:
+            print(f"Error pruning job states in {self.job_dir}: {e}")
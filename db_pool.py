@@ -0,0 +1,263 @@
+"""
+db_pool.py - connection pool ของ MySQL ที่รอ connection ว่างได้ตามเวลาที่กำหนด ตรวจ connection ก่อนใช้ และเก็บสถิติ
+"""
+
+import time
+import threading
+from collections import deque
+
+# ขอบบนของช่องฮิสโตแกรมเวลารอ connection (มิลลิวินาที)
+CHECKOUT_BUCKETS_MS = (1, 5, 25, 100, 500, 2000)
+
+
+class PoolTimeout(Exception):
+    """ไม่มี connection ว่างภายในเวลาที่กำหนด"""
+
+
+class ConnectionUnavailable(Exception):
+    """การเชื่อมต่อครั้งก่อนล้มเหลวและยังอยู่ในช่วงรอก่อนลองใหม่"""
+
+
+class PooledConnection:
+    """connection ที่ยืมจากพูล: ใช้ได้เหมือน connection ปกติ และ close() คือคืนเข้าพูล"""
+    def __init__(self, pool, connection, created):
+        self._pool = pool
+        self._connection = connection
+        self._created = created
+
+    def __getattr__(self, name):
+        connection = self.__dict__.get('_connection')
+        if connection is None:
+            raise AttributeError(f"connection already returned to the pool ({name})")
+        return getattr(connection, name)
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool._release(connection, self._created)
+
+
+class ConnectionPool:
+    """
+    พูล connection ขนาดคงที่ที่สร้าง connection เมื่อต้องใช้
+
+    - เมื่อ connection ถูกใช้หมด ผู้เรียกจะรอได้ไม่เกิน timeout วินาทีแล้วจึงได้ PoolTimeout
+    - connection ที่ว่างนานกว่า ping_after วินาทีจะถูก ping ก่อนส่งให้ผู้เรียก ถ้าใช้ไม่ได้จะสร้างใหม่
+    - connection ที่เปิดมานานกว่า recycle วินาทีจะถูกปิดและสร้างใหม่ (ก่อน wait_timeout ของเซิร์ฟเวอร์)
+    - ถ้าเชื่อมต่อไม่สำเร็จ จะไม่เชื่อมต่อใหม่จนพ้นช่วง backoff (0.5 วินาที เพิ่มเป็นสองเท่าจนถึง
+      backoff_max) คำขอในช่วงนั้นได้ ConnectionUnavailable ทันที จึงไม่เกิดการเชื่อมต่อซ้ำพร้อมกันจำนวนมาก
+    """
+    def __init__(self, connect, size=5, timeout=5.0, recycle=1800, ping_after=5.0, backoff_max=30.0):
+        """
+        Args:
+            connect (callable): สร้าง connection ใหม่ (เช่น mysql.connector.connect พร้อมค่าตั้ง)
+            size (int): จำนวน connection สูงสุด
+            timeout (float): เวลารอ connection ว่างสูงสุด (วินาที)
+            recycle (float): อายุสูงสุดของ connection (วินาที, 0 = ไม่จำกัด)
+            ping_after (float): ping connection ที่ว่างนานกว่านี้ก่อนใช้ (วินาที, 0 = ping ทุกครั้ง)
+            backoff_max (float): ช่วงรอก่อนเชื่อมต่อใหม่สูงสุดหลังเชื่อมต่อล้มเหลว (วินาที)
+        """
+        self.connect = connect
+        self.size = max(int(size), 1)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.backoff_max = backoff_max
+
+        self._cond = threading.Condition()
+        # connection ว่าง: (connection, เวลาที่สร้าง, เวลาที่คืนล่าสุด)
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = False
+        self._connect_failures = 0
+        self._next_connect_at = 0.0
+        self._last_connect_error = None
+
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.connect_errors = 0
+        self.recycled = 0
+        self.ping_failures = 0
+        self._checkout_seconds = 0.0
+        self._checkout_max = 0.0
+        self._checkout_histogram = [0] * (len(CHECKOUT_BUCKETS_MS) + 1)
+
+    def connection(self):
+        """
+        ยืม connection จากพูล (เรียก close() เพื่อคืน)
+
+        Returns:
+            PooledConnection: connection ที่ตรวจแล้วว่าใช้ได้
+
+        Raises:
+            PoolTimeout: ถ้าไม่มี connection ว่างภายใน timeout
+            ConnectionUnavailable: ถ้าอยู่ในช่วงรอหลังเชื่อมต่อล้มเหลว
+        """
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise ConnectionUnavailable("connection pool is closed")
+                if self._idle:
+                    # ใช้ connection ที่คืนล่าสุดก่อน (ยังไม่ถูกเซิร์ฟเวอร์ตัดและมักไม่ต้อง ping)
+                    connection, created, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # จองที่ไว้แล้วสร้าง connection นอกล็อก
+                    self._open += 1
+                    connection, created, last_used = None, None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"no free connection within {self.timeout:.1f}s "
+                                      f"({self._in_use}/{self.size} in use)")
+                waited = True
+                self._waiting += 1
+                self._cond.wait(remaining)
+                self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if connection is None:
+                connection, created = self._new_connection(), time.monotonic()
+            else:
+                connection, created = self._validate(connection, created, last_used)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        self._record_checkout(time.perf_counter() - started, waited)
+        return PooledConnection(self, connection, created)
+
+    def close(self):
+        """ปิด connection ที่ว่างทั้งหมด (connection ที่ยืมอยู่จะถูกปิดเมื่อคืน)"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for connection, _, _ in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        """
+        สถิติของพูล
+
+        Returns:
+            dict: จำนวน connection ที่เปิด/ถูกใช้/ว่าง, ผู้ที่รออยู่, จำนวนครั้งที่ต้องรอหรือหมดเวลา,
+            เวลารอ connection (เฉลี่ย, สูงสุด, ฮิสโตแกรม) และจำนวนการเชื่อมต่อใหม่/ล้มเหลว/recycle/ping ไม่ผ่าน
+        """
+        with self._cond:
+            labels = [f"<={bound}" for bound in CHECKOUT_BUCKETS_MS] + [f">{CHECKOUT_BUCKETS_MS[-1]}"]
+            return {
+                'size': self.size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'checkout_ms_mean': self._checkout_seconds / self.checkouts * 1000 if self.checkouts else 0.0,
+                'checkout_ms_max': self._checkout_max * 1000,
+                'checkout_ms_histogram': dict(zip(labels, self._checkout_histogram)),
+                'connects': self.connects,
+                'connect_errors': self.connect_errors,
+                'last_connect_error': self._last_connect_error,
+                'recycled': self.recycled,
+                'ping_failures': self.ping_failures
+            }
+
+    def _new_connection(self):
+        with self._cond:
+            now = time.monotonic()
+            if now < self._next_connect_at:
+                raise ConnectionUnavailable(f"database unavailable ({self._last_connect_error}), "
+                                            f"retrying in {self._next_connect_at - now:.1f}s")
+        try:
+            connection = self.connect()
+        except Exception as e:
+            with self._cond:
+                self.connect_errors += 1
+                self._connect_failures += 1
+                self._last_connect_error = str(e)
+                backoff = min(0.5 * 2 ** (self._connect_failures - 1), self.backoff_max)
+                self._next_connect_at = time.monotonic() + backoff
+            raise
+        with self._cond:
+            self.connects += 1
+            self._connect_failures = 0
+            self._last_connect_error = None
+        return connection
+
+    def _validate(self, connection, created, last_used):
+        """คืน connection ที่ใช้ได้ (สร้างใหม่ถ้าอายุเกิน recycle หรือ ping ไม่ผ่าน)"""
+        now = time.monotonic()
+        if self.recycle and now - created > self.recycle:
+            with self._cond:
+                self.recycled += 1
+            self._close_quietly(connection)
+            return self._new_connection(), time.monotonic()
+        if now - last_used >= self.ping_after:
+            try:
+                connection.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self.ping_failures += 1
+                self._close_quietly(connection)
+                return self._new_connection(), time.monotonic()
+        return connection, created
+
+    def _release(self, connection, created):
+        # connection ที่ยังมีผลของ query ค้างอยู่ (ผู้ใช้เลิกอ่านกลางทาง) ใช้ต่อไม่ได้
+        broken = bool(getattr(connection, 'unread_result', False))
+        # ยกเลิก transaction ที่ค้าง เพื่อไม่ให้ผู้ยืมคนถัดไปได้รับสถานะเดิม
+        try:
+            if not broken and connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            broken = True
+
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            keep = not (broken or self._closed or (self.recycle and now - created > self.recycle))
+            if keep:
+                self._idle.append((connection, created, now))
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if not keep:
+            self._close_quietly(connection)
+
+    def _record_checkout(self, seconds, waited):
+        with self._cond:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self._checkout_seconds += seconds
+            self._checkout_max = max(self._checkout_max, seconds)
+            milliseconds = seconds * 1000
+            for i, bound in enumerate(CHECKOUT_BUCKETS_MS):
+                if milliseconds <= bound:
+                    self._checkout_histogram[i] += 1
+                    break
+            else:
+                self._checkout_histogram[-1] += 1
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
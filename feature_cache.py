@@ -0,0 +1,352 @@
+"""
+feature_cache.py - แคชเวกเตอร์คุณลักษณะโดยใช้แฮชของเนื้อหาไฟล์เสียงเป็นคีย์
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: ไม่มี flock ทุก process จะลบไฟล์เอง (การลบซ้ำไม่เป็นอันตราย)
+    fcntl = None
+
+# ขนาดบล็อกที่อ่านต่อครั้งตอนคำนวณคีย์จากไฟล์หรือ stream
+READ_CHUNK_BYTES = 1024 * 1024
+# ไฟล์ล็อกของการตรวจขนาดชั้นดิสก์ (ทุก process ที่ใช้ไดเรกทอรีเดียวกันใช้ร่วมกัน)
+DISK_LOCK_FILENAME = '.evict.lock'
+# ตรวจขนาดของไดเรกทอรีอย่างน้อยทุกกี่วินาทีที่มีการเขียน (เพื่อเห็นไฟล์ที่ process อื่นเขียน)
+DISK_CHECK_SECONDS = 5.0
+# เมื่อเกินขนาด ลบจนเหลือสัดส่วนนี้ของ max_disk_bytes เพื่อไม่ต้องตรวจทั้งไดเรกทอรีทุกครั้งที่เขียน
+DISK_LOW_WATER = 0.9
+
+
+class FeatureCache:
+    """
+    แคชเวกเตอร์คุณลักษณะสองชั้น: หน่วยความจำแบบ LRU และดิสก์ (ไม่บังคับ) ที่จำกัดขนาดรวม
+
+    ชั้นดิสก์ใช้ร่วมกันได้หลาย process (gunicorn worker) ขนาดรวมถูกจำกัดจากไฟล์ที่อยู่ในไดเรกทอรีจริง
+    ไม่ใช่จากไฟล์ที่ process นี้เขียน ลำดับการใช้งานเก็บเป็นเวลาแก้ไขของไฟล์ (อัปเดตทุกครั้งที่อ่าน)
+
+    คีย์คือ SHA-256 ของเวอร์ชันสคีมาคุณลักษณะรวมกับไบต์ของไฟล์ ดังนั้นไฟล์เดียวกันที่อัปโหลดซ้ำ
+    จะได้คีย์เดิมเสมอ และเมื่อเปลี่ยนวิธีสกัดคุณลักษณะ (เพิ่มเวอร์ชันสคีมา) รายการเก่าจะไม่ถูกใช้อีก
+    """
+    def __init__(self, schema_version, max_entries=1024, cache_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        """
+        เริ่มต้นแคช
+
+        Args:
+            schema_version (str): เวอร์ชันสคีมาของเวกเตอร์คุณลักษณะ
+            max_entries (int): จำนวนรายการสูงสุดในหน่วยความจำ (0 = ปิดชั้นหน่วยความจำ)
+            cache_dir (str): ไดเรกทอรีสำหรับชั้นดิสก์ (None = ปิดชั้นดิสก์)
+            max_disk_bytes (int): ขนาดรวมสูงสุดของไฟล์ในชั้นดิสก์ (รวมทุก process ที่ใช้ cache_dir เดียวกัน)
+        """
+        self.schema_version = str(schema_version)
+        self.max_entries = max(int(max_entries), 0)
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max(int(max_disk_bytes), 0)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        # ขนาดและจำนวนไฟล์ของชั้นดิสก์จากการตรวจไดเรกทอรีครั้งล่าสุด บวกไฟล์ที่ process นี้เขียนหลังจากนั้น
+        self._disk_bytes = 0
+        self._disk_entries = 0
+        self._last_disk_check = 0.0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._enforce_disk_limit()
+
+    def key_for_bytes(self, data, salt=''):
+        """
+        สร้างคีย์จากไบต์ของไฟล์เสียง
+
+        Args:
+            data (bytes): เนื้อหาไฟล์
+            salt (str): ค่าการตั้งค่าเพิ่มเติมที่มีผลต่อเวกเตอร์ (เช่น ความยาวสูงสุดที่ตัด)
+
+        Returns:
+            str: คีย์แบบ hex
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{self.schema_version}\0{salt}\0".encode('utf-8'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def key_for_source(self, source, salt=''):
+        """
+        สร้างคีย์จากพาธหรือ file-like object โดยไม่เปลี่ยนตำแหน่งการอ่านของ object
+
+        Args:
+            source (str | file-like): แหล่งข้อมูลเสียง
+            salt (str): ค่าการตั้งค่าเพิ่มเติมที่มีผลต่อเวกเตอร์
+
+        Returns:
+            str: คีย์แบบ hex หรือ None ถ้าอ่านข้อมูลไม่ได้
+        """
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                return self.key_for_bytes(source, salt)
+            if isinstance(source, (str, os.PathLike)):
+                with open(source, 'rb') as f:
+                    return self._key_for_stream(f, salt)
+
+            stream = getattr(source, 'stream', source)
+            position = stream.tell()
+            try:
+                stream.seek(0)
+                return self._key_for_stream(stream, salt)
+            finally:
+                stream.seek(position)
+        except Exception as e:
+            print(f"Cannot compute feature cache key: {e}")
+            return None
+
+    def _key_for_stream(self, stream, salt):
+        """คีย์เดียวกับ key_for_bytes แต่อ่าน stream ทีละบล็อก (ไฟล์ใหญ่ไม่ถูกอ่านเข้าหน่วยความจำทั้งไฟล์)"""
+        digest = hashlib.sha256()
+        digest.update(f"{self.schema_version}\0{salt}\0".encode('utf-8'))
+        for chunk in iter(lambda: stream.read(READ_CHUNK_BYTES), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        ค้นหาเวกเตอร์คุณลักษณะจากคีย์ (หน่วยความจำก่อน แล้วจึงดิสก์)
+
+        Args:
+            key (str): คีย์จาก key_for_bytes หรือ key_for_source
+
+        Returns:
+            numpy.ndarray: สำเนาเวกเตอร์คุณลักษณะ หรือ None ถ้าไม่พบ
+        """
+        if key is None:
+            return None
+
+        with self._lock:
+            features = self._memory.get(key)
+            if features is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return features.copy()
+
+        features = self._read_disk(key)
+
+        with self._lock:
+            if features is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, features)
+        return features.copy()
+
+    def put(self, key, features):
+        """
+        เก็บเวกเตอร์คุณลักษณะลงแคชทั้งสองชั้น
+
+        Args:
+            key (str): คีย์จาก key_for_bytes หรือ key_for_source
+            features (numpy.ndarray): เวกเตอร์คุณลักษณะ
+        """
+        if key is None:
+            return
+
+        features = np.array(features, dtype=np.float64)
+        with self._lock:
+            self._put_memory(key, features)
+        self._write_disk(key, features)
+
+    def clear(self):
+        """ล้างแคชในหน่วยความจำและบนดิสก์"""
+        with self._lock:
+            self._memory.clear()
+        if not self.cache_dir:
+            return
+        for _, path, _ in self._scan_disk():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = 0
+            self._disk_entries = 0
+
+    def stats(self):
+        """
+        คืนตัวนับสถิติของแคช
+
+        Returns:
+            dict: จำนวน hit/miss และขนาดของแต่ละชั้น
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'schema_version': self.schema_version,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'hits': self.memory_hits + self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'memory_evictions': self.memory_evictions,
+                'disk_entries': self._disk_entries,
+                'disk_evictions': self.disk_evictions,
+                'disk_bytes': self._disk_bytes,
+                'max_disk_bytes': self.max_disk_bytes if self.cache_dir else 0
+            }
+
+    def _put_memory(self, key, features):
+        """เพิ่มรายการในชั้นหน่วยความจำ (ต้องถือ lock อยู่แล้ว)"""
+        if self.max_entries == 0:
+            return
+        self._memory[key] = features
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.memory_evictions += 1
+
+    def _disk_path(self, key):
+        """พาธไฟล์ในชั้นดิสก์ แยกไดเรกทอรีย่อยตามสองตัวอักษรแรกของคีย์"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _scan_disk(self):
+        """
+        รายการไฟล์ทั้งหมดในชั้นดิสก์ (ของทุก process)
+
+        Returns:
+            list: (เวลาแก้ไข, พาธ, ขนาด) ของแต่ละไฟล์ .npy
+        """
+        entries = []
+        try:
+            subdirs = [entry.path for entry in os.scandir(self.cache_dir) if entry.is_dir()]
+        except OSError:
+            return entries
+        for subdir in subdirs:
+            try:
+                with os.scandir(subdir) as it:
+                    for entry in it:
+                        if not entry.name.endswith('.npy'):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+            except OSError:
+                continue
+        return entries
+
+    def _read_disk(self, key):
+        """อ่านเวกเตอร์จากชั้นดิสก์ คืนค่า None ถ้าไม่มีหรือไฟล์เสีย"""
+        if not self.cache_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            features = np.load(path, allow_pickle=False)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Corrupt feature cache entry {key}: {e}")
+            self._remove_disk(path)
+            return None
+        return features
+
+    def _write_disk(self, key, features):
+        """เขียนเวกเตอร์ลงชั้นดิสก์แบบ atomic แล้วลบรายการเก่าหากเกินขนาดที่กำหนด"""
+        if not self.cache_dir or self.max_disk_bytes == 0:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, features, allow_pickle=False)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"Cannot write feature cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._disk_bytes += size
+            self._disk_entries += 1
+            due = (self._disk_bytes > self.max_disk_bytes
+                   or time.monotonic() - self._last_disk_check >= DISK_CHECK_SECONDS)
+        if due:
+            self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self):
+        """
+        ตรวจขนาดรวมของไฟล์ในไดเรกทอรี (รวมไฟล์ที่ process อื่นเขียน) ถ้าเกิน max_disk_bytes
+        ลบไฟล์ที่ใช้งานล่าสุดนานที่สุดก่อนจนเหลือไม่เกิน DISK_LOW_WATER ของ max_disk_bytes
+
+        ตรวจเมื่อขนาดที่ process นี้ประมาณไว้เกินกำหนด หรือทุก DISK_CHECK_SECONDS วินาทีที่มีการเขียน
+        ขนาดรวมจึงเกินได้ชั่วคราวไม่เกินที่ทุก process เขียนในช่วงนั้น ถ้ามีหลาย process จะมีเพียง process เดียว
+        ที่ตรวจและลบในแต่ละครั้ง (flock บน .evict.lock) process อื่นข้ามไป
+        """
+        with self._lock:
+            self._last_disk_check = time.monotonic()
+        try:
+            lock_file = open(os.path.join(self.cache_dir, DISK_LOCK_FILENAME), 'a')
+        except OSError as e:
+            print(f"Cannot open feature cache lock: {e}")
+            return
+        with lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            entries = self._scan_disk()
+            total = sum(size for _, _, size in entries)
+            count = len(entries)
+            evicted = 0
+            if total > self.max_disk_bytes:
+                target = self.max_disk_bytes * DISK_LOW_WATER
+                for _, path, size in sorted(entries):
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        continue
+                    total -= size
+                    count -= 1
+                    evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._disk_entries = count
+            self.disk_evictions += evicted
+
+    def _remove_disk(self, path):
+        """ลบไฟล์ของรายการในชั้นดิสก์ (ไม่สนใจกรณีไฟล์ถูกลบไปแล้ว)"""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes = max(self._disk_bytes - size, 0)
+            self._disk_entries = max(self._disk_entries - 1, 0)
@@ -0,0 +1,97 @@
+"""
+feature_kernel.py - เมทริกซ์คงที่ของการสกัดคุณลักษณะ (window, mel/chroma filterbank, DCT) ที่สร้างครั้งเดียวต่อ process
+"""
+
+import numpy as np
+import librosa
+
+# ค่า tuning ที่ librosa.estimate_tuning คืนได้ (ขอบซ้ายของช่องฮิสโตแกรมละเอียด 0.01 semitone)
+TUNING_STEPS = np.linspace(-0.5, 0.5, 101)[:-1]
+
+
+class FeatureKernel:
+    """
+    เก็บเมทริกซ์ที่ librosa สร้างใหม่ทุกครั้งที่เรียก (ค่าเดิมเสมอสำหรับพารามิเตอร์ชุดเดียวกัน)
+    เป็น float32 แบบ contiguous เพื่อให้การสกัดต่อคำขอเหลือเพียง FFT และการคูณเมทริกซ์
+
+    filterbank ของ chroma ขึ้นกับ tuning ของแต่ละไฟล์ จึงสร้างไว้ครบทุกค่าที่เป็นไปได้ (100 ค่า)
+    """
+    def __init__(self, sr=16000, n_fft=2048, hop_length=512, n_mels=128, n_mfcc=20, n_chroma=12):
+        """
+        Args:
+            sr (int): อัตราการสุ่มตัวอย่าง
+            n_fft (int): ขนาด FFT
+            hop_length (int): ระยะเลื่อนเฟรม
+            n_mels (int): จำนวนแถบ mel
+            n_mfcc (int): จำนวนสัมประสิทธิ์ MFCC
+            n_chroma (int): จำนวนแถบ chroma
+        """
+        # import ที่นี่เพื่อให้ import โมดูลนี้ได้โดยไม่โหลด scipy (ดู AudioProcessor lazy_init)
+        import scipy.fft
+
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+
+        self.window = np.ascontiguousarray(
+            librosa.filters.get_window('hann', n_fft, fftbins=True), dtype=np.float32)
+        self.frequencies = np.ascontiguousarray(
+            librosa.fft_frequencies(sr=sr, n_fft=n_fft), dtype=np.float32)
+        self.mel_basis = np.ascontiguousarray(
+            librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels), dtype=np.float32)
+        # DCT-II แบบ ortho ของ librosa.feature.mfcc ในรูปเมทริกซ์ (n_mfcc, n_mels)
+        self.dct_basis = np.ascontiguousarray(
+            scipy.fft.dct(np.eye(n_mels), axis=0, type=2, norm='ortho')[:n_mfcc], dtype=np.float32)
+        self.chroma_bases = np.ascontiguousarray(np.stack([
+            librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning, n_chroma=n_chroma)
+            for tuning in TUNING_STEPS
+        ]), dtype=np.float32)
+
+    def stft_magnitude(self, y, center=True):
+        """
+        magnitude spectrogram (เทียบเท่า np.abs(librosa.stft(y, window='hann', pad_mode='constant')))
+
+        Args:
+            y (numpy.ndarray): สัญญาณ mono float32
+            center (bool): เติมศูนย์ครึ่งหน้าต่างที่ขอบทั้งสองด้าน
+
+        Returns:
+            numpy.ndarray: รูปร่าง (1 + n_fft // 2, frames)
+        """
+        y = np.asarray(y, dtype=np.float32)
+        if center:
+            y = np.pad(y, self.n_fft // 2)
+        frames = np.lib.stride_tricks.sliding_window_view(y, self.n_fft)[::self.hop_length]
+        # แต่ละแถวคือหนึ่งเฟรม FFT ตามแกนสุดท้ายจึงอ่านหน่วยความจำต่อเนื่อง
+        return np.abs(np.fft.rfft(frames * self.window, axis=-1)).T
+
+    def mel(self, power):
+        """mel power spectrogram จาก power spectrogram"""
+        return self.mel_basis @ power
+
+    def mfcc(self, log_mel):
+        """MFCC จาก log-mel spectrogram (เทียบเท่า librosa.feature.mfcc(S=log_mel))"""
+        return self.dct_basis @ log_mel
+
+    def spectral_centroid(self, magnitude):
+        """spectral centroid รายเฟรม (เทียบเท่า librosa.feature.spectral_centroid(S=magnitude)[0])"""
+        total = magnitude.sum(axis=0)
+        weighted = self.frequencies @ magnitude
+        return np.divide(weighted, total, out=np.zeros_like(weighted), where=total > np.finfo(np.float32).tiny)
+
+    def spectral_rolloff(self, magnitude, roll_percent=0.85):
+        """spectral rolloff รายเฟรม (เทียบเท่า librosa.feature.spectral_rolloff(S=magnitude)[0])"""
+        energy = np.cumsum(magnitude, axis=0)
+        reached = energy >= roll_percent * energy[-1]
+        return self.frequencies[np.argmax(reached, axis=0)]
+
+    def chroma(self, power, tuning):
+        """
+        chromagram ที่ normalize รายเฟรมด้วยค่าสูงสุด (เทียบเท่า librosa.feature.chroma_stft)
+
+        Args:
+            power (numpy.ndarray): power spectrogram
+            tuning (float): ค่า tuning จาก librosa.estimate_tuning
+        """
+        index = int(np.clip(np.round((tuning - TUNING_STEPS[0]) * 100), 0, len(TUNING_STEPS) - 1))
+        return librosa.util.normalize(self.chroma_bases[index] @ power, norm=np.inf, axis=-2)
@@ -0,0 +1,47 @@
+"""
+gunicorn.conf.py - ค่าตั้งของ gunicorn สำหรับรัน wsgi:application แบบ pre-fork
+
+master โหลดแอป (โมเดล, filterbank และ warm-up) ครั้งเดียวก่อน fork worker ทำให้ทุก worker
+ใช้หน้าหน่วยความจำเหล่านั้นร่วมกันแบบ copy-on-write ส่วน connection pool ของ MySQL
+และเธรดต่างๆ สร้างในแต่ละ worker หลัง fork (app.init_process_resources)
+
+ค่าทั้งหมดปรับได้ด้วยตัวแปรสภาพแวดล้อม (ดู README)
+"""
+
+import gc
+import os
+
+# ให้ app.py เลื่อนการสร้างทรัพยากรต่อ process ไปที่ post_fork
+os.environ.setdefault('PREFORK', '1')
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+# งานสกัดคุณลักษณะใช้ CPU เป็นหลัก จึงใช้ worker เท่าจำนวน CPU
+workers = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))
+# เธรดต่อ worker ให้คำขอที่รอ I/O (ฐานข้อมูล, อัปโหลด) ไม่ขวางคำขออื่น
+threads = int(os.environ.get('WEB_THREADS', 2))
+# ไฟล์เสียงยาวอาจใช้เวลาหลายวินาที
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+preload_app = True
+# รีไซเคิล worker เป็นระยะ (worker ใหม่ fork จาก master จึงยังใช้หน่วยความจำร่วมกันได้ 0 = ปิด)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+accesslog = os.environ.get('WEB_ACCESS_LOG') or None
+
+
+def when_ready(server):
+    # ย้ายอ็อบเจกต์ที่โหลดแล้วทั้งหมดออกจากการติดตามของ GC ก่อน fork เพื่อไม่ให้ GC ใน worker
+    # เขียนทับ header ของอ็อบเจกต์ (ทำให้หน้าที่ใช้ร่วมกันถูกคัดลอก)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Froze %d objects before forking workers", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    import app
+    app.init_process_resources()
+
+
+def worker_exit(server, worker):
+    import app
+    app.shutdown_process_resources()
@@ -0,0 +1,222 @@
+"""
+inference_batcher.py - รวมเวกเตอร์คุณลักษณะจากหลายคำขอที่มาพร้อมกันเป็นชุดเดียวก่อนทำนาย
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# ขอบบนของช่องฮิสโตแกรม (ขนาดชุดและความยาวคิว) ช่องสุดท้ายคือค่าที่มากกว่าขอบสุดท้าย
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class _Request:
+    """เวกเตอร์คุณลักษณะของหนึ่งคำขอที่รอผล"""
+    __slots__ = ('features', 'state', 'key', 'enqueued', 'done', 'promoted', 'result', 'error')
+
+    def __init__(self, features, state, key):
+        self.features = features
+        self.state = state
+        self.key = key
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        # True = คำขอนี้ได้รับหน้าที่ผู้นำชุดถัดไป (ดู InferenceBatcher._lead)
+        self.promoted = False
+        self.result = None
+        self.error = None
+
+
+class _Histogram:
+    """ฮิสโตแกรมแบบช่องคงที่ (HISTOGRAM_BUCKETS)"""
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def observe(self, value):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in HISTOGRAM_BUCKETS] + [f">{HISTOGRAM_BUCKETS[-1]}"]
+        return dict(zip(labels, self.counts))
+
+
+class InferenceBatcher:
+    """
+    ตัวจัดชุดการทำนายข้ามคำขอ: คำขอที่เรียก predict พร้อมกันจะถูกรวมเป็นเมทริกซ์เดียว
+    แล้วเรียกฟังก์ชันทำนายครั้งเดียว ผลลัพธ์แยกกลับไปยังผู้เรียกแต่ละราย
+
+    ไม่มีเธรดเบื้องหลัง: ผู้เรียกรายแรกของชุดเป็นผู้นำ รอคำขออื่นไม่เกิน window วินาที
+    (หรือจนครบ max_rows แถว) แล้วทำนายทั้งชุดในเธรดของตัวเอง คำขอที่มาระหว่างนั้นรอในคิว
+    และคำขอแรกในคิวจะเป็นผู้นำชุดถัดไป ผู้นำจะรอเฉพาะเมื่อมีคำขออื่นที่กำลังสกัดคุณลักษณะอยู่
+    (ประกาศด้วย expecting()) คำขอที่มาเดี่ยวๆ จึงไม่ต้องรอ
+
+    คำขอที่อ่านชุดโมเดลคนละชุด (เช่น ระหว่างสลับโมเดล) จะถูกทำนายแยกกลุ่มกัน
+    """
+    def __init__(self, score, window=0.005, max_rows=64):
+        """
+        Args:
+            score (callable): score(features, state) คืนความน่าจะเป็นรูปร่าง (n, n_classes)
+            window (float): เวลาสูงสุดที่รอคำขออื่นเพื่อรวมชุด (วินาที)
+            max_rows (int): จำนวนแถวสูงสุดต่อชุด
+        """
+        self.score = score
+        self.window = window
+        self.max_rows = max(int(max_rows), 1)
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._expected = 0
+        self._leading = False
+        self._local = threading.local()
+        self._closed = False
+
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.wait_seconds = 0.0
+        self._batch_rows = _Histogram()
+        self._queue_depth = _Histogram()
+
+    @contextmanager
+    def expecting(self):
+        """
+        ประกาศว่าเธรดนี้กำลังจะเรียก predict (เช่น ระหว่างสกัดคุณลักษณะ) เพื่อให้ชุดที่กำลังรวม
+        รอคำขอนี้ได้ ถ้าออกจาก block โดยไม่ได้เรียก predict จะยกเลิกการประกาศให้เอง
+        """
+        with self._cond:
+            self._expected += 1
+        self._local.expected = True
+        try:
+            yield
+        finally:
+            if getattr(self._local, 'expected', False):
+                self._local.expected = False
+                with self._cond:
+                    self._expected -= 1
+                    self._cond.notify_all()
+
+    def predict(self, features, state):
+        """
+        ส่งเมทริกซ์คุณลักษณะเข้าชุด แล้วรอผล
+
+        Args:
+            features (numpy.ndarray): เมทริกซ์คุณลักษณะ (n, n_features)
+            state (tuple): ชุดโมเดลที่ใช้ทำนาย (ส่งต่อให้ score)
+
+        Returns:
+            numpy.ndarray: ความน่าจะเป็นรูปร่าง (n, n_classes)
+        """
+        request = _Request(features, state, tuple(id(item) for item in state))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("inference batcher is closed")
+            if getattr(self._local, 'expected', False):
+                self._local.expected = False
+                self._expected -= 1
+            self._pending.append(request)
+            lead = not self._leading
+            if lead:
+                self._leading = True
+            else:
+                self._cond.notify_all()
+
+        if not lead:
+            request.done.wait()
+            lead = request.promoted
+        if lead:
+            self._lead()
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self):
+        """ไม่รับคำขอใหม่ (คำขอที่อยู่ในคิวแล้วจะได้รับผลตามปกติ)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        สถิติของตัวจัดชุด
+
+        Returns:
+            dict: จำนวนชุด/คำขอ/แถว, เวลารอเฉลี่ย และฮิสโตแกรมขนาดชุดและความยาวคิว
+        """
+        with self._cond:
+            return {
+                'window_ms': self.window * 1000,
+                'max_rows': self.max_rows,
+                'batches': self.batches,
+                'requests': self.requests,
+                'rows': self.rows,
+                'mean_rows_per_batch': self.rows / self.batches if self.batches else 0.0,
+                'mean_wait_ms': self.wait_seconds / self.requests * 1000 if self.requests else 0.0,
+                'queue_depth': len(self._pending),
+                'batch_rows_histogram': self._batch_rows.to_dict(),
+                'queue_depth_histogram': self._queue_depth.to_dict()
+            }
+
+    def _lead(self):
+        """รวมชุดจากหัวคิว ทำนาย แล้วส่งหน้าที่ผู้นำให้คำขอแรกที่ยังรออยู่ (ถ้ามี)"""
+        batch = []
+        try:
+            with self._cond:
+                deadline = time.perf_counter() + self.window
+                while (self._expected > 0 and not self._closed
+                       and sum(len(request.features) for request in self._pending) < self.max_rows):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                depth = len(self._pending)
+                rows = 0
+                while self._pending and (not batch or rows + len(self._pending[0].features) <= self.max_rows):
+                    request = self._pending.pop(0)
+                    batch.append(request)
+                    rows += len(request.features)
+
+                started = time.perf_counter()
+                self.batches += 1
+                self.requests += len(batch)
+                self.rows += rows
+                self.wait_seconds += sum(started - request.enqueued for request in batch)
+                self._batch_rows.observe(rows)
+                self._queue_depth.observe(depth)
+
+            self._execute(batch)
+        finally:
+            with self._cond:
+                if self._pending:
+                    successor = self._pending[0]
+                    successor.promoted = True
+                    successor.done.set()
+                else:
+                    self._leading = False
+
+    def _execute(self, batch):
+        """ทำนายแต่ละกลุ่มของชุดโมเดลด้วยการเรียก score ครั้งเดียว แล้วแยกผลกลับไปยังคำขอ"""
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.key, []).append(request)
+
+        for requests in groups.values():
+            try:
+                probabilities = self.score(np.vstack([request.features for request in requests]),
+                                           requests[0].state)
+                offset = 0
+                for request in requests:
+                    request.result = probabilities[offset:offset + len(request.features)]
+                    offset += len(request.features)
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+            finally:
+                for request in requests:
+                    request.done.set()
@@ -0,0 +1,252 @@
+"""
+model_bundle.py - ไฟล์โมเดลแบบรวม (booster JSON, ค่าของ scaler, รายชื่อคลาส) ที่โหลดได้ด้วยการอ่านครั้งเดียวโดยไม่ unpickle
+
+วิธีแปลงจากไฟล์ .pkl เดิม:
+    python model_bundle.py convert models/
+"""
+
+import io
+import os
+import sys
+import json
+import hashlib
+import zipfile
+import argparse
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from tree_ensemble import TreeEnsemble
+
+BUNDLE_FILENAME = 'model_bundle.npz'
+BUNDLE_FORMAT = 'pronunciation-model-bundle'
+BUNDLE_VERSION = 1
+
+# ผลการโหลด: ตัวประเมินต้นไม้, scaler, รายชื่อคลาส, manifest (dict)
+# และ golden sample (tuple ของคุณลักษณะและความน่าจะเป็นที่คาดไว้ หรือ None ถ้าไฟล์ไม่มี)
+ModelBundle = namedtuple('ModelBundle', ['ensemble', 'scaler', 'labels', 'manifest', 'golden'])
+
+
+class BundleError(ValueError):
+    """ไฟล์โมเดลไม่ถูกต้อง เสียหาย หรือเป็นเวอร์ชันที่ไม่รองรับ"""
+
+
+class ArrayScaler:
+    """ปรับมาตรฐานคุณลักษณะจากค่า mean/scale ที่บันทึกไว้ (เทียบเท่า StandardScaler.transform)"""
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+
+class BundleLabels:
+    """รายชื่อคลาสตามลำดับคอลัมน์ของความน่าจะเป็น (ใช้แทน LabelEncoder)"""
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes)
+
+
+def _checksum(booster, mean, scale, classes, golden=None):
+    """SHA-256 ของเนื้อหาโมเดลทั้งหมด (ไม่รวม manifest)"""
+    digest = hashlib.sha256()
+    digest.update(booster)
+    digest.update(np.ascontiguousarray(mean, dtype='<f8').tobytes())
+    digest.update(np.ascontiguousarray(scale, dtype='<f8').tobytes())
+    digest.update(json.dumps([str(c) for c in classes]).encode('utf-8'))
+    for values in golden or ():
+        digest.update(np.ascontiguousarray(values, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+
+def save_bundle(path, booster_json, mean, scale, classes, feature_schema_version, source=None,
+                golden_features=None, golden_probabilities=None):
+    """
+    บันทึกไฟล์โมเดลแบบรวม (เขียนไฟล์ชั่วคราวแล้วเปลี่ยนชื่อ เพื่อไม่ให้ผู้อ่านเห็นไฟล์ที่เขียนไม่ครบ)
+
+    Args:
+        path (str): พาธของไฟล์ .npz
+        booster_json (bytes): โมเดล XGBoost ในรูปแบบ JSON (Booster.save_raw('json'))
+        mean (array-like): ค่า mean ของ scaler
+        scale (array-like): ค่า scale ของ scaler
+        classes (list): รายชื่อคลาสตามลำดับคอลัมน์ของความน่าจะเป็น
+        feature_schema_version (str): เวอร์ชันสคีมาของเวกเตอร์คุณลักษณะที่ใช้ฝึกโมเดล
+        source (str): ที่มาของโมเดล (บันทึกไว้ใน manifest)
+        golden_features (array-like): คุณลักษณะของ golden sample (ดู AudioProcessor.golden_features)
+        golden_probabilities (array-like): ความน่าจะเป็นของ golden sample จากโมเดลต้นฉบับ
+
+    Returns:
+        dict: manifest ของไฟล์ที่บันทึก
+    """
+    booster_json = bytes(booster_json)
+    # ตรวจว่า booster แปลงเป็น TreeEnsemble ได้ก่อนบันทึก
+    ensemble = TreeEnsemble.from_json(booster_json)
+    mean = np.asarray(mean, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    classes = [str(c) for c in classes]
+    if mean.shape != (ensemble.n_features,) or scale.shape != (ensemble.n_features,):
+        raise BundleError(f"scaler has {mean.shape[0]} features, model expects {ensemble.n_features}")
+
+    golden = None
+    if golden_features is not None and golden_probabilities is not None:
+        golden = (np.asarray(golden_features, dtype=np.float64).ravel(),
+                  np.asarray(golden_probabilities, dtype=np.float64).ravel())
+        if golden[0].shape != (ensemble.n_features,) or golden[1].shape != (len(classes),):
+            raise BundleError("golden sample does not match the model shape")
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'bundle_version': BUNDLE_VERSION,
+        'feature_schema_version': str(feature_schema_version),
+        'n_features': ensemble.n_features,
+        'classes': classes,
+        'objective': ensemble.objective,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'golden_sample': golden is not None,
+        'sha256': _checksum(booster_json, mean, scale, classes, golden)
+    }
+
+    members = {
+        'manifest': np.frombuffer(json.dumps(manifest).encode('utf-8'), dtype=np.uint8),
+        'booster': np.frombuffer(booster_json, dtype=np.uint8),
+        'scaler_mean': mean,
+        'scaler_scale': scale,
+        'classes': np.array(classes, dtype=str)
+    }
+    if golden is not None:
+        members['golden_features'], members['golden_probabilities'] = golden
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **members)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_bundle(path):
+    """
+    โหลดไฟล์โมเดลแบบรวมด้วยการอ่านไฟล์ครั้งเดียว (allow_pickle=False) แล้วตรวจ checksum
+
+    Args:
+        path (str): พาธของไฟล์ .npz
+
+    Returns:
+        ModelBundle: โมเดลที่พร้อมใช้
+
+    Raises:
+        BundleError: ถ้าไฟล์เสียหาย checksum ไม่ตรง หรือเวอร์ชันไม่รองรับ
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    try:
+        with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+            manifest = json.loads(archive['manifest'].tobytes().decode('utf-8'))
+            booster = archive['booster'].tobytes()
+            mean = archive['scaler_mean']
+            scale = archive['scaler_scale']
+            classes = [str(c) for c in archive['classes']]
+            golden = None
+            if 'golden_features' in archive.files:
+                golden = (archive['golden_features'], archive['golden_probabilities'])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        raise BundleError(f"cannot read model bundle: {e}")
+
+    if manifest.get('format') != BUNDLE_FORMAT or manifest.get('bundle_version') != BUNDLE_VERSION:
+        raise BundleError(f"unsupported bundle format {manifest.get('format')} "
+                          f"version {manifest.get('bundle_version')}")
+    if _checksum(booster, mean, scale, classes, golden) != manifest.get('sha256'):
+        raise BundleError("checksum mismatch")
+
+    try:
+        ensemble = TreeEnsemble.from_json(booster)
+    except (KeyError, ValueError) as e:
+        raise BundleError(f"invalid booster: {e}")
+    if ensemble.n_features != len(mean):
+        raise BundleError(f"scaler has {len(mean)} features, model expects {ensemble.n_features}")
+    # checksum ครอบเฉพาะค่าของ golden sample ต่อกัน ไม่รวมรูปร่าง จึงตรวจรูปร่างแยก
+    if golden is not None and (golden[0].shape != (ensemble.n_features,) or golden[1].shape != (len(classes),)):
+        raise BundleError("golden sample does not match the model shape")
+
+    return ModelBundle(ensemble, ArrayScaler(mean, scale), BundleLabels(classes), manifest, golden)
+
+
+def convert_pickles(models_dir, output=None, golden_features=None):
+    """
+    แปลง xgb_model.pkl, scaler.pkl และ label_encoder.pkl เดิมเป็นไฟล์โมเดลแบบรวม
+
+    ต้องมี xgboost, scikit-learn และ joblib (ใช้เฉพาะตอนแปลง ไม่ใช่ตอนให้บริการ)
+    golden sample คือคุณลักษณะของเสียงสังเคราะห์จากตัวสกัดปัจจุบัน และความน่าจะเป็นที่โมเดล
+    XGBoost ต้นฉบับให้ ใช้ตรวจไฟล์ก่อนสลับโมเดลขณะทำงาน (AudioProcessor.reload_model)
+
+    Args:
+        models_dir (str): ไดเรกทอรีของไฟล์ .pkl
+        output (str): พาธของไฟล์ผลลัพธ์ (None = models_dir/model_bundle.npz)
+        golden_features (numpy.ndarray): คุณลักษณะของ golden sample (None = สกัดใหม่)
+
+    Returns:
+        dict: manifest ของไฟล์ที่บันทึก
+    """
+    import joblib
+    from audio_processor import FEATURE_SCHEMA_VERSION, AudioProcessor
+
+    model = joblib.load(os.path.join(models_dir, 'xgb_model.pkl'))
+    scaler = joblib.load(os.path.join(models_dir, 'scaler.pkl'))
+    label_encoder = joblib.load(os.path.join(models_dir, 'label_encoder.pkl'))
+
+    if golden_features is None:
+        golden_features = AudioProcessor(models_dir=models_dir, load_model=False).golden_features()
+    golden_probabilities = model.predict_proba(scaler.transform(golden_features[np.newaxis]))[0]
+
+    n_features = scaler.n_features_in_
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    booster = model.get_booster() if hasattr(model, 'get_booster') else model
+
+    # ลำดับคลาสของ predict_proba คือลำดับของ label_encoder.classes_ (ป้ายกำกับที่เข้ารหัสเป็น 0..n-1)
+    return save_bundle(
+        output or os.path.join(models_dir, BUNDLE_FILENAME),
+        booster.save_raw(raw_format='json'),
+        mean, scale, label_encoder.classes_,
+        FEATURE_SCHEMA_VERSION,
+        source='xgb_model.pkl, scaler.pkl, label_encoder.pkl',
+        golden_features=golden_features,
+        golden_probabilities=golden_probabilities
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='จัดการไฟล์โมเดลแบบรวม')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='แปลงไฟล์ .pkl เดิมเป็น model_bundle.npz')
+    convert.add_argument('models_dir', help='ไดเรกทอรีของไฟล์ .pkl')
+    convert.add_argument('--output', help='พาธของไฟล์ผลลัพธ์')
+
+    inspect = subparsers.add_parser('inspect', help='ตรวจสอบและแสดง manifest ของไฟล์โมเดล')
+    inspect.add_argument('path', help='พาธของ model_bundle.npz')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'convert':
+            manifest = convert_pickles(args.models_dir, args.output)
+        else:
+            manifest = load_bundle(args.path).manifest
+    except (OSError, BundleError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(json.dumps(manifest, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
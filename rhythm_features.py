@@ -0,0 +1,137 @@
+"""
+rhythm_features.py - ประมาณ tempo จาก onset envelope (spectral flux ของ log-mel) แบบเบา
+"""
+
+import numpy as np
+import librosa
+
+# ความยาวหน้าต่าง autocorrelation (ค่าเริ่มต้น ac_size ของ librosa.feature.rhythm.tempo)
+TEMPO_AC_SECONDS = 8.0
+
+# ระยะห่างระหว่างหน้าต่างของ tempogram (เฟรม) librosa ใช้ทุกเฟรม แต่หน้าต่างยาว 8 วินาที
+# ที่อยู่ติดกันซ้อนทับกันเกือบทั้งหมด การใช้ทุก 32 เฟรม (~1 วินาที ที่ 16 kHz) ให้ tempo เดิม
+# ในชุดทดสอบทุกไฟล์ โดยใช้เวลาเพียงราว 1/30
+TEMPO_WINDOW_STRIDE = 32
+
+# prior แบบ log-normal และขีดจำกัดบนของ tempo (ค่าเริ่มต้นของ librosa)
+START_BPM = 120.0
+STD_BPM = 1.0
+MAX_TEMPO = 320.0
+
+
+class TempogramAccumulator:
+    """
+    สะสมค่าเฉลี่ยของ autocorrelation tempogram (เทียบเท่า librosa.feature.tempogram, center=True)
+    จาก onset envelope ที่ส่งเข้ามาทีละส่วน โดยคำนวณเฉพาะหน้าต่างทุก stride เฟรม
+
+    เก็บไว้เพียงบัฟเฟอร์ไม่กี่ร้อยค่า จึงใช้ได้ทั้งกับสัญญาณทั้งไฟล์และการสกัดแบบทีละบล็อก
+    """
+    def __init__(self, win_length, stride=TEMPO_WINDOW_STRIDE, batch=1024):
+        """
+        Args:
+            win_length (int): ความยาวหน้าต่าง autocorrelation (เฟรม)
+            stride (int): ระยะห่างระหว่างหน้าต่างที่คำนวณ (เฟรม)
+            batch (int): จำนวนเฟรมขั้นต่ำที่สะสมไว้ก่อนคำนวณหนึ่งครั้ง
+        """
+        self.win_length = win_length
+        self.stride = max(int(stride), 1)
+        self.batch = batch
+        self.window = librosa.filters.get_window('hann', win_length, fftbins=True)
+        self.total = 0
+        self.frames_done = 0
+        self.windows = 0
+        self.sum = np.zeros(win_length)
+        self._buffer = None
+        self._last = 0.0
+
+    def push(self, values):
+        """เพิ่ม onset envelope ส่วนถัดไป"""
+        if len(values) == 0:
+            return
+        if self._buffer is None:
+            # ขอบซ้ายเป็น linear ramp จาก 0 ถึงค่าแรก (เหมือน np.pad mode='linear_ramp')
+            half = self.win_length // 2
+            self._buffer = np.linspace(0.0, values[0], half, endpoint=False).astype(values.dtype)
+        self._buffer = np.concatenate([self._buffer, values])
+        self._last = values[-1]
+        self.total += len(values)
+
+        ready = len(self._buffer) - self.win_length + 1
+        if ready >= self.batch:
+            self._consume(ready)
+
+    def finish(self):
+        """
+        ปิดขอบขวาแล้วคืนค่าเฉลี่ยของ tempogram
+
+        Returns:
+            numpy.ndarray: tempogram เฉลี่ยรูปร่าง (win_length,) หรือ None ถ้าไม่มีข้อมูล
+        """
+        if self.total == 0:
+            return None
+        half = self.win_length // 2
+        ramp = np.linspace(0.0, self._last, half, endpoint=False)[::-1].astype(self._buffer.dtype)
+        self._buffer = np.concatenate([self._buffer, ramp])
+        # tempogram มีจำนวนเฟรมเท่ากับ onset envelope
+        self._consume(self.total - self.frames_done)
+        return self.sum / max(self.windows, 1)
+
+    def _consume(self, n_frames):
+        """คำนวณหน้าต่างที่ตรงกับ stride ใน n_frames เฟรมแรกของบัฟเฟอร์ แล้วทิ้งส่วนที่ใช้แล้ว"""
+        if n_frames <= 0:
+            return
+        first = -self.frames_done % self.stride
+        if first < n_frames:
+            segment = self._buffer[first:n_frames + self.win_length - 1]
+            frames = librosa.util.frame(segment, frame_length=self.win_length, hop_length=self.stride)
+            tempogram = librosa.util.normalize(
+                librosa.autocorrelate(frames * self.window[:, np.newaxis], axis=-2),
+                norm=np.inf, axis=-2
+            )
+            self.sum += tempogram.sum(axis=-1)
+            self.windows += tempogram.shape[-1]
+        self.frames_done += n_frames
+        self._buffer = self._buffer[n_frames:]
+
+
+def tempo_window_length(sr, hop_length):
+    """ความยาวหน้าต่าง autocorrelation เป็นจำนวนเฟรม"""
+    return int(librosa.time_to_frames(TEMPO_AC_SECONDS, sr=sr, hop_length=hop_length))
+
+
+def tempo_from_tempogram(tempogram, sr, hop_length):
+    """
+    เลือก tempo จาก tempogram เฉลี่ยด้วย prior แบบ log-normal (เหมือน librosa.feature.rhythm.tempo)
+
+    Args:
+        tempogram (numpy.ndarray): tempogram เฉลี่ยรูปร่าง (win_length,)
+        sr (int): อัตราการสุ่มตัวอย่าง
+        hop_length (int): ระยะเลื่อนเฟรมของ onset envelope
+
+    Returns:
+        float: tempo (BPM)
+    """
+    bpms = librosa.tempo_frequencies(len(tempogram), sr=sr, hop_length=hop_length)
+    logprior = -0.5 * ((np.log2(bpms) - np.log2(START_BPM)) / STD_BPM) ** 2
+    logprior[:int(np.argmax(bpms < MAX_TEMPO))] = -np.inf
+    return float(bpms[np.argmax(np.log1p(1e6 * tempogram) + logprior)])
+
+
+def estimate_tempo(onset_envelope, sr, hop_length):
+    """
+    ประมาณ tempo จาก onset envelope ทั้งไฟล์
+
+    Args:
+        onset_envelope (numpy.ndarray): onset envelope (เช่น จาก librosa.onset.onset_strength)
+        sr (int): อัตราการสุ่มตัวอย่าง
+        hop_length (int): ระยะเลื่อนเฟรม
+
+    Returns:
+        float: tempo (BPM)
+    """
+    accumulator = TempogramAccumulator(tempo_window_length(sr, hop_length))
+    accumulator.push(onset_envelope)
+    tempogram = accumulator.finish()
+    if tempogram is None:
+        tempogram = np.zeros(accumulator.win_length)
+    return tempo_from_tempogram(tempogram, sr, hop_length)
@@ -38,6 +38,8 @@ CREATE TABLE IF NOT EXISTS audio_files (
     file_path VARCHAR(255) NOT NULL,
     file_size INT NOT NULL,
     upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- ใช้กับการแบ่งหน้าของ /results (WHERE user_id = ? ORDER BY upload_date, id)
+    INDEX idx_audio_files_user_date (user_id, upload_date),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
@@ -64,61 +66,45 @@ CREATE TABLE IF NOT EXISTS user_progress (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- ตาราง user_assessment_totals - สรุปผลการประเมินสะสมของผู้ใช้แต่ละคน (แอปอัปเดตทุกครั้งที่บันทึกผล)
+-- index (คอลัมน์, user_id) ใช้กับการเรียงและแบ่งหน้าของ /api/admin/summary
+CREATE TABLE IF NOT EXISTS user_assessment_totals (
+    user_id INT PRIMARY KEY,
+    total_assessments INT NOT NULL DEFAULT 0,
+    high_count INT NOT NULL DEFAULT 0,
+    mid_count INT NOT NULL DEFAULT 0,
+    low_count INT NOT NULL DEFAULT 0,
+    last_assessment_date TIMESTAMP NULL,
+    INDEX idx_totals_last_assessment (last_assessment_date, user_id),
+    INDEX idx_totals_total (total_assessments, user_id),
+    INDEX idx_totals_high (high_count, user_id),
+    INDEX idx_totals_mid (mid_count, user_id),
+    INDEX idx_totals_low (low_count, user_id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- สร้างบัญชีผู้ดูแลระบบเริ่มต้น (รหัสผ่าน: admin123)
 -- รหัสผ่านใช้ werkzeug.security.generate_password_hash ซึ่งตรงกับฟังก์ชันในแอปพลิเคชัน
 INSERT INTO users (username, password_hash, email, full_name) 
 VALUES ('admin', 'pbkdf2:sha256:600000$lGBnxPTHWL9KrOB1$dc0ac62e65e4165fe5e92aed8ef5eec87ef2640bd3d0c7f5db2fad948e12983e', 'admin@example.com', 'ผู้ดูแลระบบ')
 ON DUPLICATE KEY UPDATE id = id;
 
--- สร้าง trigger สำหรับอัปเดตตาราง user_progress เมื่อมีการเพิ่มผลประเมินใหม่
-DELIMITER //
-CREATE TRIGGER IF NOT EXISTS update_user_progress AFTER INSERT ON assessment_results
-FOR EACH ROW
-BEGIN
-    DECLARE v_user_id INT;
-    DECLARE v_today DATE;
-    DECLARE v_level VARCHAR(10);
-    
-    -- ดึง user_id จากไฟล์เสียง
-    SELECT user_id INTO v_user_id FROM audio_files WHERE id = NEW.audio_file_id;
-    
-    -- ตั้งค่าวันที่ปัจจุบัน
-    SET v_today = CURDATE();
-    
-    -- ดึงระดับที่ประเมินได้
-    SET v_level = NEW.pronunciation_level;
-    
-    -- อัปเดตความก้าวหน้าของผู้ใช้
-    INSERT INTO user_progress (user_id, date, high_count, mid_count, low_count, total_count)
-    VALUES (v_user_id, v_today, 
-            IF(v_level = 'High', 1, 0),
-            IF(v_level = 'Mid', 1, 0),
-            IF(v_level = 'Low', 1, 0),
-            1)
-    ON DUPLICATE KEY UPDATE
-        high_count = high_count + IF(v_level = 'High', 1, 0),
-        mid_count = mid_count + IF(v_level = 'Mid', 1, 0),
-        low_count = low_count + IF(v_level = 'Low', 1, 0),
-        total_count = total_count + 1;
-END//
-DELIMITER ;
+-- user_progress ถูกอัปเดตโดยแอป (app.upsert_user_progress) ครั้งเดียวต่อผู้ใช้ในแต่ละ transaction
+-- แทน trigger update_user_progress เดิม คำนวณใหม่จากประวัติทั้งหมดได้ด้วย flask --app app rebuild-progress
+DROP TRIGGER IF EXISTS update_user_progress;
 
--- สร้าง views สำหรับแสดงผลสรุปของผู้ใช้แต่ละคน
+-- สร้าง views สำหรับแสดงผลสรุปของผู้ใช้แต่ละคน (อ่านจาก user_assessment_totals ไม่ต้องรวมประวัติทั้งหมด)
 CREATE OR REPLACE VIEW user_assessment_summary AS
 SELECT 
     u.id AS user_id,
     u.username,
     u.full_name,
-    COUNT(ar.id) AS total_assessments,
-    SUM(CASE WHEN ar.pronunciation_level = 'High' THEN 1 ELSE 0 END) AS high_count,
-    SUM(CASE WHEN ar.pronunciation_level = 'Mid' THEN 1 ELSE 0 END) AS mid_count,
-    SUM(CASE WHEN ar.pronunciation_level = 'Low' THEN 1 ELSE 0 END) AS low_count,
-    MAX(af.upload_date) AS last_assessment_date
+    COALESCE(t.total_assessments, 0) AS total_assessments,
+    COALESCE(t.high_count, 0) AS high_count,
+    COALESCE(t.mid_count, 0) AS mid_count,
+    COALESCE(t.low_count, 0) AS low_count,
+    t.last_assessment_date
 FROM 
     users u
 LEFT JOIN 
-    audio_files af ON u.id = af.user_id
-LEFT JOIN 
-    assessment_results ar ON af.id = ar.audio_file_id
-GROUP BY 
-    u.id, u.username, u.full_name;
\ No newline at end of file
+    user_assessment_totals t ON u.id = t.user_id;
\ No newline at end of file
@@ -13,6 +13,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultsTableBody = document.getElementById('resultsTableBody');
     const errorMessage = document.getElementById('errorMessage');
     const summaryStats = document.getElementById('summaryStats');
+    const jobProgress = document.getElementById('jobProgress');
     
     // State
     let selectedFiles = [];
@@ -126,6 +127,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // แสดงตัวโหลด
         loader.style.display = 'flex';
         resultsSection.style.display = 'none';
+        jobProgress.textContent = '';
         
         // Create form data
         const formData = new FormData();
@@ -133,8 +135,8 @@ document.addEventListener('DOMContentLoaded', function() {
             formData.append('audio_files', file);
         });
         
-        // ส่งคำขอไปยัง API endpoint
-        fetch('/api/classify', {
+        // ส่งงานไปยัง API แบบเบื้องหลัง แล้วรอจนงานเสร็จ
+        fetch('/api/jobs', {
             method: 'POST',
             body: formData
         })
@@ -150,10 +152,12 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.error) {
                 throw new Error(data.error);
             }
-            
+            return waitForJob(data);
+        })
+        .then(job => {
             // ซ่อนตัวโหลดและแสดงผลลัพธ์
             loader.style.display = 'none';
-            displayResults(data.results);
+            displayResults(job.results);
             
             // เลื่อนไปยังส่วนผลลัพธ์
             resultsSection.scrollIntoView({ behavior: 'smooth' });
@@ -177,6 +181,57 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    /**
+     * ติดตามงานจำแนกโดยสอบถามสถานะทุกวินาทีจนเสร็จ
+     * (ไม่ใช้ server-sent events เพราะแต่ละ stream ถือเธรดของ worker ไว้ตลอดทั้งงาน)
+     */
+    function waitForJob(job) {
+        return new Promise((resolve, reject) => {
+            const finish = data => {
+                showJobProgress(data);
+                if (data.status === 'done') {
+                    resolve(data);
+                } else {
+                    // งานล้มเหลวทั้งงาน: แสดงสาเหตุของแต่ละไฟล์ถ้ามี
+                    const details = (data.results || []).filter(result => result.error)
+                        .map(result => `${result.file_name}: ${result.error.message}`);
+                    reject(new Error(details.length > 0 ? details.join(', ') :
+                        (data.error ? data.error.message : 'job failed')));
+                }
+            };
+            
+            const poll = () => {
+                fetch(job.status_url)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(document.body.classList.contains('en') ? 
+                            'Connection to server failed' : 
+                            'การเชื่อมต่อกับเซิร์ฟเวอร์มีปัญหา');
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (data.status === 'done' || data.status === 'failed') {
+                        finish(data);
+                    } else {
+                        showJobProgress(data);
+                        setTimeout(poll, 1000);
+                    }
+                })
+                .catch(reject);
+            };
+            
+            poll();
+        });
+    }
+    
+    /**
+     * แสดงจำนวนไฟล์ที่ประมวลผลเสร็จแล้วใต้ตัวโหลด
+     */
+    function showJobProgress(job) {
+        jobProgress.textContent = `${job.completed} / ${job.total}`;
+    }
+    
     /**
      * จำลองผลการจำแนกด้วยข้อมูลสุ่ม (สำหรับการทดสอบเท่านั้น)
      */
@@ -215,9 +270,18 @@ document.addEventListener('DOMContentLoaded', function() {
     function displayResults(rawResults) {
         console.log("Raw results from API:", rawResults);
         
+        // แยกไฟล์ที่เซิร์ฟเวอร์ปฏิเสธ (เช่น ไฟล์เสียหาย ว่างเปล่า หรือยาวเกินกำหนด) ออกจากผลการจำแนก
+        const rejected = rawResults.filter(result => result.error);
+        if (rejected.length > 0) {
+            const details = rejected.map(result => `${result.file_name}: ${result.error.message}`).join(', ');
+            showError(document.body.classList.contains('en') ?
+                'Some files were not analyzed - ' + details :
+                'ไฟล์บางไฟล์ไม่ได้รับการวิเคราะห์ - ' + details);
+        }
+
         // Process the results to standardize format - ไม่จำเป็นต้องแปลง Medium เป็น Mid แล้ว
         // แปลง results และแก้ไขคำว่า 'Medium' เป็น 'Mid'
-        const results = rawResults.map(result => {
+        const results = rawResults.filter(result => !result.error).map(result => {
             // แปลง predictedClass
             let predictedClass = result.predicted_class;
             if (predictedClass === 'Medium') {
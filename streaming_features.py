@@ -0,0 +1,307 @@
+"""
+streaming_features.py - สกัดคุณลักษณะ 64 ตัวจากสัญญาณที่อ่านทีละบล็อก โดยใช้หน่วยความจำคงที่ไม่ว่าไฟล์จะยาวเท่าใด
+"""
+
+import numpy as np
+import librosa
+
+import rhythm_features
+
+# เกณฑ์ top_db ที่ librosa.power_to_db ใช้ตัด log-mel (dB ต่ำกว่าค่าสูงสุดของทั้งไฟล์)
+LOG_MEL_TOP_DB = 80.0
+
+# เกณฑ์ความเงียบของ librosa.effects.split ที่ใช้ใน AudioProcessor
+SILENCE_TOP_DB = 30.0
+
+# ฮิสโตแกรมขนาดของ pitch สำหรับหามัธยฐานใน estimate_tuning: ช่วง 10^-30 ถึง 10^10, 100 ช่องต่อ decade
+_TUNING_LOG_MIN = -30.0
+_TUNING_LOG_MAX = 10.0
+_TUNING_BINS_PER_DECADE = 100
+# ช่องของค่าคลาดเคลื่อน pitch (ละเอียด 0.01 ของ semitone เท่ากับ librosa.pitch_tuning)
+_TUNING_RESIDUAL_EDGES = np.linspace(-0.5, 0.5, 101)
+
+
+class RunningStats:
+    """
+    ค่าเฉลี่ยและส่วนเบี่ยงเบนมาตรฐานแบบสะสม (รวมสถิติรายบล็อกด้วยสูตรของ Chan et al.)
+
+    เทียบเท่า np.mean และ np.std (ddof=0) ตามแกนเวลาของเมทริกซ์ทั้งไฟล์
+    """
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self._m2 = np.zeros(size)
+
+    def update(self, values):
+        """
+        เพิ่มค่าของบล็อกใหม่
+
+        Args:
+            values (numpy.ndarray): รูปร่าง (size, frames)
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = values.shape[-1]
+        if n == 0:
+            return
+
+        block_mean = values.mean(axis=-1)
+        block_m2 = np.sum((values - block_mean[:, np.newaxis]) ** 2, axis=-1)
+
+        total = self.count + n
+        delta = block_mean - self.mean
+        self.mean += delta * (n / total)
+        self._m2 += block_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    @property
+    def std(self):
+        """ส่วนเบี่ยงเบนมาตรฐาน (ddof=0)"""
+        if self.count == 0:
+            return np.zeros_like(self._m2)
+        return np.sqrt(self._m2 / self.count)
+
+
+class StreamingFeatureExtractor:
+    """
+    สกัดคุณลักษณะชุดเดียวกับ AudioProcessor._features_from_signal จากสัญญาณที่อ่านทีละบล็อก
+
+    คุณลักษณะบางตัวอ้างอิงค่าของทั้งไฟล์ (ค่าสูงสุดของ log-mel ที่ใช้ตัด top_db, ค่าสูงสุดของ RMS
+    ที่ใช้หาช่วงเงียบ และ tuning ของ chroma) จึงอ่านสัญญาณสองรอบ: รอบแรกเก็บเฉพาะค่าอ้างอิงเหล่านี้
+    รอบที่สองคำนวณคุณลักษณะรายเฟรมแล้วสะสมค่าเฉลี่ย/ส่วนเบี่ยงเบนมาตรฐาน หน่วยความจำที่ใช้ขึ้นกับ
+    ขนาดบล็อกเท่านั้น
+
+    ผลลัพธ์ตรงกับการสกัดทั้งไฟล์ภายในความคลาดเคลื่อนของเลขทศนิยม ยกเว้น tuning ของ chroma
+    ซึ่งหามัธยฐานของขนาด pitch จากฮิสโตแกรม (ละเอียด 0.01 decade) แทนการเรียงค่าทั้งหมด
+    """
+    def __init__(self, kernel, block_frames=512):
+        """
+        Args:
+            kernel (FeatureKernel): เมทริกซ์ของการสกัดคุณลักษณะ (กำหนด sr, n_fft และ hop_length)
+            block_frames (int): จำนวนเฟรม STFT ที่ประมวลผลต่อบล็อก
+        """
+        self.kernel = kernel
+        self.sr = kernel.sr
+        self.n_fft = kernel.n_fft
+        self.hop_length = kernel.hop_length
+        self.block_frames = block_frames
+
+    def extract(self, open_blocks):
+        """
+        สกัดคุณลักษณะ 64 ตัว
+
+        Args:
+            open_blocks (callable): ฟังก์ชันที่คืน iterator ของบล็อกสัญญาณ mono float32
+                (ถูกเรียกสองครั้ง หนึ่งครั้งต่อการอ่านหนึ่งรอบ)
+
+        Returns:
+            numpy.ndarray: เวกเตอร์คุณลักษณะที่มีความยาว 64 ตัว (ศูนย์ทั้งหมดถ้าสัญญาณว่าง)
+        """
+        reference = self._reference_pass(open_blocks())
+        if reference is None:
+            return np.zeros(64)
+        return self._feature_pass(open_blocks(), *reference)
+
+    def _frame_blocks(self, blocks):
+        """
+        รวมบล็อกสัญญาณเป็นบัฟเฟอร์ที่มีเฟรมครบ (เทียบเท่า center=True ของ librosa)
+
+        Yields:
+            tuple: (บัฟเฟอร์ที่เติมศูนย์ขอบ สำหรับ STFT/RMS,
+                    บัฟเฟอร์ที่เติมค่าขอบ สำหรับ zero crossing rate,
+                    จำนวนตัวอย่างที่อ่านแล้วทั้งหมด)
+        """
+        pad = self.n_fft // 2
+        hop = self.hop_length
+        step = self.block_frames * hop
+        tail = None
+        first_value = last_value = 0.0
+        n_samples = 0
+
+        for block in blocks:
+            if len(block) == 0:
+                continue
+            if tail is None:
+                first_value = block[0]
+                tail = np.zeros(pad, dtype=np.float32)
+                at_start = True
+            last_value = block[-1]
+            n_samples += len(block)
+            tail = np.concatenate([tail, block])
+
+            while len(tail) >= step + self.n_fft - hop:
+                buffer = tail[:step + self.n_fft - hop]
+                yield buffer, self._edge_padded(buffer, first_value if at_start else None), n_samples
+                at_start = False
+                tail = tail[step:]
+
+        if tail is None:
+            return
+
+        tail = np.concatenate([tail, np.zeros(pad, dtype=np.float32)])
+        n_frames = 1 + (len(tail) - self.n_fft) // hop
+        buffer = tail[:(n_frames - 1) * hop + self.n_fft]
+        edge = self._edge_padded(buffer, first_value if at_start else None)
+        edge[len(tail) - pad:] = last_value
+        yield buffer, edge, n_samples
+
+    def _edge_padded(self, buffer, first_value):
+        """สำเนาบัฟเฟอร์ที่ขอบซ้ายเติมด้วยค่าตัวอย่างแรก (ZCR ของ librosa ใช้ pad_mode='edge')"""
+        if first_value is None:
+            return buffer.copy()
+        edge = buffer.copy()
+        edge[:self.n_fft // 2] = first_value
+        return edge
+
+    def _spectra(self, buffer):
+        """magnitude, power และ mel power ของเฟรมในบัฟเฟอร์"""
+        magnitude = self.kernel.stft_magnitude(buffer, center=False)
+        power = magnitude ** 2
+        mel = self.kernel.mel(power)
+        return magnitude, power, mel
+
+    def _rms(self, buffer):
+        return librosa.feature.rms(y=buffer, frame_length=self.n_fft, hop_length=self.hop_length,
+                                   center=False)[0]
+
+    def _reference_pass(self, blocks):
+        """
+        รอบแรก: หาค่าอ้างอิงของทั้งไฟล์
+
+        Returns:
+            tuple: (ค่าสูงสุดของ log-mel, ค่าสูงสุดของ RMS, tuning) หรือ None ถ้าสัญญาณว่าง
+        """
+        log_mel_max = None
+        rms_max = 0.0
+        n_mag_bins = int((_TUNING_LOG_MAX - _TUNING_LOG_MIN) * _TUNING_BINS_PER_DECADE)
+        n_res_bins = len(_TUNING_RESIDUAL_EDGES) - 1
+        tuning_hist = np.zeros(n_mag_bins * n_res_bins, dtype=np.int64)
+
+        for buffer, _, _ in self._frame_blocks(blocks):
+            _, power, mel = self._spectra(buffer)
+            block_max = np.max(librosa.power_to_db(mel, top_db=None))
+            log_mel_max = block_max if log_mel_max is None else max(log_mel_max, block_max)
+            rms_max = max(rms_max, float(np.max(self._rms(buffer))))
+
+            # เทียบเท่า librosa.estimate_tuning แต่สะสมเป็นฮิสโตแกรม (ขนาด x ค่าคลาดเคลื่อน)
+            pitch, mag = librosa.piptrack(S=power, sr=self.sr, n_fft=self.n_fft)
+            mask = pitch > 0
+            if not mask.any():
+                continue
+            log_mag = np.log10(np.maximum(mag[mask], 1e-300))
+            mag_bin = np.clip(((log_mag - _TUNING_LOG_MIN) * _TUNING_BINS_PER_DECADE).astype(np.int64),
+                              0, n_mag_bins - 1)
+            residual = np.mod(12 * librosa.hz_to_octs(pitch[mask]), 1.0)
+            residual[residual >= 0.5] -= 1.0
+            res_bin = np.clip(np.searchsorted(_TUNING_RESIDUAL_EDGES, residual, side='right') - 1,
+                              0, n_res_bins - 1)
+            tuning_hist += np.bincount(mag_bin * n_res_bins + res_bin, minlength=len(tuning_hist))
+
+        if log_mel_max is None:
+            return None
+
+        tuning_hist = tuning_hist.reshape(n_mag_bins, n_res_bins)
+        per_magnitude = tuning_hist.sum(axis=1)
+        total = per_magnitude.sum()
+        tuning = 0.0
+        if total > 0:
+            # ช่องขนาดที่มีค่ามัธยฐานอยู่ แล้วนับเฉพาะ pitch ที่ขนาดไม่ต่ำกว่าช่องนั้น
+            median_bin = int(np.searchsorted(np.cumsum(per_magnitude), (total - 1) // 2, side='right'))
+            counts = tuning_hist[median_bin:].sum(axis=0)
+            tuning = float(_TUNING_RESIDUAL_EDGES[np.argmax(counts)])
+
+        return log_mel_max, rms_max, tuning
+
+    def _feature_pass(self, blocks, log_mel_max, rms_max, tuning):
+        """รอบที่สอง: คำนวณคุณลักษณะรายเฟรมแล้วสะสมสถิติ"""
+        sr = self.sr
+        log_mel_floor = log_mel_max - LOG_MEL_TOP_DB
+
+        mfcc_stats = RunningStats(20)
+        centroid_stats = RunningStats(1)
+        rolloff_stats = RunningStats(1)
+        rms_stats = RunningStats(1)
+        zcr_stats = RunningStats(1)
+        chroma_stats = RunningStats(12)
+
+        tempogram = rhythm_features.TempogramAccumulator(
+            rhythm_features.tempo_window_length(sr, self.hop_length))
+        # onset envelope ของ librosa เลื่อนไป lag + n_fft // (2 * hop) เฟรม โดยเติมศูนย์ด้านหน้า
+        onset_delay = 1 + self.n_fft // (2 * self.hop_length)
+        previous_log_mel = None
+        pending_onset = np.zeros(0, dtype=np.float32)
+
+        n_frames = 0
+        n_samples = 0
+        in_phrase = False
+        phrase_start = 0
+        phrases = 0
+        phrase_samples = 0
+
+        for buffer, edge_buffer, n_samples in self._frame_blocks(blocks):
+            magnitude, power, mel = self._spectra(buffer)
+            log_mel = np.maximum(librosa.power_to_db(mel, top_db=None), log_mel_floor)
+
+            mfcc_stats.update(self.kernel.mfcc(log_mel))
+            centroid_stats.update(self.kernel.spectral_centroid(magnitude)[np.newaxis])
+            rolloff_stats.update(self.kernel.spectral_rolloff(magnitude)[np.newaxis])
+            rms = self._rms(buffer)
+            rms_stats.update(rms[np.newaxis])
+            zcr_stats.update(librosa.feature.zero_crossing_rate(
+                y=edge_buffer, frame_length=self.n_fft, hop_length=self.hop_length, center=False))
+            chroma_stats.update(self.kernel.chroma(power, tuning))
+
+            # spectral flux ของ log-mel ต่อเนื่องข้ามบล็อก (เหมือน librosa.onset.onset_strength)
+            if previous_log_mel is None:
+                onset = np.zeros(onset_delay, dtype=log_mel.dtype)
+                flux_input = log_mel
+            else:
+                onset = np.zeros(0, dtype=log_mel.dtype)
+                flux_input = np.concatenate([previous_log_mel, log_mel], axis=1)
+            flux = np.mean(np.maximum(0.0, flux_input[:, 1:] - flux_input[:, :-1]), axis=0)
+            previous_log_mel = log_mel[:, -1:]
+            # onset envelope ยาวเท่ากับจำนวนเฟรมที่อ่านแล้ว ส่วนที่เกินรอบล็อกถัดไป (และถูกตัดทิ้งตอนจบ)
+            block_frames = len(rms)
+            pending_onset = np.concatenate([pending_onset, onset, flux])
+            ready = n_frames + block_frames - tempogram.total
+            tempogram.push(pending_onset[:ready])
+            pending_onset = pending_onset[ready:]
+
+            # ช่วงที่ไม่เงียบ (เทียบเท่า librosa.effects.split ด้วย top_db=30)
+            db = librosa.amplitude_to_db(rms, ref=rms_max, top_db=None)
+            non_silent = db > -SILENCE_TOP_DB
+            for frame in np.flatnonzero(np.diff(np.concatenate([[in_phrase], non_silent]).astype(int))):
+                if in_phrase:
+                    phrases += 1
+                    phrase_samples += (n_frames + frame) * self.hop_length - phrase_start
+                else:
+                    phrase_start = (n_frames + frame) * self.hop_length
+                in_phrase = not in_phrase
+            n_frames += block_frames
+
+        if in_phrase:
+            phrases += 1
+            phrase_samples += min(n_frames * self.hop_length, n_samples) - phrase_start
+
+        mean_tempogram = tempogram.finish()
+        tempo = rhythm_features.tempo_from_tempogram(mean_tempogram, sr, self.hop_length)
+
+        total_duration = n_samples / sr
+        if phrases > 0:
+            non_silent_duration = phrase_samples / sr
+            silence_ratio = 1 - (non_silent_duration / total_duration)
+            avg_phrase_length = non_silent_duration / phrases
+        else:
+            silence_ratio = 1.0
+            avg_phrase_length = 0.0
+
+        # ลำดับเดียวกับ AudioProcessor._features_from_signal
+        return np.hstack([
+            mfcc_stats.mean, mfcc_stats.std,
+            centroid_stats.mean, centroid_stats.std,
+            rolloff_stats.mean, rolloff_stats.std,
+            rms_stats.mean, rms_stats.std,
+            zcr_stats.mean, zcr_stats.std,
+            [tempo],
+            chroma_stats.mean,
+            [silence_ratio, avg_phrase_length, phrases / total_duration if total_duration > 0 else 0.0]
+        ])
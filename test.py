@@ -58,7 +58,7 @@ def load_model(model_dir='models'):
     
     return model, scaler, label_encoder
 
-def inspect_model_info(model_dir='Models'):
+def inspect_model_info(model_dir='models'):
     """
     ตรวจสอบข้อมูลของโมเดลจาก model_info.json หรือ model_info.pkl
     """
@@ -296,7 +296,7 @@ def test_with_audio_file(model, scaler, label_encoder, file_path):
 
 def main():
     parser = argparse.ArgumentParser(description='ทดสอบโมเดล XGBoost สำหรับการจำแนกเสียง')
-    parser.add_argument('--model-dir', type=str, default='Models', help='ที่อยู่ของไดเร็กทอรีที่เก็บโมเดล')
+    parser.add_argument('--model-dir', type=str, default='models', help='ที่อยู่ของไดเร็กทอรีที่เก็บโมเดล')
     parser.add_argument('--audio-file', type=str, help='ไฟล์เสียงที่ต้องการทดสอบ (.wav)')
     parser.add_argument('--feature-size', type=int, default=64, help='ขนาดของคุณลักษณะ (feature size)')
     
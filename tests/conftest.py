@@ -0,0 +1,8 @@
+"""
+conftest.py - ให้ชุดทดสอบ import โมดูลที่อยู่ในรากของโปรเจกต์ได้ (รันด้วย python -m pytest tests)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
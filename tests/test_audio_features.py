@@ -0,0 +1,80 @@
+"""
+test_audio_features.py - ทดสอบว่า AudioProcessor.extract_features ให้เวกเตอร์เดียวกับการเรียก librosa แยกกันแบบเดิม
+(ภายใน FEATURE_RTOL/FEATURE_ATOL) และ tempo ของ rhythm_features ตรงกับ librosa.feature.tempo
+"""
+
+import io
+
+import numpy as np
+import librosa
+import pytest
+
+import rhythm_features
+from audio_processor import (AudioProcessor, FEATURE_COUNT, FEATURE_RTOL, FEATURE_ATOL,
+                             N_FFT, HOP_LENGTH, _synthetic_wav)
+
+
+def reference_features(data):
+    """คุณลักษณะ 64 ตัวด้วยการเรียกฟังก์ชัน librosa แยกกันทีละตัว (วิธีเดิมที่ใช้ฝึกโมเดล)"""
+    y, sr = librosa.load(io.BytesIO(data), sr=16000)
+
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=20)
+    spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    rms = librosa.feature.rms(y=y)[0]
+    zero_crossing_rate = librosa.feature.zero_crossing_rate(y=y)[0]
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    tempo = librosa.feature.tempo(y=y, sr=sr)[0]
+
+    non_silent = librosa.effects.split(y, top_db=30)
+    total_duration = len(y) / sr
+    non_silent_duration = np.sum([end - start for start, end in non_silent]) / sr
+
+    return np.hstack([
+        np.mean(mfccs, axis=1), np.std(mfccs, axis=1),
+        [np.mean(spectral_centroids), np.std(spectral_centroids)],
+        [np.mean(spectral_rolloff), np.std(spectral_rolloff)],
+        [np.mean(rms), np.std(rms)],
+        [np.mean(zero_crossing_rate), np.std(zero_crossing_rate)],
+        [tempo], np.mean(chroma, axis=1),
+        [1 - non_silent_duration / total_duration,
+         non_silent_duration / len(non_silent),
+         len(non_silent) / total_duration]
+    ])
+
+
+@pytest.fixture(scope='module')
+def processor(tmp_path_factory):
+    return AudioProcessor(models_dir=str(tmp_path_factory.mktemp('models')), load_model=False)
+
+
+@pytest.mark.parametrize('sample_rate', [8000, 16000, 22050, 44100])
+def test_features_match_librosa_reference(processor, sample_rate):
+    data = _synthetic_wav(6.0, sample_rate)
+
+    features = processor.extract_features(data)
+
+    assert features.shape == (FEATURE_COUNT,)
+    np.testing.assert_allclose(features, reference_features(data), rtol=FEATURE_RTOL, atol=FEATURE_ATOL)
+
+
+def test_path_stream_and_bytes_give_the_same_features(processor, tmp_path):
+    data = _synthetic_wav(3.0, 22050)
+    path = tmp_path / 'clip.wav'
+    path.write_bytes(data)
+
+    expected = processor.extract_features(data)
+    np.testing.assert_array_equal(processor.extract_features(str(path)), expected)
+    np.testing.assert_array_equal(processor.extract_features(io.BytesIO(data)), expected)
+
+
+@pytest.mark.parametrize('bpm', [72, 96, 120, 150])
+def test_estimate_tempo_matches_librosa(bpm):
+    sr = 16000
+    t = np.arange(20 * sr) / sr
+    clicks = np.exp(-40 * (t % (60 / bpm))) * np.sin(2 * np.pi * 800 * t)
+    y = (clicks + np.random.default_rng(bpm).normal(scale=0.005, size=len(t))).astype(np.float32)
+    onset_env = librosa.onset.onset_strength(y=y, sr=sr, hop_length=HOP_LENGTH, n_fft=N_FFT)
+
+    expected = librosa.feature.tempo(onset_envelope=onset_env, sr=sr, hop_length=HOP_LENGTH)[0]
+    assert rhythm_features.estimate_tempo(onset_env, sr, HOP_LENGTH) == pytest.approx(expected)
@@ -0,0 +1,75 @@
+"""
+test_classification_jobs.py - ทดสอบสถานะและรูปแบบข้อผิดพลาดของงานจำแนกเบื้องหลังใน JobManager
+"""
+
+import json
+import time
+
+import pytest
+
+from classification_jobs import JobManager, JobQueueFull, FINISHED_STATUSES
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(str(tmp_path), workers=1)
+    manager.start()
+    yield manager
+    manager.close()
+
+
+def handler(user_id, item):
+    """ผลของไฟล์ตามชื่อ: 'crash' ทำให้ handler ล้มเหลว, 'invalid' คือไฟล์ที่ไม่ผ่านการตรวจสอบ"""
+    if item['file_name'] == 'crash':
+        raise RuntimeError('decoder crashed')
+    if item['file_name'] == 'invalid':
+        return {'file_name': 'invalid', 'predicted_class': None, 'probabilities': {},
+                'error': {'code': 'empty', 'message': 'empty file'}}
+    return {'file_name': item['file_name'], 'predicted_class': 'High', 'probabilities': {'High': 1.0}}
+
+
+def _finished(manager, job):
+    deadline = time.monotonic() + 5
+    while True:
+        state = manager.get(job['id'])
+        if state['status'] in FINISHED_STATUSES:
+            return state
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_handler_error_uses_code_and_message(manager):
+    job = manager.submit(1, [{'file_name': 'crash'}, {'file_name': 'ok.wav'}], handler)
+
+    state = _finished(manager, job)
+
+    assert state['status'] == 'done'
+    assert state['error'] is None
+    assert state['results'][0]['error'] == {'code': 'processing_error', 'message': 'decoder crashed'}
+    assert 'error' not in state['results'][1]
+
+
+def test_job_without_successful_file_fails(manager, tmp_path):
+    job = manager.submit(1, [{'file_name': 'crash'}, {'file_name': 'invalid'}], handler)
+
+    state = _finished(manager, job)
+
+    assert state['status'] == 'failed'
+    assert state['error']['code'] == 'all_files_failed'
+    assert [result['error']['code'] for result in state['results']] == ['processing_error', 'empty']
+    # worker อื่นอ่านสถานะเดียวกันจากไฟล์
+    with open(tmp_path / f"{job['id']}.json", encoding='utf-8') as f:
+        assert json.load(f)['status'] == 'failed'
+    assert manager.stats()['failed'] == 1
+
+
+def test_queue_limit_rejects_new_jobs(tmp_path):
+    manager = JobManager(str(tmp_path), workers=1, max_pending=1)
+    manager.start()
+    try:
+        manager.submit(1, [{'file_name': 'slow'}], lambda user_id, item: time.sleep(0.2) or {})
+        with pytest.raises(JobQueueFull):
+            manager.submit(1, [{'file_name': 'ok.wav'}], handler)
+        assert manager.stats()['rejected'] == 1
+    finally:
+        manager.close()
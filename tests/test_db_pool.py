@@ -0,0 +1,149 @@
+"""
+test_db_pool.py - ทดสอบการรอ/หมดเวลา, การคืนที่ว่างเมื่อเชื่อมต่อล้มเหลว และการตรวจ connection ของ ConnectionPool
+"""
+
+import time
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout, ConnectionUnavailable
+
+
+class FakeConnection:
+    """connection ปลอมที่นับการ rollback/ping/close"""
+    def __init__(self):
+        self.in_transaction = False
+        self.unread_result = False
+        self.rollbacks = 0
+        self.pings = 0
+        self.closed = False
+        self.ping_error = None
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def ping(self, reconnect=False):
+        self.pings += 1
+        if self.ping_error is not None:
+            raise self.ping_error
+
+    def close(self):
+        self.closed = True
+
+
+class Connector:
+    """ฟังก์ชันเชื่อมต่อที่ล้มเหลวตามจำนวนครั้งที่กำหนดก่อน แล้วจึงคืน FakeConnection"""
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.created = []
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError('connection refused')
+        connection = FakeConnection()
+        self.created.append(connection)
+        return connection
+
+
+def test_exhausted_pool_times_out():
+    pool = ConnectionPool(Connector(), size=1, timeout=0.1)
+    held = pool.connection()
+
+    started = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.connection()
+    assert time.monotonic() - started >= 0.1
+
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['in_use'] == 1
+    held.close()
+    pool.connection().close()
+
+
+def test_waiter_receives_released_connection_rolled_back():
+    connector = Connector()
+    pool = ConnectionPool(connector, size=1, timeout=5)
+    held = pool.connection()
+    connector.created[0].in_transaction = True
+    received = []
+
+    waiter = threading.Thread(target=lambda: received.append(pool.connection()))
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join(5)
+
+    assert len(received) == 1
+    assert len(connector.created) == 1
+    assert connector.created[0].rollbacks == 1
+    assert pool.stats()['waits'] == 1
+
+
+def test_failed_connect_restores_slot_and_backs_off():
+    connector = Connector(failures=1)
+    pool = ConnectionPool(connector, size=1, timeout=0.1)
+
+    with pytest.raises(ConnectionRefusedError):
+        pool.connection()
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['connect_errors']) == (0, 0, 1)
+    assert stats['last_connect_error'] == 'connection refused'
+
+    # ระหว่าง backoff ไม่เชื่อมต่อซ้ำ และที่ว่างยังไม่ถูกจองค้าง
+    with pytest.raises(ConnectionUnavailable):
+        pool.connection()
+    assert pool.stats()['open'] == 0
+
+    time.sleep(0.55)
+    connection = pool.connection()
+    stats = pool.stats()
+    assert (stats['open'], stats['in_use'], stats['connects']) == (1, 1, 1)
+    assert stats['last_connect_error'] is None
+    connection.close()
+
+
+def test_broken_connection_is_closed_instead_of_reused():
+    connector = Connector()
+    pool = ConnectionPool(connector, size=2)
+    connection = pool.connection()
+    # ผู้ใช้เลิกอ่านผลของ query กลางทาง
+    connector.created[0].unread_result = True
+    connection.close()
+
+    assert connector.created[0].closed
+    assert pool.stats()['open'] == 0
+    pool.connection().close()
+    assert len(connector.created) == 2
+
+
+def test_failed_ping_replaces_idle_connection():
+    connector = Connector()
+    pool = ConnectionPool(connector, size=1, ping_after=0)
+    pool.connection().close()
+    connector.created[0].ping_error = OSError('server has gone away')
+
+    connection = pool.connection()
+    assert connection._connection is connector.created[1]
+    assert connector.created[0].closed
+    assert pool.stats()['ping_failures'] == 1
+    connection.close()
+
+
+def test_closed_pool_rejects_checkouts_and_closes_returned_connections():
+    connector = Connector()
+    pool = ConnectionPool(connector, size=2)
+    idle = pool.connection()
+    held = pool.connection()
+    idle.close()
+
+    pool.close()
+    assert connector.created[0].closed
+    with pytest.raises(ConnectionUnavailable):
+        pool.connection()
+    held.close()
+    assert connector.created[1].closed
+    assert pool.stats()['open'] == 0
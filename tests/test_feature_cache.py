@@ -0,0 +1,117 @@
+"""
+test_feature_cache.py - ทดสอบคีย์ตามเนื้อหา, การลบแบบ LRU และชั้นดิสก์ของ FeatureCache
+"""
+
+import io
+import os
+
+import numpy as np
+
+import feature_cache
+from feature_cache import FeatureCache
+
+
+def test_key_depends_on_content_schema_and_salt():
+    cache = FeatureCache('1', max_entries=4)
+    key = cache.key_for_bytes(b'audio')
+
+    assert cache.key_for_bytes(b'audio') == key
+    assert cache.key_for_bytes(b'other') != key
+    assert cache.key_for_bytes(b'audio', salt='max_duration=10') != key
+    assert FeatureCache('2').key_for_bytes(b'audio') != key
+
+
+def test_stream_and_path_keys_match_bytes_key(tmp_path, monkeypatch):
+    # บล็อกเล็กเพื่อให้การแฮชแบบทีละบล็อกอ่านหลายรอบ
+    monkeypatch.setattr(feature_cache, 'READ_CHUNK_BYTES', 7)
+    cache = FeatureCache('1')
+    data = bytes(range(256)) * 3
+    path = tmp_path / 'a.wav'
+    path.write_bytes(data)
+    stream = io.BytesIO(data)
+    stream.seek(5)
+
+    expected = cache.key_for_bytes(data, salt='s')
+    assert cache.key_for_source(str(path), salt='s') == expected
+    assert cache.key_for_source(stream, salt='s') == expected
+    assert stream.tell() == 5
+    assert cache.key_for_source(str(tmp_path / 'missing.wav')) is None
+
+
+def test_memory_layer_evicts_least_recently_used():
+    cache = FeatureCache('1', max_entries=2)
+    cache.put('a', [1.0])
+    cache.put('b', [2.0])
+    cache.get('a')
+    cache.put('c', [3.0])
+
+    assert cache.get('b') is None
+    np.testing.assert_array_equal(cache.get('a'), [1.0])
+    np.testing.assert_array_equal(cache.get('c'), [3.0])
+    stats = cache.stats()
+    assert (stats['memory_entries'], stats['memory_evictions']) == (2, 1)
+    assert (stats['memory_hits'], stats['misses']) == (3, 1)
+
+
+def test_returned_vectors_are_copies():
+    cache = FeatureCache('1')
+    cache.put('a', np.array([1.0, 2.0]))
+    cache.get('a')[0] = 99.0
+
+    np.testing.assert_array_equal(cache.get('a'), [1.0, 2.0])
+
+
+def test_disk_layer_survives_restart_and_respects_size_limit(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = FeatureCache('1', max_entries=0, cache_dir=cache_dir)
+    cache.put('aa01', np.arange(64, dtype=np.float64))
+    entry_bytes = cache.stats()['disk_bytes']
+
+    # เกินขนาดแล้วลบจนเหลือ DISK_LOW_WATER (90%) ของขนาดสูงสุด: 2.5 รายการ -> เหลือ 2
+    restarted = FeatureCache('1', max_entries=4, cache_dir=cache_dir, max_disk_bytes=int(entry_bytes * 2.5))
+    np.testing.assert_array_equal(restarted.get('aa01'), np.arange(64))
+    assert restarted.stats()['disk_hits'] == 1
+
+    restarted.put('bb02', np.zeros(64))
+    restarted.put('cc03', np.ones(64))
+    stats = restarted.stats()
+    assert (stats['disk_entries'], stats['disk_evictions']) == (2, 1)
+    assert stats['disk_bytes'] <= entry_bytes * 2
+    assert not os.path.exists(os.path.join(cache_dir, 'aa', 'aa01.npy'))
+
+
+def _directory_bytes(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(cache_dir) for name in names if name.endswith('.npy'))
+
+
+def test_disk_limit_covers_files_written_by_other_processes(tmp_path, monkeypatch):
+    # สอง worker ใช้ไดเรกทอรีเดียวกัน ต่างฝ่ายไม่รู้ว่าอีกฝ่ายเขียนอะไร ขนาดรวมต้องไม่เกินค่าเดียว
+    monkeypatch.setattr(feature_cache, 'DISK_CHECK_SECONDS', 0.0)
+    cache_dir = str(tmp_path / 'cache')
+    probe = FeatureCache('1', max_entries=0, cache_dir=str(tmp_path / 'probe'))
+    probe.put('ff00', np.zeros(64))
+    limit = probe.stats()['disk_bytes'] * 4
+
+    workers = [FeatureCache('1', max_entries=0, cache_dir=cache_dir, max_disk_bytes=limit) for _ in range(2)]
+    for n in range(6):
+        for worker_id, worker in enumerate(workers):
+            worker.put(f"{worker_id}{n:03d}", np.full(64, n, dtype=np.float64))
+
+    assert _directory_bytes(cache_dir) <= limit
+    remaining = sum(len(names) for _, _, names in os.walk(cache_dir)) - 1  # ไม่นับ .evict.lock
+    assert sum(worker.stats()['disk_evictions'] for worker in workers) == 12 - remaining
+    # รายการล่าสุดที่อีก worker เขียนยังอ่านได้จากดิสก์
+    np.testing.assert_array_equal(workers[0].get('1005'), np.full(64, 5.0))
+    np.testing.assert_array_equal(workers[1].get('0005'), np.full(64, 5.0))
+
+
+def test_corrupt_disk_entry_is_removed(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    cache = FeatureCache('1', max_entries=0, cache_dir=str(cache_dir))
+    cache.put('dd04', np.ones(64))
+    (cache_dir / 'dd' / 'dd04.npy').write_bytes(b'not numpy')
+
+    assert cache.get('dd04') is None
+    assert not (cache_dir / 'dd' / 'dd04.npy').exists()
+    assert cache.stats()['disk_entries'] == 0
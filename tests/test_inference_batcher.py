@@ -0,0 +1,140 @@
+"""
+test_inference_batcher.py - ทดสอบการรวมคำขอที่มาพร้อมกันเป็นชุดเดียว การแยกผลกลับ และการแยกกลุ่มตามชุดโมเดลของ InferenceBatcher
+"""
+
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from inference_batcher import InferenceBatcher
+
+
+class Scorer:
+    """score ที่คืน features * 2 และบันทึกขนาดของแต่ละชุด"""
+    def __init__(self, fail_state=None):
+        self.calls = []
+        self.fail_state = fail_state
+        self._lock = threading.Lock()
+
+    def __call__(self, features, state):
+        with self._lock:
+            self.calls.append((len(features), state))
+        if state == self.fail_state:
+            raise RuntimeError('model failed')
+        return features * 2
+
+
+def _run_concurrently(batcher, requests):
+    """
+    ให้แต่ละเธรดประกาศ expecting() ก่อน แล้วจึงเรียก predict พร้อมกัน (เหมือนคำขอที่สกัดคุณลักษณะพร้อมกัน)
+
+    Returns:
+        list: ผลหรือ exception ของแต่ละคำขอ เรียงตามลำดับที่ส่งเข้ามา
+    """
+    results = [None] * len(requests)
+    ready = threading.Barrier(len(requests))
+
+    def worker(index, features, state):
+        with batcher.expecting():
+            ready.wait()
+            try:
+                results[index] = batcher.predict(features, state)
+            except Exception as e:
+                results[index] = e
+
+    threads = [threading.Thread(target=worker, args=(i, features, state))
+               for i, (features, state) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def _features(rows, start):
+    return np.arange(start, start + rows * 2, dtype=np.float64).reshape(rows, 2)
+
+
+def test_single_request_is_scored_without_waiting():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, window=1.0)
+
+    started = time.perf_counter()
+    result = batcher.predict(_features(3, 0), ('model',))
+
+    assert time.perf_counter() - started < 0.5
+    np.testing.assert_array_equal(result, _features(3, 0) * 2)
+    assert scorer.calls == [(3, ('model',))]
+
+
+def test_concurrent_requests_share_one_call_and_get_their_own_rows():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, window=2.0, max_rows=64)
+    requests = [(_features(rows, index * 100), ('model',)) for index, rows in enumerate([1, 3, 2, 4])]
+
+    results = _run_concurrently(batcher, requests)
+
+    assert scorer.calls == [(10, ('model',))]
+    for (features, _), result in zip(requests, results):
+        np.testing.assert_array_equal(result, features * 2)
+    stats = batcher.stats()
+    assert (stats['batches'], stats['requests'], stats['rows']) == (1, 4, 10)
+
+
+def test_batches_are_limited_to_max_rows():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, window=2.0, max_rows=6)
+    requests = [(_features(3, index * 100), ('model',)) for index in range(4)]
+
+    results = _run_concurrently(batcher, requests)
+
+    assert sorted(rows for rows, _ in scorer.calls) == [6, 6]
+    for (features, _), result in zip(requests, results):
+        np.testing.assert_array_equal(result, features * 2)
+
+
+def test_requests_for_different_models_are_scored_separately():
+    scorer = Scorer(fail_state=('new',))
+    batcher = InferenceBatcher(scorer, window=2.0)
+    requests = [(_features(2, 0), ('old',)), (_features(1, 100), ('new',)), (_features(2, 200), ('old',))]
+
+    results = _run_concurrently(batcher, requests)
+
+    assert sorted(scorer.calls) == [(1, ('new',)), (4, ('old',))]
+    np.testing.assert_array_equal(results[0], _features(2, 0) * 2)
+    np.testing.assert_array_equal(results[2], _features(2, 200) * 2)
+    # ข้อผิดพลาดของกลุ่มหนึ่งไปถึงเฉพาะคำขอของกลุ่มนั้น
+    assert isinstance(results[1], RuntimeError)
+
+
+def test_abandoned_expectation_does_not_stall_the_batch():
+    scorer = Scorer()
+    batcher = InferenceBatcher(scorer, window=5.0)
+    leaving = threading.Event()
+
+    def abandoned():
+        # คำขอที่สกัดคุณลักษณะไม่สำเร็จ ออกจาก expecting() โดยไม่เรียก predict
+        with batcher.expecting():
+            leaving.wait()
+
+    thread = threading.Thread(target=abandoned)
+    thread.start()
+    time.sleep(0.05)
+    threading.Timer(0.1, leaving.set).start()
+
+    started = time.perf_counter()
+    batcher.predict(_features(1, 0), ('model',))
+    thread.join(5)
+
+    assert time.perf_counter() - started < 2.0
+    assert scorer.calls == [(1, ('model',))]
+
+
+def test_closed_batcher_rejects_requests():
+    batcher = InferenceBatcher(Scorer())
+    batcher.close()
+
+    with pytest.raises(RuntimeError):
+        batcher.predict(_features(1, 0), ('model',))
@@ -0,0 +1,115 @@
+"""
+test_model_bundle.py - ทดสอบการบันทึก/โหลดไฟล์โมเดลแบบรวม, การตรวจ checksum และรูปร่างของ golden sample
+"""
+
+import io
+import json
+
+import numpy as np
+import pytest
+
+import model_bundle
+from model_bundle import BundleError, save_bundle, load_bundle
+
+xgboost = pytest.importorskip('xgboost')
+
+N_FEATURES = 8
+CLASSES = ['High', 'Low', 'Mid']
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, N_FEATURES))
+    y = (X[:, 0] > 0).astype(int) + (X[:, 1] > 0.5).astype(int)
+    return xgboost.XGBClassifier(n_estimators=10, max_depth=3).fit(X, y)
+
+
+@pytest.fixture
+def bundle_args(model):
+    rng = np.random.default_rng(1)
+    mean, scale = rng.normal(size=N_FEATURES), rng.uniform(0.5, 2.0, size=N_FEATURES)
+    golden_features = rng.normal(size=N_FEATURES)
+    golden_probabilities = model.predict_proba(((golden_features - mean) / scale)[np.newaxis])[0]
+    return dict(booster_json=model.get_booster().save_raw(raw_format='json'), mean=mean, scale=scale,
+                classes=CLASSES, feature_schema_version='2', golden_features=golden_features,
+                golden_probabilities=golden_probabilities)
+
+
+def _rewrite_members(path, **changes):
+    """เขียนไฟล์ .npz ใหม่โดยแทนบางสมาชิก (manifest และ checksum เดิม)"""
+    with np.load(path, allow_pickle=False) as archive:
+        members = {name: archive[name] for name in archive.files}
+    members.update(changes)
+    buffer = io.BytesIO()
+    np.savez(buffer, **members)
+    with open(path, 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+def test_round_trip_preserves_model_scaler_labels_and_golden(tmp_path, model, bundle_args):
+    path = str(tmp_path / model_bundle.BUNDLE_FILENAME)
+    manifest = save_bundle(path, **bundle_args)
+
+    bundle = load_bundle(path)
+
+    assert bundle.manifest == manifest
+    assert (manifest['n_features'], manifest['classes'], manifest['golden_sample']) == (N_FEATURES, CLASSES, True)
+    assert list(bundle.labels.classes_) == CLASSES
+    np.testing.assert_array_equal(bundle.golden[0], bundle_args['golden_features'])
+    np.testing.assert_array_equal(bundle.golden[1], bundle_args['golden_probabilities'])
+    X = np.random.default_rng(2).normal(size=(50, N_FEATURES))
+    expected = model.predict_proba(bundle.scaler.transform(X))
+    np.testing.assert_array_equal(bundle.scaler.transform(X), (X - bundle_args['mean']) / bundle_args['scale'])
+    np.testing.assert_allclose(bundle.ensemble.predict_proba(bundle.scaler.transform(X)), expected, atol=1e-5)
+
+
+def test_tampered_member_fails_checksum(tmp_path, bundle_args):
+    path = str(tmp_path / model_bundle.BUNDLE_FILENAME)
+    save_bundle(path, **bundle_args)
+    with np.load(path, allow_pickle=False) as archive:
+        booster = archive['booster'].copy()
+    # เปลี่ยนตัวเลขหนึ่งหลักใน JSON ของ booster (ยังเป็น JSON ที่ถูกต้อง)
+    position = next(i for i in range(len(booster) - 1, 0, -1) if chr(booster[i]).isdigit())
+    booster[position] = ord('7') if booster[position] != ord('7') else ord('3')
+    _rewrite_members(path, booster=booster)
+
+    with pytest.raises(BundleError, match='checksum mismatch'):
+        load_bundle(path)
+
+
+def test_corrupt_file_is_rejected(tmp_path, bundle_args):
+    path = tmp_path / model_bundle.BUNDLE_FILENAME
+    save_bundle(str(path), **bundle_args)
+    data = bytearray(path.read_bytes())
+    data[len(data) // 2] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(BundleError):
+        load_bundle(str(path))
+
+
+def test_golden_sample_with_wrong_shape_is_rejected(tmp_path, bundle_args):
+    path = str(tmp_path / model_bundle.BUNDLE_FILENAME)
+    with pytest.raises(BundleError, match='golden sample does not match'):
+        save_bundle(path, **dict(bundle_args, golden_features=bundle_args['golden_features'][:-1]))
+
+    # ย้ายค่าสุดท้ายของคุณลักษณะไปไว้หน้าความน่าจะเป็น: ค่าที่ต่อกันเหมือนเดิม checksum จึงยังตรง
+    save_bundle(path, **bundle_args)
+    features = np.asarray(bundle_args['golden_features'], dtype=np.float64)
+    probabilities = np.asarray(bundle_args['golden_probabilities'], dtype=np.float64)
+    _rewrite_members(path, golden_features=features[:-1],
+                     golden_probabilities=np.concatenate([features[-1:], probabilities]))
+
+    with pytest.raises(BundleError, match='golden sample does not match'):
+        load_bundle(path)
+
+
+def test_unsupported_version_is_rejected(tmp_path, bundle_args):
+    path = str(tmp_path / model_bundle.BUNDLE_FILENAME)
+    manifest = save_bundle(path, **bundle_args)
+    manifest['bundle_version'] = model_bundle.BUNDLE_VERSION + 1
+    _rewrite_members(path, manifest=np.frombuffer(json.dumps(manifest).encode('utf-8'), dtype=np.uint8))
+
+    with pytest.raises(BundleError, match='unsupported bundle format'):
+        load_bundle(path)
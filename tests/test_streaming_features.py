@@ -0,0 +1,63 @@
+"""
+test_streaming_features.py - ทดสอบว่าการสกัดคุณลักษณะแบบอ่านทีละบล็อกให้ผลเดียวกับการโหลดทั้งไฟล์
+"""
+
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import wav_reader
+from audio_processor import AudioProcessor, FEATURE_RTOL, FEATURE_ATOL, _synthetic_wav
+from streaming_features import StreamingFeatureExtractor
+
+
+def long_clip(seconds, sample_rate, silence=(10.0, 15.0)):
+    """WAV PCM 16 บิตยาว seconds วินาที ที่มีช่วงเงียบสนิทอยู่กลางไฟล์"""
+    data = _synthetic_wav(seconds, sample_rate)
+    with wave.open(io.BytesIO(data)) as w:
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2').copy()
+    samples[int(silence[0] * sample_rate):int(silence[1] * sample_rate)] = 0
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def processors(tmp_path_factory):
+    models_dir = str(tmp_path_factory.mktemp('models'))
+    in_memory = AudioProcessor(models_dir=models_dir, load_model=False)
+    streaming = AudioProcessor(models_dir=models_dir, load_model=False, streaming_min_duration=10)
+    return in_memory, streaming
+
+
+@pytest.mark.parametrize('sample_rate', [16000, 22050, 44100])
+def test_streaming_matches_in_memory_extraction(processors, sample_rate):
+    in_memory, streaming = processors
+    data = long_clip(40.0, sample_rate)
+    assert streaming._should_stream(data) and not in_memory._should_stream(data)
+
+    expected = in_memory.extract_features(data)
+    features = streaming.extract_features(data)
+
+    # ช่วงเงียบถูกนับเป็นช่วงแยก (อัตราส่วนความเงียบไม่เป็นศูนย์)
+    assert expected[-3] > 0.1
+    np.testing.assert_allclose(features, expected, rtol=FEATURE_RTOL, atol=FEATURE_ATOL)
+
+
+def test_block_size_does_not_change_features(processors):
+    in_memory, _ = processors
+    data = long_clip(12.0, 22050, silence=(4.0, 6.0))
+
+    def extract(block_frames):
+        extractor = StreamingFeatureExtractor(in_memory.kernel, block_frames=block_frames)
+        return extractor.extract(lambda: wav_reader.iter_wav(data, sr=16000))
+
+    # บล็อกเล็กและไม่ลงตัวกับความยาวไฟล์ เพื่อให้ขอบบล็อกตกในทุกช่วงของสัญญาณ รวมถึงขอบของช่วงเงียบ
+    np.testing.assert_allclose(extract(37), extract(4096), rtol=FEATURE_RTOL, atol=FEATURE_ATOL)
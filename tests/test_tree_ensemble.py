@@ -0,0 +1,80 @@
+"""
+test_tree_ensemble.py - เทียบ TreeEnsemble กับ predict_proba ของ XGBoost รวมถึงค่าหาย (NaN) และค่าที่เท่ากับจุดแบ่งพอดี
+"""
+
+import numpy as np
+import pytest
+
+from tree_ensemble import TreeEnsemble
+
+xgboost = pytest.importorskip('xgboost')
+
+# เกณฑ์เดียวกับที่ audio_processor ใช้ตรวจตัวประเมินก่อนเปิดใช้งาน
+TOLERANCE = 1e-5
+
+
+def _dataset(n_classes, rows=300, features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    if n_classes == 3:
+        y += (X[:, 3] > 0.5).astype(int)
+    # ค่าหายระหว่างเทรน เพื่อให้ต้นไม้เรียนรู้ทิศทางของค่าหายทั้งซ้ายและขวา
+    X[rng.random(X.shape) < 0.1] = np.nan
+    return X, y
+
+
+def _train(n_classes, **params):
+    X, y = _dataset(n_classes)
+    model = xgboost.XGBClassifier(n_estimators=25, max_depth=4, learning_rate=0.3, **params)
+    model.fit(X, y)
+    return model
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_matches_predict_proba_with_missing_values(n_classes):
+    model = _train(n_classes)
+    ensemble = TreeEnsemble.from_xgb_model(model)
+    X, _ = _dataset(n_classes, rows=500, seed=1)
+    X[::7] = np.nan
+    X[3, :] = np.nan
+
+    expected = model.predict_proba(X)
+    actual = ensemble.predict_proba(X)
+
+    assert actual.shape == expected.shape == (500, n_classes)
+    np.testing.assert_allclose(actual, expected, rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(actual.sum(axis=1), 1.0, atol=1e-9)
+
+
+def test_values_equal_to_split_thresholds_follow_xgboost():
+    model = _train(3)
+    ensemble = TreeEnsemble.from_xgb_model(model)
+    # แต่ละแถวใช้ค่าที่เท่ากับจุดแบ่งของโหนดหนึ่งพอดี (เปรียบเทียบ < ด้วย float32)
+    splits = np.flatnonzero(ensemble.left != np.arange(len(ensemble.left)))
+    assert len(splits) > 0
+    X = np.zeros((len(splits), ensemble.n_features), dtype=np.float32)
+    X[np.arange(len(splits)), ensemble.feature[splits]] = ensemble.threshold[splits]
+
+    np.testing.assert_allclose(ensemble.predict_proba(X), model.predict_proba(X), rtol=0, atol=TOLERANCE)
+
+
+def test_loads_saved_json_model(tmp_path):
+    model = _train(3)
+    path = tmp_path / 'model.json'
+    model.get_booster().save_model(str(path))
+    X, _ = _dataset(3, rows=50, seed=2)
+
+    np.testing.assert_allclose(TreeEnsemble.load(str(path)).predict_proba(X), model.predict_proba(X),
+                               rtol=0, atol=TOLERANCE)
+
+
+def test_rejects_wrong_feature_count_and_unsupported_objective():
+    ensemble = TreeEnsemble.from_xgb_model(_train(3))
+    with pytest.raises(ValueError):
+        ensemble.predict_proba(np.zeros((2, ensemble.n_features + 1)))
+
+    X, y = _dataset(2)
+    regressor = xgboost.XGBRegressor(n_estimators=3).fit(X, y)
+    with pytest.raises(ValueError):
+        TreeEnsemble.from_xgb_model(regressor)
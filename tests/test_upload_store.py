@@ -0,0 +1,104 @@
+"""
+test_upload_store.py - ทดสอบการเก็บต้นฉบับตามแฮช (FLAC แบบไม่สูญเสีย), การเก็บซ้ำ และการกวาดตามอายุ/โควตาของ UploadStore
+"""
+
+import io
+import os
+import time
+import hashlib
+
+import numpy as np
+import pytest
+
+import upload_store
+from upload_store import UploadStore
+
+sf = pytest.importorskip('soundfile')
+
+
+def _wav_bytes(subtype='PCM_16', frames=20000, channels=2):
+    rng = np.random.default_rng(frames + channels)
+    buffer = io.BytesIO()
+    sf.write(buffer, rng.uniform(-0.5, 0.5, size=(frames, channels)), 16000, format='WAV', subtype=subtype)
+    return buffer.getvalue()
+
+
+def test_spool_hashes_stream_and_store_encodes_flac_losslessly(tmp_path, monkeypatch):
+    # บล็อกเล็กเพื่อให้การคัดลอกและการแปลงเป็น FLAC ทำหลายรอบ
+    monkeypatch.setattr(upload_store, 'COPY_CHUNK_BYTES', 4096)
+    monkeypatch.setattr(upload_store, 'FLAC_BLOCK_FRAMES', 1000)
+    store = UploadStore(str(tmp_path))
+    data = _wav_bytes('PCM_24')
+
+    temp_path, path, size = store.spool(io.BytesIO(data))
+
+    digest = hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+    assert path == os.path.join(store.archive_dir, digest[:2], digest[2:4], digest + '.flac')
+    assert store.store(temp_path, path) is True
+    assert not os.path.exists(temp_path)
+    original, _ = sf.read(io.BytesIO(data), dtype='int32')
+    archived, _ = sf.read(path, dtype='int32')
+    np.testing.assert_array_equal(archived, original)
+    assert os.path.getsize(path) < len(data)
+
+
+def test_same_upload_is_stored_once(tmp_path):
+    store = UploadStore(str(tmp_path))
+    data = _wav_bytes()
+
+    first = store.spool(io.BytesIO(data))
+    second = store.spool(io.BytesIO(data))
+    assert first[1] == second[1]
+    assert store.store(first[0], first[1]) is True
+    assert store.store(second[0], second[1]) is False
+
+    stats = store.stats()
+    assert (stats['stored'], stats['deduplicated'], stats['bytes_received']) == (1, 1, 2 * len(data))
+    assert os.listdir(store.temp_dir) == []
+
+
+def test_unsupported_files_are_kept_as_is(tmp_path):
+    store = UploadStore(str(tmp_path))
+    for data in (_wav_bytes('FLOAT'), b'not a wav'):
+        temp_path = store.temp_path('job.wav')
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        path = store.path_for(temp_path)
+        assert path.endswith('.wav')
+        store.store(temp_path, path)
+        with open(path, 'rb') as f:
+            assert f.read() == data
+
+
+def test_compression_can_be_disabled(tmp_path):
+    store = UploadStore(str(tmp_path), compress=False)
+    temp_path, path, _ = store.spool(io.BytesIO(_wav_bytes()))
+
+    assert path.endswith('.wav')
+
+
+def test_sweep_removes_expired_originals_stale_temp_files_and_enforces_quota(tmp_path):
+    store = UploadStore(str(tmp_path), compress=False, temp_max_age=60)
+    now = time.time()
+    paths = []
+    for age_days in (10, 3, 2, 1):
+        temp_path, path, _ = store.spool(io.BytesIO(os.urandom(1000)))
+        store.store(temp_path, path)
+        os.utime(path, (now - age_days * 86400,) * 2)
+        paths.append(path)
+    stale = store.temp_path('old.wav')
+    fresh = store.temp_path('new.wav')
+    for temp_path, age in ((stale, 120), (fresh, 0)):
+        with open(temp_path, 'wb') as f:
+            f.write(b'x')
+        os.utime(temp_path, (now - age,) * 2)
+
+    store.max_age = 5 * 86400
+    store.max_bytes = 2000
+    result = store.sweep()
+
+    assert (result['removed'], result['temp_removed'], result['files'], result['bytes']) == (2, 1, 2, 2000)
+    assert [os.path.exists(path) for path in paths] == [False, False, True, True]
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
@@ -0,0 +1,114 @@
+"""
+test_wav_reader.py - เทียบสัญญาณที่ถอดรหัสด้วย wav_reader กับ soundfile ในทุกรูปแบบ PCM/float ที่รองรับ
+"""
+
+import io
+
+import numpy as np
+import pytest
+
+import wav_reader
+
+sf = pytest.importorskip('soundfile')
+
+SAMPLE_RATE = 22050
+# subtype ของ soundfile -> ความละเอียดที่ header ต้องระบุ
+SUBTYPES = {'PCM_U8': 8, 'PCM_16': 16, 'PCM_24': 24, 'PCM_32': 32, 'FLOAT': 32, 'DOUBLE': 64}
+
+
+def _wav_bytes(subtype, channels=1, frames=5000, container='WAV'):
+    rng = np.random.default_rng(channels * 100 + frames)
+    signal = rng.uniform(-0.9, 0.9, size=(frames, channels))
+    buffer = io.BytesIO()
+    sf.write(buffer, signal, SAMPLE_RATE, format=container, subtype=subtype)
+    return buffer.getvalue()
+
+
+def _soundfile_mono(data):
+    samples, sample_rate = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+    return samples.mean(axis=1), sample_rate
+
+
+@pytest.mark.parametrize('container', ['WAV', 'WAVEX'])
+@pytest.mark.parametrize('channels', [1, 2])
+@pytest.mark.parametrize('subtype', list(SUBTYPES))
+def test_matches_soundfile(subtype, channels, container):
+    data = _wav_bytes(subtype, channels, container=container)
+
+    info = wav_reader.read_wav_info(io.BytesIO(data))
+    assert (info.sample_rate, info.channels, info.bits_per_sample) == (SAMPLE_RATE, channels, SUBTYPES[subtype])
+    assert info.n_frames == 5000
+
+    y, sample_rate = wav_reader.read_wav(data, sr=None)
+    expected, expected_rate = _soundfile_mono(data)
+    assert sample_rate == expected_rate
+    assert y.dtype == np.float32
+    np.testing.assert_allclose(y, expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize('subtype', ['PCM_16', 'PCM_24'])
+def test_path_stream_and_bytes_decode_identically(tmp_path, subtype):
+    data = _wav_bytes(subtype, channels=2)
+    path = tmp_path / 'sample.wav'
+    path.write_bytes(data)
+    stream = io.BytesIO(data)
+
+    from_bytes, _ = wav_reader.read_wav(data, sr=None)
+    from_path, _ = wav_reader.read_wav(str(path), sr=None)
+    from_stream, _ = wav_reader.read_wav(stream, sr=None)
+
+    np.testing.assert_array_equal(from_path, from_bytes)
+    np.testing.assert_array_equal(from_stream, from_bytes)
+    # ตำแหน่งการอ่านของ stream ของผู้เรียกถูกคืนกลับ (ผู้เรียกถัดไปอ่านไฟล์เดิมได้ทันที)
+    assert stream.tell() == 0
+
+
+def test_iter_wav_blocks_concatenate_to_read_wav():
+    data = _wav_bytes('PCM_24', channels=2, frames=10007)
+
+    whole, _ = wav_reader.read_wav(data, sr=None)
+    blocks = list(wav_reader.iter_wav(data, sr=None, block_frames=1000))
+
+    assert len(blocks) == 11
+    np.testing.assert_array_equal(np.concatenate(blocks), whole)
+
+
+def test_resampled_stream_matches_whole_file_resample():
+    pytest.importorskip('soxr')
+    data = _wav_bytes('PCM_16', frames=SAMPLE_RATE * 2)
+
+    whole, sample_rate = wav_reader.read_wav(data, sr=16000)
+    streamed = np.concatenate(list(wav_reader.iter_wav(data, sr=16000, block_frames=4096)))
+
+    assert sample_rate == 16000
+    assert len(whole) == 32000
+    np.testing.assert_allclose(streamed, whole, rtol=0, atol=1e-5)
+
+
+def test_max_duration_truncates():
+    data = _wav_bytes('PCM_16', frames=SAMPLE_RATE)
+
+    y, _ = wav_reader.read_wav(data, sr=None, max_duration=0.5)
+
+    assert len(y) == SAMPLE_RATE // 2
+    expected, _ = _soundfile_mono(data)
+    np.testing.assert_allclose(y, expected[:SAMPLE_RATE // 2], rtol=0, atol=1e-6)
+
+
+def test_truncated_data_chunk_reads_available_frames():
+    data = _wav_bytes('PCM_16', frames=1000)
+
+    y, _ = wav_reader.read_wav(data[:-101], sr=None)
+
+    # 101 ไบต์ที่หายไปคือ 50 เฟรมเต็ม และเฟรมที่เหลือครึ่งเดียวถูกทิ้ง
+    assert len(y) == 949
+
+
+def test_rejects_non_wav_and_unsupported_encodings():
+    with pytest.raises(wav_reader.WavFormatError):
+        wav_reader.read_wav(b'not a wav file at all', sr=None)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros(100), SAMPLE_RATE, format='WAV', subtype='ULAW')
+    with pytest.raises(wav_reader.UnsupportedWavFormat):
+        wav_reader.read_wav_info(io.BytesIO(buffer.getvalue()))
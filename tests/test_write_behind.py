@@ -0,0 +1,195 @@
+"""
+test_write_behind.py - ทดสอบการกู้ journal หลัง process ล่ม, dead letter, การ replay dead letter และการเขียน journal ใหม่ของ WriteBehindQueue
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+from write_behind import WriteBehindQueue, DEAD_LETTER_FILENAME, _read_journal, replay_dead_letter
+
+
+def _dead_pid():
+    """pid ของ process ที่จบไปแล้ว"""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+class Recorder:
+    """flush ที่เก็บรายการที่บันทึกแล้ว"""
+    def __init__(self):
+        self.entries = []
+
+    def __call__(self, entries):
+        self.entries.extend(entries)
+
+    def payloads(self):
+        return [(entry['user_id'], entry['payload']) for entry in self.entries]
+
+
+def test_recovers_unsaved_entries_after_crash(tmp_path):
+    def database_down(entries):
+        raise ConnectionError('database down')
+
+    crashed = WriteBehindQueue(str(tmp_path), database_down, fsync=False, retry_min=60)
+    crashed.start()
+    crashed.submit(1, {'n': 1})
+    crashed.submit(2, {'n': 2})
+    _wait_until(lambda: crashed.stats()['retries'] >= 1)
+    # process หยุดกะทันหัน: ไม่มีการ ack และบรรทัดสุดท้ายเขียนไม่ครบ
+    crashed._abandon.set()
+    with open(crashed._path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 3, "user_id": 3, "pay')
+
+    saved = Recorder()
+    queue = WriteBehindQueue(str(tmp_path), saved, fsync=False)
+    queue.start()
+    assert queue.close(timeout=5)
+
+    assert saved.payloads() == [(1, {'n': 1}), (2, {'n': 2})]
+    assert queue.stats()['recovered'] == 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_recovery_skips_acknowledged_prefix(tmp_path):
+    journal = tmp_path / f"{_dead_pid()}-1.journal"
+    lines = [{'seq': seq, 'user_id': seq, 'created': 0.0, 'payload': seq} for seq in (1, 2, 3)]
+    lines.insert(2, {'ack': 2})
+    journal.write_text(''.join(json.dumps(line) + '\n' for line in lines), encoding='utf-8')
+
+    saved = Recorder()
+    queue = WriteBehindQueue(str(tmp_path), saved, fsync=False)
+    queue.start()
+    assert queue.close(timeout=5)
+
+    assert saved.payloads() == [(3, 3)]
+    assert not journal.exists()
+
+
+def test_recovery_leaves_journals_of_live_processes(tmp_path):
+    # journal ของ process อื่นที่ยังทำงานอยู่ (pid 1) ต้องไม่ถูกนำไปบันทึกซ้ำ
+    journal = tmp_path / "1-1.journal"
+    journal.write_text(json.dumps({'seq': 1, 'user_id': 1, 'created': 0.0, 'payload': 1}) + '\n')
+
+    saved = Recorder()
+    queue = WriteBehindQueue(str(tmp_path), saved, fsync=False)
+    queue.start()
+    assert queue.close(timeout=5)
+
+    assert saved.entries == []
+    assert journal.exists()
+
+
+def test_permanent_error_moves_only_bad_entry_to_dead_letter(tmp_path):
+    saved = Recorder()
+    release = threading.Event()
+
+    def flush(entries):
+        release.wait()
+        if any(entry['payload'] == 'bad' for entry in entries):
+            raise ValueError('constraint violated')
+        saved(entries)
+
+    queue = WriteBehindQueue(str(tmp_path), flush, is_permanent=lambda e: isinstance(e, ValueError),
+                             fsync=False)
+    queue.start()
+    for payload in ('a', 'bad', 'b', 'c'):
+        queue.submit(7, payload)
+    release.set()
+    assert queue.close(timeout=5)
+
+    assert [payload for _, payload in saved.payloads()] == ['a', 'b', 'c']
+    stats = queue.stats()
+    assert stats['dead_lettered'] == 1
+    assert stats['flushed'] == 3
+    assert stats['last_error'] == 'ValueError: constraint violated'
+    with open(tmp_path / DEAD_LETTER_FILENAME, encoding='utf-8') as f:
+        dead = [json.loads(line) for line in f]
+    assert [(entry['payload'], entry['error']) for entry in dead] == [('bad', 'constraint violated')]
+
+
+def test_replay_dead_letter_keeps_only_entries_that_still_fail(tmp_path):
+    dead = [{'seq': seq, 'user_id': 1, 'created': 0.0, 'payload': payload, 'error': 'old'}
+            for seq, payload in enumerate(('a', 'bad', 'b'), 1)]
+    (tmp_path / DEAD_LETTER_FILENAME).write_text(''.join(json.dumps(entry) + '\n' for entry in dead))
+    # ไฟล์ของการ replay ที่หยุดกลางคัน (process จบไปแล้ว) ถูกนำมาบันทึกต่อ
+    leftover = tmp_path / f"{DEAD_LETTER_FILENAME}.{_dead_pid()}-1.replaying"
+    leftover.write_text(json.dumps({'seq': 9, 'user_id': 2, 'created': 0.0, 'payload': 'c', 'error': 'old'}) + '\n')
+    saved = Recorder()
+
+    def flush(entries):
+        if entries[0]['payload'] == 'bad':
+            raise ValueError('still bad')
+        saved(entries)
+
+    assert replay_dead_letter(str(tmp_path), flush) == {'replayed': 3, 'failed': 1}
+    assert sorted(saved.payloads()) == [(1, 'a'), (1, 'b'), (2, 'c')]
+    assert sorted(os.listdir(tmp_path)) == [DEAD_LETTER_FILENAME]
+    with open(tmp_path / DEAD_LETTER_FILENAME, encoding='utf-8') as f:
+        remaining = [json.loads(line) for line in f]
+    assert [(entry['payload'], entry['error']) for entry in remaining] == [('bad', 'still bad')]
+
+    assert replay_dead_letter(str(tmp_path), saved) == {'replayed': 1, 'failed': 0}
+    assert os.listdir(tmp_path) == []
+
+
+def test_transient_error_is_retried_with_the_same_batch(tmp_path):
+    saved = Recorder()
+    failures = [ConnectionError('down'), ConnectionError('down')]
+
+    def flush(entries):
+        if failures:
+            raise failures.pop()
+        saved(entries)
+
+    queue = WriteBehindQueue(str(tmp_path), flush, fsync=False, retry_min=0.01)
+    queue.start()
+    queue.submit(1, 'x')
+    assert queue.close(timeout=5)
+
+    assert saved.payloads() == [(1, 'x')]
+    assert queue.stats()['retries'] == 2
+    assert not (tmp_path / DEAD_LETTER_FILENAME).exists()
+
+
+def test_journal_is_compacted_while_queue_never_drains(tmp_path):
+    saved = Recorder()
+    permits = threading.Semaphore(0)
+
+    def flush(entries):
+        permits.acquire()
+        saved(entries)
+
+    queue = WriteBehindQueue(str(tmp_path), flush, batch_size=1, fsync=False, compact_after=3)
+    queue.start()
+    for n in range(10):
+        queue.submit(1, n)
+
+    for _ in range(4):
+        permits.release()
+    _wait_until(lambda: queue.stats()['flushed'] == 4)
+
+    # หลังบันทึก 3 รายการ journal ถูกเขียนใหม่ เหลือรายการค้างกับ ack ของรายการที่ 4 เท่านั้น
+    assert queue.stats()['compactions'] == 1
+    with open(queue._path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record.get('seq', record.get('ack')) for record in records] == [4, 5, 6, 7, 8, 9, 10, 4]
+    assert [entry['seq'] for entry in _read_journal(queue._path)] == [5, 6, 7, 8, 9, 10]
+
+    # รายการที่เพิ่มหลังเขียนใหม่ต่อท้ายไฟล์ใหม่ตามปกติ
+    queue.submit(1, 10)
+    for _ in range(7):
+        permits.release()
+    assert queue.close(timeout=5)
+    assert [payload for _, payload in saved.payloads()] == list(range(11))
@@ -0,0 +1,190 @@
+"""
+tree_ensemble.py - ประเมินโมเดล XGBoost (gbtree) ด้วย NumPy จากตารางโหนดที่แปลงมาจาก booster โดยไม่ต้องใช้ xgboost
+"""
+
+import json
+
+import numpy as np
+
+# objective ที่รองรับ และฟังก์ชันแปลง margin เป็นความน่าจะเป็น
+SOFTMAX_OBJECTIVES = ('multi:softprob', 'multi:softmax')
+LOGISTIC_OBJECTIVES = ('binary:logistic',)
+
+
+class TreeEnsemble:
+    """
+    ต้นไม้ทั้งหมดของ booster รวมเป็นตารางโหนดแบบแบน (หนึ่งแถวต่อโหนด):
+    ดัชนีคุณลักษณะ, ค่าแบ่ง, ลูกซ้าย/ขวา, ทิศทางเมื่อค่าหาย และค่าของใบ
+
+    การประเมินเดินทุกต้นไม้ของทุกแถวพร้อมกันทีละระดับความลึก โหนดใบชี้กลับมาที่ตัวเอง
+    จึงวนครบ max_depth รอบได้โดยไม่ต้องแยกกรณี การเปรียบเทียบทำด้วย float32 เหมือน XGBoost
+    """
+    def __init__(self, feature, threshold, left, right, default_left, leaf_value,
+                 roots, tree_group, base_margin, n_features, objective, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.tree_group = tree_group
+        self.base_margin = base_margin
+        self.n_features = n_features
+        self.objective = objective
+        self.max_depth = max_depth
+        self.n_groups = len(base_margin)
+        # ใช้รวมค่าใบของแต่ละต้นไม้เข้ากับคลาสของต้นไม้นั้นด้วยการคูณเมทริกซ์ครั้งเดียว
+        self._group_matrix = np.zeros((len(roots), self.n_groups), dtype=np.float64)
+        self._group_matrix[np.arange(len(roots)), tree_group] = 1.0
+
+    @classmethod
+    def from_json(cls, model):
+        """
+        สร้างจากโมเดล XGBoost แบบ JSON (Booster.save_model('*.json') หรือ save_raw('json'))
+
+        Args:
+            model (dict | str | bytes): โมเดลที่ parse แล้ว หรือข้อความ JSON
+
+        Returns:
+            TreeEnsemble: ตัวประเมินโมเดล
+
+        Raises:
+            ValueError: ถ้าโมเดลใช้ objective, booster หรือ split แบบที่ไม่รองรับ
+        """
+        if isinstance(model, (bytes, bytearray, str)):
+            model = json.loads(model)
+
+        learner = model['learner']
+        objective = learner['objective']['name']
+        if objective not in SOFTMAX_OBJECTIVES + LOGISTIC_OBJECTIVES:
+            raise ValueError(f"unsupported objective {objective}")
+
+        booster = learner['gradient_booster']
+        if booster['name'] != 'gbtree':
+            raise ValueError(f"unsupported booster {booster['name']}")
+
+        params = learner['learner_model_param']
+        n_features = int(params['num_feature'])
+        n_groups = max(int(params.get('num_class', 0)), 1)
+        base_score = np.array(
+            [float(value) for value in params['base_score'].strip('[]').split(',')], dtype=np.float64)
+        base_score = np.broadcast_to(base_score, (n_groups,)).copy()
+        if objective in LOGISTIC_OBJECTIVES:
+            # base_score ของ binary:logistic เก็บเป็นความน่าจะเป็น
+            base_score = np.log(base_score / (1.0 - base_score))
+
+        trees = booster['model']['trees']
+        tree_group = np.asarray(booster['model']['tree_info'], dtype=np.int64)
+
+        features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree.get('split_type', [])):
+                raise ValueError("categorical splits are not supported")
+
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            is_leaf = left == -1
+            own = np.arange(len(left), dtype=np.int64)
+
+            features.append(np.where(is_leaf, 0, np.asarray(tree['split_indices'], dtype=np.int64)))
+            thresholds.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+            # โหนดใบของ XGBoost เก็บค่าใบไว้ใน split_conditions
+            values.append(np.where(is_leaf, np.asarray(tree['split_conditions'], dtype=np.float32), 0.0))
+            lefts.append(np.where(is_leaf, own, left) + offset)
+            rights.append(np.where(is_leaf, own, right) + offset)
+            defaults.append(np.asarray(tree['default_left'], dtype=bool))
+            roots.append(offset)
+            max_depth = max(max_depth, _tree_depth(left, right))
+            offset += len(left)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            default_left=np.concatenate(defaults),
+            leaf_value=np.concatenate(values).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int32),
+            tree_group=tree_group,
+            base_margin=base_score,
+            n_features=n_features,
+            objective=objective,
+            max_depth=max_depth
+        )
+
+    @classmethod
+    def from_xgb_model(cls, model):
+        """
+        สร้างจาก xgboost.XGBClassifier หรือ xgboost.Booster ที่โหลดไว้แล้ว
+
+        Args:
+            model: โมเดล XGBoost
+
+        Returns:
+            TreeEnsemble: ตัวประเมินโมเดล
+        """
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        return cls.from_json(bytes(booster.save_raw(raw_format='json')))
+
+    @classmethod
+    def load(cls, path):
+        """โหลดจากไฟล์โมเดล XGBoost แบบ JSON"""
+        with open(path, 'rb') as f:
+            return cls.from_json(f.read())
+
+    def predict_margin(self, X):
+        """
+        ผลรวมค่าใบของทุกต้นไม้ (raw margin) ของแต่ละคลาส
+
+        Args:
+            X (numpy.ndarray): เมทริกซ์คุณลักษณะ (n, n_features) ค่า NaN ถือเป็นค่าหาย
+
+        Returns:
+            numpy.ndarray: margin รูปร่าง (n, n_groups)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"expected shape (n, {self.n_features}), got {X.shape}")
+
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            values = X[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.leaf_value[nodes].astype(np.float64) @ self._group_matrix + self.base_margin
+
+    def predict_proba(self, X):
+        """
+        ความน่าจะเป็นของแต่ละคลาส (เหมือน XGBClassifier.predict_proba)
+
+        Args:
+            X (numpy.ndarray): เมทริกซ์คุณลักษณะ (n, n_features)
+
+        Returns:
+            numpy.ndarray: ความน่าจะเป็นรูปร่าง (n, n_classes)
+        """
+        margin = self.predict_margin(X)
+        if self.objective in LOGISTIC_OBJECTIVES:
+            positive = 1.0 / (1.0 + np.exp(-margin[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+
+        margin -= margin.max(axis=1, keepdims=True)
+        np.exp(margin, out=margin)
+        margin /= margin.sum(axis=1, keepdims=True)
+        return margin
+
+
+def _tree_depth(left, right):
+    """ความลึกสูงสุดของต้นไม้หนึ่งต้น (จำนวนการแบ่งจากรากถึงใบที่ลึกที่สุด)"""
+    depth = 0
+    level = [0]
+    while True:
+        level = [child for node in level if left[node] != -1 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
@@ -0,0 +1,313 @@
+"""
+upload_store.py - ที่เก็บไฟล์เสียงต้นฉบับ: บีบอัดแบบไม่สูญเสีย (FLAC) เก็บตามแฮชของเนื้อหา และลบตามอายุ/โควตา
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: ไม่มี flock ทุก process จะกวาดไฟล์เอง (การลบซ้ำไม่เป็นอันตราย)
+    fcntl = None
+
+ARCHIVE_DIRNAME = 'archive'
+TEMP_DIRNAME = 'tmp'
+SWEEP_LOCK_FILENAME = '.sweep.lock'
+
+# ชนิดข้อมูลของ WAV ที่แปลงเป็น FLAC ได้โดยไม่สูญเสีย -> dtype ที่ใช้อ่านตัวอย่างเสียง
+FLAC_SUBTYPES = {'PCM_16': 'int16', 'PCM_24': 'int32'}
+# ขนาดบล็อกที่อ่าน/แฮช/คัดลอกต่อครั้ง และจำนวนเฟรมต่อบล็อกตอนแปลงเป็น FLAC
+COPY_CHUNK_BYTES = 1024 * 1024
+FLAC_BLOCK_FRAMES = 65536
+
+
+def _flac_subtype(path):
+    """subtype ของ WAV ถ้าบีบอัดเป็น FLAC ได้โดยไม่สูญเสีย (อ่านเฉพาะ header) ไม่เช่นนั้น None"""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+    except ImportError:
+        return None
+    except Exception:
+        # ไฟล์ที่ soundfile อ่านไม่ได้ เก็บเป็นไบต์เดิม
+        return None
+    if info.format not in ('WAV', 'WAVEX') or info.subtype not in FLAC_SUBTYPES:
+        return None
+    return info.subtype
+
+
+def _encode_flac(source_path, output_path):
+    """แปลง WAV (PCM) เป็น FLAC ทีละบล็อกโดยคงค่าตัวอย่างเสียงทุกค่า (หน่วยความจำคงที่ไม่ว่าไฟล์ยาวเท่าใด)"""
+    import soundfile as sf
+    with sf.SoundFile(source_path) as source:
+        dtype = FLAC_SUBTYPES[source.subtype]
+        with sf.SoundFile(output_path, 'w', samplerate=source.samplerate, channels=source.channels,
+                          format='FLAC', subtype=source.subtype) as output:
+            for block in source.blocks(blocksize=FLAC_BLOCK_FRAMES, dtype=dtype, always_2d=True):
+                output.write(block)
+
+
+def _file_digest(path):
+    """SHA-256 ของไฟล์ (อ่านทีละบล็อก)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """
+    ที่เก็บไฟล์อัปโหลดใต้ root
+
+    - archive/<aa>/<bb>/<sha256>.flac: ต้นฉบับที่บีบอัดแบบไม่สูญเสีย ชื่อไฟล์คือแฮชของไบต์ที่อัปโหลด
+      ไฟล์ที่เหมือนกันจึงถูกเก็บครั้งเดียว (WAV ที่ไม่ใช่ PCM 16/24 บิตเก็บเป็น .wav ตามเดิม)
+    - tmp/: ไฟล์ชั่วคราวของคำขอ (เช่น งานเบื้องหลัง) ผู้สร้างต้องลบเอง ที่ค้างเกิน temp_max_age
+      (เช่น process ล่มกลางงาน) จะถูกลบโดยการกวาด
+    - ไฟล์อื่นที่อยู่ตรงใต้ root คือต้นฉบับจากเวอร์ชันก่อน ถูกนับรวมในอายุ/โควตาเหมือนใน archive
+
+    การกวาด (sweep) ลบต้นฉบับที่ไม่ถูกอัปโหลดซ้ำนานกว่า max_age วินาที แล้วลบไฟล์ที่เก่าที่สุดจนขนาดรวม
+    ไม่เกิน max_bytes แถวใน audio_files ยังคงอยู่ แต่ file_path อาจชี้ไปยังไฟล์ที่ถูกลบแล้ว
+    """
+    def __init__(self, root, compress=True, max_age=0, max_bytes=0, temp_max_age=86400):
+        """
+        Args:
+            root (str): ไดเรกทอรีของไฟล์อัปโหลด
+            compress (bool): บีบอัดต้นฉบับเป็น FLAC
+            max_age (float): อายุสูงสุดของต้นฉบับนับจากการอัปโหลดครั้งล่าสุด (วินาที, 0 = ไม่จำกัด)
+            max_bytes (int): ขนาดรวมสูงสุดของต้นฉบับ (ไบต์, 0 = ไม่จำกัด)
+            temp_max_age (float): ลบไฟล์ชั่วคราวที่เก่ากว่านี้ (วินาที)
+        """
+        self.root = root
+        self.compress = compress
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.temp_max_age = temp_max_age
+        self.archive_dir = os.path.join(root, ARCHIVE_DIRNAME)
+        self.temp_dir = os.path.join(root, TEMP_DIRNAME)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._sweeper_stop = threading.Event()
+
+        self.stored = 0
+        self.deduplicated = 0
+        self.bytes_received = 0
+        self.bytes_written = 0
+        self.last_sweep = None
+
+    def temp_path(self, filename):
+        """พาธไม่ซ้ำใน tmp/ สำหรับไฟล์ชั่วคราวของคำขอ"""
+        return os.path.join(self.temp_dir, f"{uuid.uuid4()}_{filename}")
+
+    def spool(self, stream):
+        """
+        คัดลอก stream ของไฟล์อัปโหลด (เช่น FileStorage.stream) ลงไฟล์ชั่วคราวใน tmp/ ทีละบล็อก
+        พร้อมคำนวณแฮชไปในรอบเดียวกัน ไฟล์จึงไม่ถูกอ่านเข้าหน่วยความจำทั้งไฟล์
+
+        Returns:
+            tuple: (พาธไฟล์ชั่วคราวสำหรับ store(), พาธใน archive, ขนาดไฟล์)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        temp_path = os.path.join(self.temp_dir, f"{uuid.uuid4()}.upload")
+        stream.seek(0)
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in iter(lambda: stream.read(COPY_CHUNK_BYTES), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except OSError:
+            self._remove(temp_path)
+            raise
+        return temp_path, self._archive_path(digest.hexdigest(), temp_path), size
+
+    def path_for(self, file_path):
+        """
+        พาธใน archive ของไฟล์ที่อยู่บนดิสก์แล้ว (คำนวณจากแฮชของเนื้อหาทีละบล็อก ไม่เขียนไฟล์)
+
+        Returns:
+            str: พาธที่ใช้กับ store() และบันทึกใน audio_files.file_path
+        """
+        return self._archive_path(_file_digest(file_path), file_path)
+
+    def store(self, temp_path, path):
+        """
+        ย้ายไฟล์ชั่วคราว temp_path (ใต้ root) ไปเป็นต้นฉบับที่ path จาก spool()/path_for() ถ้ายังไม่มี
+        (ถ้ามีแล้วปรับเวลาแก้ไขให้ถือเป็นการอัปโหลดล่าสุด) temp_path ถูกย้ายหรือลบเสมอ แม้เกิดข้อผิดพลาด
+
+        Returns:
+            bool: True ถ้าเขียนไฟล์ใหม่, False ถ้ามีไฟล์เดียวกันอยู่แล้ว
+        """
+        try:
+            received = os.path.getsize(temp_path)
+            with self._lock:
+                self.bytes_received += received
+            try:
+                os.utime(path)
+                with self._lock:
+                    self.deduplicated += 1
+                return False
+            except FileNotFoundError:
+                pass
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if path.endswith('.flac'):
+                # เขียนไฟล์ชั่วคราวแล้วเปลี่ยนชื่อ ผู้อ่านจึงไม่เห็นไฟล์ที่เขียนไม่ครบ และการอัปโหลดซ้ำพร้อมกันได้ผลเดียวกัน
+                encoded_path = os.path.join(self.temp_dir, f"{uuid.uuid4()}.archive")
+                try:
+                    _encode_flac(temp_path, encoded_path)
+                    written = os.path.getsize(encoded_path)
+                    os.replace(encoded_path, path)
+                except Exception:
+                    self._remove(encoded_path)
+                    raise
+            else:
+                written = received
+                os.replace(temp_path, path)
+            with self._lock:
+                self.stored += 1
+                self.bytes_written += written
+            return True
+        finally:
+            self._remove(temp_path)
+
+    def _archive_path(self, digest, file_path):
+        extension = '.flac' if self.compress and _flac_subtype(file_path) else '.wav'
+        return os.path.join(self.archive_dir, digest[:2], digest[2:4], digest + extension)
+
+    def start_sweeper(self, interval):
+        """
+        กวาดไฟล์ในเธรดเบื้องหลังทุก interval วินาที (0 หรือน้อยกว่า = ไม่กวาด)
+        ถ้ามีหลาย process จะมีเพียง process เดียวที่กวาดในแต่ละรอบ (flock บน .sweep.lock)
+        """
+        if interval <= 0 or self._sweeper is not None:
+            return
+        self._sweeper_stop.clear()
+        self._sweeper = threading.Thread(target=self._sweep_loop, args=(interval,), name='upload_sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """หยุดเธรดกวาดไฟล์ (ถ้ามี)"""
+        if self._sweeper is not None:
+            self._sweeper_stop.set()
+            self._sweeper.join()
+            self._sweeper = None
+
+    def sweep(self):
+        """
+        ลบไฟล์ชั่วคราวที่ค้าง และต้นฉบับที่เกินอายุหรือโควตา
+
+        Returns:
+            dict: จำนวนไฟล์ที่ลบ, ขนาดที่คืนได้ และขนาดรวมของต้นฉบับที่เหลือ หรือ None ถ้า process อื่นกำลังกวาด
+        """
+        with open(os.path.join(self.root, SWEEP_LOCK_FILENAME), 'a') as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return None
+            started = time.perf_counter()
+            now = time.time()
+
+            temp_removed = 0
+            for path, mtime, _ in self._scan(self.temp_dir, recursive=False):
+                if now - mtime > self.temp_max_age and self._remove(path):
+                    temp_removed += 1
+
+            originals = sorted(self._scan(self.archive_dir, recursive=True)
+                               + self._scan(self.root, recursive=False), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in originals)
+            expired = 0
+            freed = 0
+            visited = 0
+            # เก่าที่สุดก่อน: หยุดเมื่อไฟล์ถัดไปยังไม่เกินอายุและขนาดรวมไม่เกินโควตา
+            for path, mtime, size in originals:
+                too_old = self.max_age and now - mtime > self.max_age
+                over_quota = self.max_bytes and total > self.max_bytes
+                if not (too_old or over_quota):
+                    break
+                visited += 1
+                if self._remove(path):
+                    expired += 1
+                    freed += size
+                total -= size
+
+            self.last_sweep = {
+                'finished_at': round(now, 3),
+                'seconds': round(time.perf_counter() - started, 3),
+                'temp_removed': temp_removed,
+                'removed': expired,
+                'freed_bytes': freed,
+                'files': len(originals) - visited,
+                'bytes': total
+            }
+            return self.last_sweep
+
+    def stats(self):
+        """
+        สถิติของที่เก็บไฟล์ใน process นี้
+
+        Returns:
+            dict: จำนวนไฟล์ที่เขียน/ที่ซ้ำ, ขนาดที่รับและที่เขียนจริง และผลการกวาดครั้งล่าสุด
+        """
+        with self._lock:
+            return {
+                'compress': self.compress,
+                'max_age_seconds': self.max_age,
+                'max_bytes': self.max_bytes,
+                'stored': self.stored,
+                'deduplicated': self.deduplicated,
+                'bytes_received': self.bytes_received,
+                'bytes_written': self.bytes_written,
+                'last_sweep': self.last_sweep
+            }
+
+    def _sweep_loop(self, interval):
+        while not self._sweeper_stop.wait(interval):
+            try:
+                result = self.sweep()
+                if result and (result['removed'] or result['temp_removed']):
+                    print(f"Upload sweep: removed {result['removed']} originals ({result['freed_bytes']} bytes) "
+                          f"and {result['temp_removed']} temp files")
+            except Exception as e:
+                print(f"Error sweeping uploads in {self.root}: {e}")
+
+    @staticmethod
+    def _scan(directory, recursive):
+        """(พาธ, เวลาแก้ไข, ขนาด) ของไฟล์ใน directory (ไม่รวมไฟล์ที่ขึ้นต้นด้วยจุด)"""
+        entries = []
+        pending = [directory]
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as items:
+                    for item in items:
+                        if item.name.startswith('.'):
+                            continue
+                        if item.is_dir(follow_symlinks=False):
+                            if recursive:
+                                pending.append(item.path)
+                            continue
+                        try:
+                            stat = item.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        entries.append((item.path, stat.st_mtime, stat.st_size))
+            except OSError:
+                continue
+        return entries
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
@@ -0,0 +1,319 @@
+"""
+wav_reader.py - ตัวอ่านไฟล์ WAV แบบเบา สำหรับถอดรหัส PCM และแปลงอัตราการสุ่มตัวอย่างโดยไม่ผ่าน librosa.load
+"""
+
+import io
+import os
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# รหัสรูปแบบข้อมูลใน chunk "fmt " ของไฟล์ WAV
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# ข้อมูลจาก header ของไฟล์ WAV
+WavInfo = namedtuple('WavInfo', [
+    'sample_rate',      # อัตราการสุ่มตัวอย่าง (Hz)
+    'channels',         # จำนวนช่องสัญญาณ
+    'bits_per_sample',  # ความละเอียดต่อตัวอย่าง (bit)
+    'format_tag',       # WAVE_FORMAT_PCM หรือ WAVE_FORMAT_IEEE_FLOAT (หลังแปลง EXTENSIBLE แล้ว)
+    'block_align',      # จำนวนไบต์ต่อเฟรม (ทุกช่องสัญญาณ)
+    'n_frames',         # จำนวนเฟรมในไฟล์
+    'data_offset',      # ตำแหน่งเริ่มต้นของข้อมูลเสียง (ไบต์)
+    'data_size'         # ขนาดข้อมูลเสียงที่อ่านได้จริง (ไบต์)
+])
+
+
+class WavFormatError(ValueError):
+    """ไฟล์ไม่ใช่ WAV หรือ header เสียหาย"""
+
+
+class UnsupportedWavFormat(WavFormatError):
+    """ไฟล์เป็น WAV ที่ถูกต้องแต่ใช้รูปแบบข้อมูลที่ตัวอ่านนี้ไม่รองรับ (เช่น ADPCM, 12 บิต)"""
+
+
+def open_source(source):
+    """
+    เปิดแหล่งข้อมูลเสียงเป็น stream ที่ seek ได้
+
+    Args:
+        source (str | bytes | file-like): พาธ, ไบต์ของไฟล์ หรือ file-like object (รวมถึง FileStorage)
+
+    Returns:
+        tuple: (stream, ต้องปิด stream เองหรือไม่)
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb'), True
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source), True
+    return getattr(source, 'stream', source), False
+
+
+def read_wav_info(stream):
+    """
+    อ่านเฉพาะ header ของไฟล์ WAV (chunk RIFF, fmt และตำแหน่งของ data) โดยไม่อ่านข้อมูลเสียง
+
+    ตำแหน่งการอ่านของ stream จะถูกคืนกลับเมื่ออ่านเสร็จ
+
+    Args:
+        stream (file-like): stream ที่ seek ได้
+
+    Returns:
+        WavInfo: ข้อมูลของไฟล์
+
+    Raises:
+        WavFormatError: ถ้า header ไม่ถูกต้องหรือไม่รองรับ
+    """
+    position = stream.tell()
+    try:
+        stream.seek(0, io.SEEK_END)
+        file_size = stream.tell()
+        stream.seek(position)
+
+        riff = stream.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise WavFormatError('not a RIFF/WAVE file')
+
+        fmt = None
+        while True:
+            header = stream.read(8)
+            if len(header) < 8:
+                raise WavFormatError('missing data chunk')
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+
+            if chunk_id == b'fmt ':
+                body = stream.read(chunk_size)
+                if len(body) < 16:
+                    raise WavFormatError('truncated fmt chunk')
+                fmt = _parse_fmt_chunk(body)
+                if chunk_size % 2:
+                    stream.seek(1, io.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise WavFormatError('data chunk before fmt chunk')
+                format_tag, channels, sample_rate, block_align, bits = fmt
+                data_offset = stream.tell()
+                # ไฟล์ที่เขียนแบบ streaming อาจระบุขนาดเป็น 0 หรือ 0xFFFFFFFF ให้ใช้ขนาดที่เหลือจริงแทน
+                available = max(file_size - data_offset, 0)
+                data_size = available if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, available)
+                data_size -= data_size % block_align
+                return WavInfo(sample_rate, channels, bits, format_tag, block_align,
+                               data_size // block_align, data_offset, data_size)
+            else:
+                stream.seek(chunk_size + (chunk_size % 2), io.SEEK_CUR)
+    except struct.error as e:
+        raise WavFormatError(f'corrupt header: {e}')
+    finally:
+        stream.seek(position)
+
+
+def _parse_fmt_chunk(body):
+    """แยกค่าจาก chunk "fmt " และตรวจสอบว่าเป็นรูปแบบที่รองรับ"""
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack('<HHIIHH', body[:16])
+
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(body) < 40:
+            raise WavFormatError('truncated WAVE_FORMAT_EXTENSIBLE header')
+        # สองไบต์แรกของ SubFormat GUID คือรหัสรูปแบบจริง
+        format_tag = struct.unpack('<H', body[24:26])[0]
+
+    if format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise UnsupportedWavFormat(f'unsupported format tag 0x{format_tag:04x}')
+    if format_tag == WAVE_FORMAT_PCM and bits not in (8, 16, 24, 32):
+        raise UnsupportedWavFormat(f'unsupported PCM bit depth {bits}')
+    if format_tag == WAVE_FORMAT_IEEE_FLOAT and bits not in (32, 64):
+        raise UnsupportedWavFormat(f'unsupported float bit depth {bits}')
+    if channels == 0 or sample_rate == 0 or block_align != channels * bits // 8:
+        raise WavFormatError('inconsistent fmt chunk')
+
+    return format_tag, channels, sample_rate, block_align, bits
+
+
+def pcm_to_float32(raw, info):
+    """
+    แปลงข้อมูล PCM/float ดิบเป็น float32 ช่วง [-1, 1) รูปร่าง (frames, channels) แบบ vectorized
+
+    การสเกลตรงกับที่ soundfile ใช้ (เช่น int16 หารด้วย 32768) เพื่อให้ได้สัญญาณเดียวกับ librosa.load
+
+    Args:
+        raw (bytes | memoryview | numpy.ndarray): ไบต์ของเฟรมเสียง (ความยาวเป็นพหุคูณของ block_align)
+        info (WavInfo): ข้อมูลจาก read_wav_info
+
+    Returns:
+        numpy.ndarray: สัญญาณ float32 รูปร่าง (frames, channels)
+    """
+    bits = info.bits_per_sample
+    buffer = np.frombuffer(raw, dtype=np.uint8)
+
+    if info.format_tag == WAVE_FORMAT_IEEE_FLOAT:
+        samples = buffer.view('<f4' if bits == 32 else '<f8').astype(np.float32)
+    elif bits == 8:
+        # PCM 8 บิตเป็นจำนวนเต็มไม่มีเครื่องหมาย มีจุดกึ่งกลางที่ 128
+        samples = buffer.astype(np.float32)
+        samples -= 128.0
+        samples *= np.float32(1.0 / 128)
+    elif bits == 16:
+        samples = buffer.view('<i2').astype(np.float32)
+        samples *= np.float32(1.0 / 32768)
+    elif bits == 24:
+        # ขยาย 3 ไบต์เป็น int32 (ไบต์ต่ำสุดเป็นศูนย์) แล้วสเกลเหมือน PCM 32 บิต
+        triplets = buffer.reshape(-1, 3)
+        widened = np.zeros((triplets.shape[0], 4), dtype=np.uint8)
+        widened[:, 1:] = triplets
+        samples = widened.view('<i4').ravel().astype(np.float32)
+        samples *= np.float32(1.0 / 2147483648)
+    else:
+        samples = buffer.view('<i4').astype(np.float32)
+        samples *= np.float32(1.0 / 2147483648)
+
+    return samples.reshape(-1, info.channels)
+
+
+def to_mono(frames):
+    """
+    รวมช่องสัญญาณเป็น mono ด้วยค่าเฉลี่ย (ลำดับการบวกเหมือน librosa.to_mono)
+
+    บวกทีละช่องสัญญาณแทน np.mean(axis=1) ซึ่งช้ามากเมื่อแกนที่ลดขนาดมีเพียง 2-3 ค่า
+    """
+    channels = frames.shape[1]
+    if channels == 1:
+        return frames[:, 0]
+    y = frames[:, 0].copy()
+    for channel in range(1, channels):
+        y += frames[:, channel]
+    y /= np.float32(channels)
+    return y
+
+
+def resample(y, orig_sr, target_sr):
+    """
+    แปลงอัตราการสุ่มตัวอย่างด้วย soxr (คุณภาพ HQ เท่ากับค่าเริ่มต้น soxr_hq ของ librosa.load)
+
+    ไม่ทำอะไรถ้าอัตราเท่ากันอยู่แล้ว ถ้าไม่มี soxr จะใช้ scipy.signal.resample_poly แทน
+
+    Args:
+        y (numpy.ndarray): สัญญาณ mono float32
+        orig_sr (int): อัตราการสุ่มตัวอย่างเดิม
+        target_sr (int): อัตราการสุ่มตัวอย่างที่ต้องการ
+
+    Returns:
+        numpy.ndarray: สัญญาณ float32 ที่อัตรา target_sr
+    """
+    if orig_sr == target_sr or len(y) == 0:
+        return y
+
+    try:
+        import soxr
+        return soxr.resample(y, orig_sr, target_sr, quality='HQ')
+    except ImportError:
+        from math import gcd
+        from scipy.signal import resample_poly
+        factor = gcd(int(orig_sr), int(target_sr))
+        return resample_poly(y, target_sr // factor, orig_sr // factor).astype(np.float32)
+
+
+def read_wav(source, sr=16000, max_duration=None):
+    """
+    ถอดรหัสไฟล์ WAV เป็นสัญญาณ mono float32 ที่อัตรา sr
+
+    ไฟล์จากพาธจะถูก memory-map ส่วนไบต์ในหน่วยความจำจะถูกอ่านแบบไม่คัดลอก (np.frombuffer)
+
+    Args:
+        source (str | bytes | file-like): พาธ, ไบต์ของไฟล์ หรือ file-like object
+        sr (int): อัตราการสุ่มตัวอย่างที่ต้องการ (None = คงอัตราเดิม)
+        max_duration (float): ความยาวสูงสุดที่อ่านเป็นวินาที ส่วนที่เกินจะถูกตัดทิ้ง (None = ทั้งไฟล์)
+
+    Returns:
+        tuple: (สัญญาณ numpy.ndarray, อัตราการสุ่มตัวอย่าง)
+
+    Raises:
+        WavFormatError: ถ้าไฟล์ไม่ใช่ WAV ที่รองรับ
+    """
+    stream, owned = open_source(source)
+    try:
+        info = read_wav_info(stream)
+        n_frames = info.n_frames
+        if max_duration is not None:
+            n_frames = min(n_frames, int(max_duration * info.sample_rate))
+        n_bytes = n_frames * info.block_align
+
+        if isinstance(source, (str, os.PathLike)):
+            raw = np.memmap(source, dtype=np.uint8, mode='r', offset=info.data_offset, shape=(n_bytes,)) \
+                if n_bytes else b''
+        elif isinstance(source, (bytes, bytearray, memoryview)):
+            raw = memoryview(source)[info.data_offset:info.data_offset + n_bytes]
+        else:
+            position = stream.tell()
+            stream.seek(info.data_offset)
+            raw = stream.read(n_bytes)
+            stream.seek(position)
+            raw = raw[:len(raw) - len(raw) % info.block_align]
+
+        y = to_mono(pcm_to_float32(raw, info))
+        del raw
+    finally:
+        if owned:
+            stream.close()
+
+    if sr is None:
+        return y, info.sample_rate
+    return resample(y, info.sample_rate, sr), sr
+
+
+def iter_wav(source, sr=16000, max_duration=None, block_frames=1 << 18):
+    """
+    อ่านไฟล์ WAV ทีละบล็อกเป็นสัญญาณ mono float32 ที่อัตรา sr โดยใช้หน่วยความจำคงที่
+
+    การ resample ใช้ soxr.ResampleStream ซึ่งให้ผลเหมือน resample ทั้งไฟล์ในครั้งเดียว
+    สำหรับ file-like object ตำแหน่งการอ่านจะถูกคืนกลับเมื่ออ่านเสร็จ
+
+    Args:
+        source (str | bytes | file-like): พาธ, ไบต์ของไฟล์ หรือ file-like object
+        sr (int): อัตราการสุ่มตัวอย่างที่ต้องการ (None = คงอัตราเดิม)
+        max_duration (float): ความยาวสูงสุดที่อ่านเป็นวินาที (None = ทั้งไฟล์)
+        block_frames (int): จำนวนเฟรมของไฟล์ต้นฉบับที่อ่านต่อบล็อก
+
+    Yields:
+        numpy.ndarray: สัญญาณ float32 ของแต่ละบล็อก
+
+    Raises:
+        WavFormatError: ถ้าไฟล์ไม่ใช่ WAV ที่รองรับ
+    """
+    stream, owned = open_source(source)
+    position = stream.tell()
+    try:
+        info = read_wav_info(stream)
+        n_frames = info.n_frames
+        if max_duration is not None:
+            n_frames = min(n_frames, int(max_duration * info.sample_rate))
+
+        resampler = None
+        if sr is not None and sr != info.sample_rate:
+            import soxr
+            resampler = soxr.ResampleStream(info.sample_rate, sr, 1, dtype='float32', quality='HQ')
+
+        done = 0
+        while done < n_frames:
+            wanted = min(block_frames, n_frames - done)
+            stream.seek(info.data_offset + done * info.block_align)
+            raw = stream.read(wanted * info.block_align)
+            count = len(raw) // info.block_align
+            done += count
+            # ไฟล์ที่สั้นกว่าที่ header ระบุถือว่าจบที่ข้อมูลที่อ่านได้
+            last = done >= n_frames or count < wanted
+
+            y = to_mono(pcm_to_float32(raw[:count * info.block_align], info))
+            if resampler is not None:
+                y = resampler.resample_chunk(y, last=last)
+            if len(y):
+                yield y
+            if last:
+                break
+    finally:
+        if owned:
+            stream.close()
+        else:
+            stream.seek(position)
@@ -0,0 +1,381 @@
+"""
+write_behind.py - คิวบันทึกผลลงฐานข้อมูลแบบ write-behind: เขียนลง journal บนดิสก์ก่อน แล้วทยอยบันทึกเป็นชุดในเธรดเบื้องหลัง
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+
+JOURNAL_SUFFIX = '.journal'
+RECOVERING_SUFFIX = '.recovering'
+COMPACTING_SUFFIX = '.compacting'
+REPLAYING_SUFFIX = '.replaying'
+DEAD_LETTER_FILENAME = 'dead-letter.jsonl'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _read_journal(path):
+    """อ่านรายการที่ยังไม่ถูกบันทึก (seq มากกว่า ack ล่าสุด) จากไฟล์ journal"""
+    entries, acked = [], 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # บรรทัดสุดท้ายอาจเขียนไม่ครบถ้า process หยุดกลางคัน
+                continue
+            if 'ack' in record:
+                acked = max(acked, record['ack'])
+            else:
+                entries.append(record)
+    return [entry for entry in entries if entry['seq'] > acked]
+
+
+def replay_dead_letter(journal_dir, flush):
+    """
+    บันทึกรายการใน dead-letter.jsonl ใหม่ทีละรายการด้วย flush([entry]) (เช่น หลังแก้ข้อมูลหรือสคีมาแล้ว)
+    รายการที่ยังบันทึกไม่ได้จะถูกเขียนกลับต่อท้าย dead-letter.jsonl พร้อมข้อผิดพลาดล่าสุด
+
+    ไฟล์ถูกเปลี่ยนชื่อก่อนอ่าน รายการที่ process อื่นย้ายมาระหว่างนี้จึงไปอยู่ในไฟล์ใหม่ ไม่ถูกนำมาซ้ำหรือหายไป
+    ถ้าการ replay ก่อนหน้าหยุดกลางคัน ไฟล์ที่ค้างจะถูกนำมา replay ต่อ (รายการที่บันทึกไปแล้วในรอบนั้นอาจซ้ำ)
+
+    Returns:
+        dict: จำนวนรายการที่บันทึกได้ (replayed) และที่ยังอยู่ใน dead letter (failed)
+    """
+    path = os.path.join(journal_dir, DEAD_LETTER_FILENAME)
+    claimed = []
+    for name in sorted(os.listdir(journal_dir)):
+        if not (name.startswith(f"{DEAD_LETTER_FILENAME}.") and name.endswith(REPLAYING_SUFFIX)):
+            continue
+        try:
+            owner = int(name[len(DEAD_LETTER_FILENAME) + 1:].split('-', 1)[0])
+        except ValueError:
+            continue
+        if owner != os.getpid() and _pid_alive(owner):
+            continue
+        claimed.append(os.path.join(journal_dir, name))
+    claim = f"{path}.{os.getpid()}-{time.time_ns()}{REPLAYING_SUFFIX}"
+    try:
+        os.rename(path, claim)
+        claimed.append(claim)
+    except FileNotFoundError:
+        pass
+
+    replayed = failed = 0
+    for claim in claimed:
+        with open(claim, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries:
+            try:
+                flush([entry])
+                replayed += 1
+            except Exception as e:
+                failed += 1
+                print(f"Dead-letter entry {entry['seq']} of user {entry['user_id']} still fails: {e}")
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(dict(entry, error=str(e)), ensure_ascii=False) + '\n')
+        os.remove(claim)
+    return {'replayed': replayed, 'failed': failed}
+
+
+class WriteBehindQueue:
+    """
+    คิว write-behind ที่เก็บรายการไว้ใน journal แบบเขียนต่อท้าย (หนึ่งไฟล์ต่อ process) ก่อนตอบผู้เรียก
+    แล้วให้เธรดเบื้องหลังเรียก flush(entries) เป็นชุดตามลำดับที่เข้าคิว
+
+    - ลำดับ: มีเธรด flush เดียวและบันทึกตามลำดับ journal รายการของผู้ใช้เดียวกันจึงเรียงเสมอ
+    - ลองใหม่: ข้อผิดพลาดชั่วคราว (เช่น MySQL ไม่ตอบ) ลองชุดเดิมใหม่แบบ backoff ส่วนรายการที่
+      ผิดถาวร (is_permanent) จะถูกแยกบันทึกทีละรายการ และรายการที่ยังผิดจะย้ายไป dead-letter.jsonl
+      (นำกลับมาบันทึกได้ด้วย replay_dead_letter)
+    - ความคงทน: หลังบันทึกแต่ละชุดจะเขียนบรรทัด ack ต่อท้าย journal และล้างไฟล์เมื่อคิวว่าง
+      ถ้าคิวไม่เคยว่าง (โหลดสูงต่อเนื่อง) journal จะถูกเขียนใหม่ให้เหลือเฉพาะรายการค้างทุก compact_after
+      รายการที่บันทึกแล้ว ขนาดไฟล์จึงไม่โตไม่สิ้นสุด
+      journal ของ process ที่หยุดไป (รวมถึงตอนปิดที่ยังบันทึกไม่หมด) จะถูก process ถัดไปนำมาบันทึกต่อ
+      รายการอาจถูกบันทึกซ้ำได้ไม่เกินหนึ่งชุดถ้า process หยุดระหว่าง flush กับการเขียน ack
+    """
+    def __init__(self, journal_dir, flush, is_permanent=None, batch_size=100, fsync=True,
+                 retry_min=0.5, retry_max=30.0, compact_after=1000):
+        """
+        Args:
+            journal_dir (str): ไดเรกทอรีของไฟล์ journal
+            flush (callable): flush(entries) บันทึกรายการทั้งหมดในชุดเดียว (ล้มเหลวให้ raise)
+            is_permanent (callable): is_permanent(error) True ถ้าข้อผิดพลาดไม่หายไปเมื่อลองใหม่
+            batch_size (int): จำนวนรายการสูงสุดต่อการเรียก flush
+            fsync (bool): fsync journal ทุกครั้งที่เพิ่มรายการ (ไม่สูญหายแม้เครื่องดับ)
+            retry_min (float): เวลารอก่อนลองใหม่ครั้งแรก (วินาที) และเพิ่มเป็นสองเท่าทุกครั้ง
+            retry_max (float): เวลารอก่อนลองใหม่สูงสุด (วินาที)
+            compact_after (int): เขียน journal ใหม่เมื่อมีรายการที่บันทึกแล้วค้างอยู่ในไฟล์ถึงจำนวนนี้
+        """
+        self.journal_dir = journal_dir
+        self.flush = flush
+        self.is_permanent = is_permanent or (lambda error: False)
+        self.batch_size = max(int(batch_size), 1)
+        self.fsync = fsync
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.compact_after = max(int(compact_after), 1)
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._seq = 0
+        self._file = None
+        self._path = None
+        self._thread = None
+        self._closing = False
+        self._abandon = threading.Event()
+        # จำนวนรายการที่บันทึกแล้วแต่ยังอยู่ใน journal (ก่อนบรรทัด ack ล่าสุด)
+        self._acked_in_file = 0
+
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.retries = 0
+        self.recovered = 0
+        self.dead_lettered = 0
+        self.compactions = 0
+        self.last_error = None
+
+    def start(self):
+        """เปิด journal ของ process นี้ นำรายการค้างจาก journal ของ process ที่หยุดไปมาเข้าคิว แล้วเริ่มเธรด flush"""
+        if self._thread is not None:
+            return
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._path = os.path.join(self.journal_dir, f"{os.getpid()}-{time.time_ns()}{JOURNAL_SUFFIX}")
+        self._file = open(self._path, 'a', encoding='utf-8')
+        self._recover()
+        self._thread = threading.Thread(target=self._run, name='write_behind', daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, payload):
+        """
+        เพิ่มรายการเข้าคิว (เขียนลง journal แล้วจึงคืนค่า)
+
+        Args:
+            user_id: เจ้าของรายการ
+            payload: ข้อมูลที่ส่งให้ flush (ต้องแปลงเป็น JSON ได้)
+
+        Returns:
+            int: ลำดับของรายการใน journal
+
+        Raises:
+            OSError: ถ้าเขียน journal ไม่ได้ (ผู้เรียกควรบันทึกเองโดยตรง)
+        """
+        with self._cond:
+            if self._file is None or self._closing:
+                raise OSError("write-behind queue is not running")
+            entry = self._append(user_id, payload, time.time())
+            self.submitted += 1
+            self._cond.notify_all()
+            return entry['seq']
+
+    def close(self, timeout=None):
+        """
+        บันทึกรายการที่ค้างให้หมดภายใน timeout วินาที แล้วปิด journal
+
+        Returns:
+            bool: True ถ้าบันทึกหมด (ถ้าไม่หมด รายการยังอยู่ใน journal ให้ process ถัดไปบันทึกต่อ)
+        """
+        thread = self._thread
+        if thread is None:
+            return True
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        thread.join(timeout)
+        drained = not thread.is_alive()
+        if not drained:
+            self._abandon.set()
+            print(f"Write-behind queue: {len(self._queue)} entries left in {self._path}")
+        with self._cond:
+            self._file.close()
+            self._file = None
+            if drained:
+                os.remove(self._path)
+        self._thread = None
+        return drained
+
+    def stats(self):
+        """
+        สถิติของคิว
+
+        Returns:
+            dict: ความยาวคิว, อายุของรายการที่ค้างนานที่สุด, จำนวนที่บันทึก/ลองใหม่/ย้ายไป dead letter
+        """
+        with self._cond:
+            oldest = self._queue[0]['created'] if self._queue else None
+            return {
+                'pending': len(self._queue),
+                'oldest_pending_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+                'submitted': self.submitted,
+                'flushed': self.flushed,
+                'batches': self.batches,
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'dead_lettered': self.dead_lettered,
+                'compactions': self.compactions,
+                'last_error': self.last_error
+            }
+
+    def _append(self, user_id, payload, created):
+        self._seq += 1
+        entry = {'seq': self._seq, 'user_id': user_id, 'created': created, 'payload': payload}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._queue.append(entry)
+        return entry
+
+    def _recover(self):
+        """ย้ายรายการที่ยังไม่ถูกบันทึกจาก journal ของ process ที่หยุดไปแล้วมาไว้ใน journal ของ process นี้"""
+        for name in sorted(os.listdir(self.journal_dir)):
+            path = os.path.join(self.journal_dir, name)
+            if path == self._path:
+                continue
+            if name.endswith(JOURNAL_SUFFIX):
+                owner = name.split('-', 1)[0]
+            elif name.endswith(RECOVERING_SUFFIX):
+                owner = name[:-len(RECOVERING_SUFFIX)].rsplit('.', 1)[-1]
+            elif name.endswith(COMPACTING_SUFFIX):
+                owner = name.split('-', 1)[0]
+            else:
+                continue
+            try:
+                owner = int(owner)
+            except ValueError:
+                continue
+            if owner != os.getpid() and _pid_alive(owner):
+                continue
+            if name.endswith(COMPACTING_SUFFIX):
+                # process หยุดระหว่างเขียน journal ใหม่: journal เดิมยังครบ ไฟล์นี้ทิ้งได้
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+
+            # เปลี่ยนชื่อก่อนอ่าน เพื่อให้มีเพียง process เดียวที่นำไฟล์นี้ไปบันทึกต่อ
+            claimed = f"{path.rsplit(JOURNAL_SUFFIX, 1)[0]}{JOURNAL_SUFFIX}.{os.getpid()}{RECOVERING_SUFFIX}"
+            try:
+                os.rename(path, claimed)
+                entries = _read_journal(claimed)
+            except OSError:
+                continue
+
+            with self._cond:
+                for entry in entries:
+                    self._append(entry['user_id'], entry['payload'], entry['created'])
+                self.recovered += len(entries)
+            os.remove(claimed)
+            if entries:
+                print(f"Write-behind queue: recovered {len(entries)} entries from {name}")
+
+    def _run(self):
+        delay = self.retry_min
+        isolate = 0
+        while not self._abandon.is_set():
+            with self._cond:
+                while not self._queue and not self._closing:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                size = 1 if isolate else self.batch_size
+                batch = [self._queue[i] for i in range(min(size, len(self._queue)))]
+
+            failed = 0
+            try:
+                self.flush(batch)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                permanent = self.is_permanent(e)
+                with self._cond:
+                    self.last_error = error
+                    if not permanent:
+                        self.retries += 1
+                if not permanent:
+                    print(f"Write-behind flush failed ({error}). Retrying in {delay:.1f}s")
+                    self._abandon.wait(delay)
+                    delay = min(delay * 2, self.retry_max)
+                    continue
+                if len(batch) > 1:
+                    # หารายการที่ผิดโดยบันทึกทีละรายการ จนครบจำนวนของชุดนี้
+                    isolate = len(batch)
+                    continue
+                self._dead_letter(batch[0], e)
+                failed = 1
+
+            delay = self.retry_min
+            isolate = max(isolate - len(batch), 0)
+            with self._cond:
+                if self._file is None:
+                    # close() หมดเวลาไปแล้ว รายการที่เหลือยังอยู่ใน journal
+                    return
+                for _ in batch:
+                    self._queue.popleft()
+                self.flushed += len(batch) - failed
+                self.batches += 1
+                if not self._queue:
+                    # ทุกรายการใน journal ถูกบันทึกแล้ว
+                    self._file.truncate(0)
+                    self._acked_in_file = 0
+                    continue
+                self._file.write(json.dumps({'ack': batch[-1]['seq']}) + '\n')
+                self._file.flush()
+                self._acked_in_file += len(batch)
+                if self._acked_in_file >= self.compact_after:
+                    self._compact()
+
+    def _compact(self):
+        """
+        เขียน journal ใหม่ให้เหลือเฉพาะรายการในคิว (เรียกขณะถือ self._cond)
+
+        เขียนลงไฟล์ชั่วคราวแล้วเปลี่ยนชื่อทับ ถ้า process หยุดกลางคัน journal เดิม (พร้อมบรรทัด ack) ยังอยู่ครบ
+        ถ้าเขียนไม่สำเร็จจะใช้ไฟล์เดิมต่อและลองใหม่หลังชุดถัดไป
+        """
+        tmp_path = f"{self._path}{COMPACTING_SUFFIX}"
+        journal = None
+        try:
+            # เปิดแบบต่อท้าย (เหมือน journal ปกติ) แล้วใช้ไฟล์นี้ต่อหลังเปลี่ยนชื่อ
+            journal = open(tmp_path, 'a', encoding='utf-8')
+            journal.truncate(0)
+            for entry in self._queue:
+                journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            journal.flush()
+            if self.fsync:
+                os.fsync(journal.fileno())
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"Error compacting write-behind journal {self._path}: {e}")
+            if journal is not None:
+                journal.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._file.close()
+        self._file = journal
+        self._acked_in_file = 0
+        self.compactions += 1
+
+    def _dead_letter(self, entry, error):
+        """ย้ายรายการที่บันทึกไม่ได้อย่างถาวรไปไว้ใน dead-letter.jsonl"""
+        with self._cond:
+            self.dead_lettered += 1
+        print(f"Write-behind entry {entry['seq']} of user {entry['user_id']} moved to dead letter: {error}")
+        try:
+            with open(os.path.join(self.journal_dir, DEAD_LETTER_FILENAME), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(entry, error=str(error)), ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"Error writing dead letter: {e}")
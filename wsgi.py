@@ -0,0 +1,9 @@
+"""
+wsgi.py - จุดเริ่มต้นสำหรับ WSGI server ในการใช้งานจริง
+
+    gunicorn wsgi:application
+
+ค่าตั้งของ gunicorn อยู่ใน gunicorn.conf.py (โหลดอัตโนมัติจากไดเรกทอรีปัจจุบัน)
+"""
+
+from app import app as application
@@ -12,7 +12,7 @@ import joblib  # สำหรับบันทึกโมเดลและ sc
 # กำหนดพาธสำหรับโฟลเดอร์ข้อมูล
 train_data_folder = 'Train'  # โฟลเดอร์ข้อมูลฝึกฝน
 test_data_folder = 'Test'  # โฟลเดอร์ข้อมูลทดสอบ
-output_folder = 'Models'  # โฟลเดอร์สำหรับเก็บไฟล์ผลลัพธ์
+output_folder = 'models'  # โฟลเดอร์สำหรับเก็บไฟล์ผลลัพธ์
 
 # สร้างโฟลเดอร์ output ถ้ายังไม่มี
 if not os.path.exists(output_folder):